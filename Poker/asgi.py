@@ -21,6 +21,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', os.getenv('DJANGO_SETTINGS_MODUL
 django.setup()
 
 from app.routing import websocket_urlpatterns
+from app.equity import warm_up
+from app.table_hosts import TABLE_HOSTS
+
+if not TABLE_HOSTS: # tables and their equity calculations run in this process
+    warm_up()
 
 #application = get_asgi_application()
 
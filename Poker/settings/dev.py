@@ -10,6 +10,21 @@ CHANNEL_LAYERS = {
     }
 }
 
+# several ASGI workers on one host: share groups through `manage.py run_channel_broker`.
+# Tables must then live on table hosts, a table per worker would broadcast into the shared groups too
+if os.getenv('POKER_CHANNEL_BROKER'):
+    if not int(os.getenv('POKER_TABLE_HOSTS', 0)):
+        from django.core.exceptions import ImproperlyConfigured
+        raise ImproperlyConfigured('POKER_CHANNEL_BROKER needs POKER_TABLE_HOSTS > 0.')
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'app.channel_layer.BrokerChannelLayer',
+            'CONFIG': {
+                'path': os.getenv('POKER_CHANNEL_BROKER'),
+            },
+        }
+    }
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -1,42 +1,147 @@
 '''
-Script realizing logic in single poker room. Uses pydealer module for card deck management.
+Script realizing logic in single poker room. Cards come from the shared flyweight table in cards.py.
 '''
 import asyncio
 import itertools
+import json
+import logging
+import time
+import uuid
 
 from django.contrib.messages import success
-from pydealer import Stack, POKER_RANKS, Deck
 
-RANKS = POKER_RANKS['values']
+from . import metrics, wire
+from .cards import CardDeck
+from .equity import calculate_equity_async, pool_ready
+from .preflop import class_name, equity_vs_random, hand_class
+from .seats import Seat, SeatSet
+from .shuffle import shuffle_service
+from .timers import timer_wheel
+from .hand_evaluator import HandState, card_code, evaluate_cards_cached, result_strength
+from .hand_ranks import rank_codes
+
+logger = logging.getLogger(__name__)
+
+INBOX_SIZE = 256 # commands queued per table before posting consumers wait
 
 poker_games = {}
 
+
+def table_metrics():
+    ''' Inbox depth and command latency of every table actor in the process '''
+    commands, latency, max_depth = {}, {}, 0
+    for game in list(poker_games.values()):
+        stats = game.actor_stats
+        max_depth = max(max_depth, stats['max_depth'])
+        for kind, count in stats['commands'].items():
+            commands[kind] = commands.get(kind, 0) + count
+            total, longest = latency.get(kind, (0.0, 0.0))
+            latency[kind] = (total + stats['latency'][kind][0], max(longest, stats['latency'][kind][1]))
+    return {
+        'tables': len(poker_games),
+        'queued': sum(game.inbox.qsize() for game in list(poker_games.values())),
+        'max_queue_depth': max_depth,
+        'commands': commands,
+        'mean_latency_ms': {kind: 1000 * latency[kind][0] / commands[kind] for kind in commands},
+        'max_latency_ms': {kind: 1000 * latency[kind][1] for kind in commands},
+    }
+
+
+metrics.register('tables', table_metrics)
+
+
+def encode_frame(events, seq=None):
+    '''
+    The websocket text of a step's events, encoded once however many sockets it goes to
+    (wire.encode_frame is the binary form). Room frames carry the table's sequence
+    number, see PokerGame.snapshot.
+    '''
+    frame = dict(events[0]) if len(events) == 1 else {'type': 'batch', 'events': events}
+    if seq is not None:
+        frame['seq'] = seq
+    return json.dumps(frame)
+
+
 class PokerGame:
     def __init__(self, id, big_blind, max_players=8):
         self.id = id
         self.players = {i: None for i in range(max_players)}
+        self.seat_index = {} # username -> position
+        # seat bitmasks kept up to date by Seat, bit n is position n
+        self.seated_mask = 0
+        self.in_hand_mask = 0 # active and not folded
+        self.acting_mask = 0 # active, not folded and not all in
         self.default_chip_count = big_blind * 100
         self.big_blind = big_blind
 
         # game state
         self.game_state = 'waiting'
-        self.deck = None
-        self.board_cards = Stack()
+        self.deck = CardDeck() # reused for every hand
+        self.shuffle_service = shuffle_service
+        self.hand_rng = None # seeded index source of the current hand, revealed when it ends
+        self.session = uuid.uuid4().hex[:12] # this table instance in the audit log, hand numbers restart with it
+        self.board_cards = []
+        self.hand_states = {} # incremental hand evaluation per seat
+        self.hand_number = 0
         self.pot = 0
         self.current_max_bet = 0
         self.dealer_position = None
         self.current_player_position = None
         self.last_raiser_position = None
 
-        # messsage callbacks
+        # messsage callbacks, the frame callbacks get the events of a step as one frame encoded as
+        # text and binary, the binary one None while no socket takes it (see _flush_messages), while
+        # message_callback sees each broadcast as it happens
         self.message_callback = None
         self.private_message_callback = None
-
-        # async event for player action
-        self.player_action_event = asyncio.Event()
+        self.frame_callback = None
+        self.private_frame_callback = None
+        self.binary_sockets = 0 # sockets of the room using the binary subprotocol, see _on_binary
+        self.outbox = [] # broadcasts of the current step
+        self.seq = 0 # number of the last room frame, clients that miss one ask for a snapshot
+        self.public_version = 0 # bumped by every broadcast and seat change, see public_snapshot
+        self.public_state = None # ((public_version, seq), encoded public snapshot)
+        self.private_outbox = {} # username -> private messages of the current step
+        self.batch_window = 0.1 # seconds an event may wait for its step to end
+        self.batch_timer = None
+        self.flush_tasks = set() # flushes started by the batch timer, held until they finish
+        self.flush_lock = asyncio.Lock() # frames go out in the order their events were taken
+
+        # actor: consumers post commands (see post), one task applies them in order
+        self.inbox = asyncio.Queue(maxsize=INBOX_SIZE)
+        self.actor_task = None
+        self.clock_token = 0 # identifies the clock a timeout command belongs to
+        self.actor_stats = {'max_depth': 0, 'commands': {}, 'latency': {}}
+        self.command_handlers = {
+            'join': self._on_join,
+            'leave': self._on_leave,
+            'action': self.player_action,
+            'start': self._on_start,
+            'seats': self._on_seats,
+            'snapshot': self._on_snapshot,
+            'binary': self._on_binary,
+        }
         self.waiting_for_player = False
 
         self.ready_for_new_round = True
+        self.driver_running = False
+
+        # headless simulation hooks: a policy acting for every seat, no showdown pause and
+        # no automatic next hand (see simulation.py)
+        self.action_policy = None
+        self.showdown_delay = 8 # seconds for players to see the cards
+        self.auto_start = True
+
+        # clocks run on the process-wide timer wheel: a seat that has not acted after
+        # action_timeout seconds spends its time bank, then checks or folds
+        self.timers = timer_wheel
+        self.action_timeout = 30
+        self.time_bank = 60 # seconds per seat, not refilled while the player stays seated
+
+        # equities shown when players are all in, sent once per (hand, board size). The budget
+        # only applies once the process pool has started, see equity.pool_ready
+        self.equity_latency_budget = 1.0
+        self.last_equity_spot = None
 
         self.state_transitions = {
             'waiting': 'pre_flop',
@@ -56,8 +161,20 @@ class PokerGame:
              'showdown': self._setup_showdown
         }
 
+    async def _run_table(self, state):
+        '''
+        Table driver: one flat loop over states. Every setup method returns the state to
+        play next, so the stack stays the same depth however many hands the table plays.
+        '''
+        self.driver_running = True
+        try:
+            while state:
+                state = await self._transition_state(state)
+        finally:
+            self.driver_running = False
+
     async def _next_state(self):
-        ''' Transition to the next game state. '''
+        ''' Close the betting round and return the next game state. '''
         next_state = self.state_transitions.get(self.game_state)
         self.last_raiser_position = None
         self.current_max_bet = 0
@@ -66,29 +183,40 @@ class PokerGame:
             if self.players[pos]:
                 self.players[pos]['current_bet'] = 0
         await self.notify_clear_betting()
-        if next_state:
-            await self._transition_state(next_state)
+        await self._send_equities()
+        return next_state
 
     async def _transition_state(self, new_state):
-        ''' Transition to a new game state and set up the state. '''
+        ''' Set the game state, play it and return the state that follows. '''
         self.game_state = new_state
         setup_method = self.state_setup_methods.get(new_state)
         if setup_method:
-            await setup_method()
+            return await setup_method()
+
+    async def _finish_betting(self, state_result):
+        if state_result == 'next_state':
+            return await self._next_state()
+        if state_result == 'waiting':
+            return 'waiting'
+        return None
 
     async def _setup_waiting(self):
         await self._reset_game()
         await self.notify_reset()
-        await self.start_game()
+        if self.auto_start and self._begin_hand():
+            return 'pre_flop'
+        return None
 
     async def _setup_pre_flop(self):
         ''' If heads up, dealer is small blind '''
-        self.deck = Deck()
-        self.board_cards = Stack()
+        self.board_cards = []
+        self.hand_states = {}
+        self.hand_number += 1
         self.pot = 0
         self.current_max_bet = 0
 
-        self.deck.shuffle()
+        self.hand_rng = self.shuffle_service.new_hand(self.id, self.hand_number, self.session)
+        self.deck.shuffle(self.hand_rng)
 
         active_players = self.get_all_players()
         for pos in active_players:
@@ -122,73 +250,49 @@ class PokerGame:
         for pos in dealing_order:
             player = active_players[pos]
             if player:
-                player['cards'] = Stack()
-                player['cards'].add(self.deck.deal(2))
+                player['cards'] = self.deck.deal(2)
+                self.hand_states[pos] = HandState(player['cards'])
                 await self.notify_dealt_cards(pos, player['cards'], positions)
+        await self._calculate_players_hand_values()
 
-        state_result = await self._betting_round()
-        if state_result == 'next_state':
-            await self._next_state()
-        elif state_result == 'waiting':
-            await self._transition_state('waiting')
+        return await self._finish_betting(await self._betting_round())
 
     async def _setup_flop(self):
-        self.board_cards.add(self.deck.deal(3))
+        self._deal_board_cards(3)
         await self.notify_board_cards()
         await self._calculate_players_hand_values()
         self.current_player_position = (self.dealer_position + 1) % len(self.players)
-        state_result = await self._betting_round()
-        if state_result == 'next_state':
-            await self._next_state()
-        elif state_result == 'waiting':
-            await self._transition_state('waiting')
+        return await self._finish_betting(await self._betting_round())
 
     async def _setup_turn(self):
-        self.board_cards.add(self.deck.deal(1))
+        self._deal_board_cards(1)
         await self.notify_board_cards()
         await self._calculate_players_hand_values()
         self.current_player_position = (self.dealer_position + 1) % len(self.players)
-        state_result = await self._betting_round()
-        if state_result == 'next_state':
-            await self._next_state()
-        elif state_result == 'waiting':
-            await self._transition_state('waiting')
+        return await self._finish_betting(await self._betting_round())
 
     async def _setup_river(self):
-        self.board_cards.add(self.deck.deal(1))
+        self._deal_board_cards(1)
         await self.notify_board_cards()
         await self._calculate_players_hand_values()
         self.current_player_position = (self.dealer_position + 1) % len(self.players)
-        state_result = await self._betting_round()
-        if state_result == 'next_state':
-            await self._next_state()
-        elif state_result == 'waiting':
-            await self._transition_state('waiting')
+        return await self._finish_betting(await self._betting_round())
 
     async def _setup_showdown(self):
         remaining_players = self.get_not_folded_players()
-        winner_positions = []
-        best_hand = None
         if len(remaining_players) == 1:
             winner_positions = list(remaining_players.keys())
         else:
             await self.notify_showdown(remaining_players)
-            await asyncio.sleep(8) # give time for players to see cards
-            for pos in remaining_players:
-                player = remaining_players[pos]
-                hand = self._evaluate_hand(player['cards'] + self.board_cards)
-                if best_hand is None:
-                    best_hand = hand
-                    winner_positions = [pos]
-                else:
-                    comparison = self._compare_hands(hand, best_hand)
-                    if comparison == 1:
-                        best_hand = hand
-                        winner_positions = [pos]
-                    elif comparison == 0:
-                        winner_positions.append(pos)
+            if self.showdown_delay:
+                await self._serve_until(lambda: False, self.showdown_delay) # give time for players to see cards
+            board_codes = [card_code(card) for card in self.board_cards]
+            strengths = {pos: rank_codes([card_code(card) for card in remaining_players[pos]['cards']] + board_codes)
+                         for pos in remaining_players}
+            best_strength = max(strengths.values())
+            winner_positions = [pos for pos in strengths if strengths[pos] == best_strength]
         await self._handle_winner(winner_positions)
-        await self._next_state()
+        return await self._next_state()
 
 
     async def _betting_round(self):
@@ -198,12 +302,13 @@ class PokerGame:
             if self.game_state == 'pre_flop':
                 return 'waiting'
             else:
+                await self._send_equities() # only all in players left, show odds before next card
                 return 'next_state'
 
         betting_order = self._get_acting_order()
         # TODO: implement betting sequence using generators
         for i, position in enumerate(itertools.cycle(betting_order)):
-            if len(self.get_not_folded_players()) <= 1: # remaining player wins
+            if self.in_hand_mask.bit_count() <= 1: # remaining player wins
                 await self._handle_winner(list(self.get_not_folded_players().keys()))
                 return 'waiting'
             if i >= len(betting_order): # completed a full round
@@ -213,7 +318,7 @@ class PokerGame:
                 and self.current_max_bet == active_players[position]['current_bet']):
                     break # at least one full round and no new raises
             self.current_player_position = position
-            if position in self.get_all_players(): # check if player still in game
+            if self.seated_mask >> position & 1: # check if player still in game
                 player = active_players.get(position)
                 if player and not player['folded'] and not player['all_in']:
                     await self._wait_for_player_action(position)
@@ -252,270 +357,90 @@ class PokerGame:
             self.current_player_position = next_pos
         return positions[self.current_player_position:] + positions[:self.current_player_position]
 
+    def _deal_board_cards(self, count):
+        cards = self.deck.deal(count)
+        self.board_cards.extend(cards)
+        for state in self.hand_states.values():
+            state.add_cards(cards)
+
+    def _get_hand_state(self, position):
+        ''' Hand state of the seat, rebuilt from its cards if it is missing '''
+        state = self.hand_states.get(position)
+        if state is None:
+            state = HandState(self.players[position]['cards'] + self.board_cards)
+            self.hand_states[position] = state
+        return state
+
     async def _calculate_players_hand_values(self):
+        if not (self.private_message_callback or self.private_frame_callback):
+            return
         active_players = self.get_not_folded_players()
         for pos in active_players:
             player = active_players[pos]
             if player and player['cards']:
-                hand_value = self._evaluate_hand(player['cards'] + self.board_cards)
+                if not self.board_cards:
+                    await self._send_preflop_value(player)
+                    continue
+                hand_value = self._get_hand_state(pos).result()
                 await self._send_private_message(player['username'], 'hand_value', {
                     'hand_value': hand_value[0],
                     'hand_cards': [str(x) for card in hand_value[1] for x in \
                                    (card if isinstance(card, list) else [card])],
                 })
 
-    def _evaluate_hand(self, cards):  # input is a Stack class of cards
-        def straight_flush(cards):
-            suits_counter = {
-                "Clubs": 0,
-                "Diamonds": 0,
-                "Hearts": 0,
-                "Spades": 0
-            }
-
-            for card in cards:
-                suits_counter[card.suit] += 1
-
-            max_suit = max(suits_counter, key=suits_counter.get)
-            if suits_counter[max_suit] >= 5:
-                suited_cards = sorted([card for card in cards if card.suit == max_suit], reverse=True)
-                for i in range(len(suited_cards) - 4):
-                    hand = suited_cards[i: i + 5]
-                    if hand[0].value == 'Ace' and hand[1].value == '5' and len(hand) == 5:  # wheel
-                        return True, hand[1:] + [hand[0]]
-                    if RANKS[hand[0].value] - RANKS[hand[-1].value] == 4 and len(hand) == 5:
-                        return True, hand
-            return False, None
-
-        def four_of_a_kind(cards):
-            rank_counter = {}
-            for card in cards:
-                rank_counter[card.value] = rank_counter.get(card.value, 0) + 1
-            for rank, count in rank_counter.items():
-                if count == 4:
-                    hand_value = next(card for card in cards if card.value == rank)
-                    kicker = max([card for card in cards if card.value != rank])
-                    return True, (hand_value, kicker)
-            return False, (None, None)
-
-        def full_house(cards):
-            three_kind = three_of_a_kind(cards)
-            if (three_kind[0]):
-                three_card = three_kind[1][0]
-                pair_candidates = [card for card in cards if card.value != three_card.value]
-                pair_in_rest = pair(pair_candidates)
-                if (pair_in_rest[0]):
-                    pair_card = pair_in_rest[1][0]
-                    return True, (three_card, pair_card)
-            return False, (None, None)
-
-        def flush(cards):
-            suits_counter = {
-                "Clubs": 0,
-                "Diamonds": 0,
-                "Hearts": 0,
-                "Spades": 0
-            }
+    async def _send_preflop_value(self, player):
+        ''' Starting hand class and its precomputed equity against a random hand '''
+        index = hand_class(*(card_code(card) for card in player['cards']))
+        equity = equity_vs_random(index)
+        if equity is None:
+            return
+        await self._send_private_message(player['username'], 'hand_value', {
+            'hand_value': 'preflop',
+            'hand_cards': [str(card) for card in player['cards']],
+            'hand_class': class_name(index),
+            'equity': equity,
+        })
 
-            for card in cards:
-                suits_counter[card.suit] += 1
-
-            max_suit = max(suits_counter, key=suits_counter.get)
-            if suits_counter[max_suit] >= 5:
-                suited_cards = sorted([card for card in cards if card.suit == max_suit], reverse=True)
-                return True, suited_cards[:5]
-            return False, None
-
-        def straight(cards):
-            unique_ranks = Stack()
-            for i in range(len(cards)):
-                if cards[i].value not in [card.value for card in unique_ranks]:
-                    unique_ranks.add(cards[i])
-            unique_ranks = sorted(unique_ranks, reverse=True)
-
-            for i in range(len(unique_ranks) - 4):
-                hand = unique_ranks[i: i + 5]
-                if hand[0].value == 'Ace' and hand[1].value == '5' and len(hand) == 5:
-                    return True, hand[1:] + [hand[0]]
-                if RANKS[hand[0].value] - RANKS[hand[-1].value] == 4 and len(hand) == 5:
-                    return True, hand
-            return False, None
-
-        def three_of_a_kind(cards):
-            rank_counter = {
-                'Ace': 0,
-                'King': 0,
-                'Queen': 0,
-                'Jack': 0,
-                '10': 0,
-                '9': 0,
-                '8': 0,
-                '7': 0,
-                '6': 0,
-                '5': 0,
-                '4': 0,
-                '3': 0,
-                '2': 0
-            }
-            for card in cards:
-                rank_counter[card.value] = rank_counter.get(card.value, 0) + 1
-            for rank, count in rank_counter.items():
-                if count == 3:
-                    hand_value = next(card for card in cards if card.value == rank)
-                    kickers = sorted([card for card in cards if card.value != rank], reverse=True)[:2]
-                    return True, (hand_value, kickers)
-            return False, (None, None)
-
-        def two_pair(cards):
-            one_pair = pair(cards)
-            if (one_pair[0]):
-                high_pair = one_pair[1][0]
-                hand_without_first_pair = [card for card in cards if card.value != high_pair.value]
-                second_pair = pair(hand_without_first_pair)  # check pair in remaining cards
-                if (second_pair[0]):
-                    low_pair = second_pair[1][0]
-                    kicker = second_pair[1][1][0]  # highest remaining card
-                    return True, (high_pair, low_pair, kicker)
-            return False, (None, None, None)
-
-        def pair(cards):
-            rank_counter = {
-                'Ace': 0,
-                'King': 0,
-                'Queen': 0,
-                'Jack': 0,
-                '10': 0,
-                '9': 0,
-                '8': 0,
-                '7': 0,
-                '6': 0,
-                '5': 0,
-                '4': 0,
-                '3': 0,
-                '2': 0
+    async def _send_equities(self):
+        ''' Once betting is closed by an all in, send equities for the current board '''
+        remaining_players = self.get_not_folded_players()
+        spot = (self.hand_number, len(self.board_cards))
+        if not (self.message_callback or self.frame_callback) or len(remaining_players) < 2 or len(self.get_all_active_players()) > 1 \
+                or len(self.board_cards) >= 5 or self.last_equity_spot == spot:
+            return
+        self.last_equity_spot = spot
+        positions = list(remaining_players.keys())
+        try:
+            result = await asyncio.wait_for(calculate_equity_async(
+                [[card_code(card) for card in remaining_players[pos]['cards']] for pos in positions],
+                [card_code(card) for card in self.board_cards],
+            ), self.equity_latency_budget if pool_ready() else None)
+        except Exception:
+            logger.warning("Equity calculation failed at table %s", self.id, exc_info=True)
+            return
+        await self._send_broadcast_message(
+            'equities',
+            {
+                'equities': {pos: {'win': result['win'][i], 'tie': result['tie'][i]}
+                             for i, pos in enumerate(positions)},
+                'board_size': spot[1],
             }
-            for card in cards:
-                rank_counter[card.value] = rank_counter.get(card.value, 0) + 1
-            for rank, count in rank_counter.items():
-                if count == 2:
-                    hand_value = next(card for card in cards if card.value == rank)
-                    kickers = sorted([card for card in cards if card.value != rank], reverse=True)[:3]
-                    return True, (hand_value, kickers)
-            return False, (None, None)
-
-        if len(cards) < 5:
-            return None
-
-        is_straight_flush, sf_hand = straight_flush(cards)
-        if is_straight_flush:
-            return ("straight_flush", sf_hand)
-
-        is_four, four_hand = four_of_a_kind(cards)
-        if is_four:
-            return ("four_of_kind", four_hand)
-
-        is_full_house, fh_hand = full_house(cards)
-        if is_full_house:
-            return ("full_house", fh_hand)
-
-        is_flush, flush_hand = flush(cards)
-        if is_flush:
-            return ("flush", flush_hand)
-
-        is_straight, straight_hand = straight(cards)
-        if is_straight:
-            return ("straight", straight_hand)
-
-        is_three, three_hand = three_of_a_kind(cards)
-        if is_three:
-            return ("three_of_kind", three_hand)
-
-        is_two_pair, tp_hand = two_pair(cards)
-        if is_two_pair:
-            return ("two_pair", tp_hand)
-
-        is_pair, pair_hand = pair(cards)
-        if is_pair:
-            return ("pair", pair_hand)
+        )
 
-        high_cards = sorted(cards, reverse=True)[:5]
-        return ("high_card", high_cards)
+    def _evaluate_hand(self, cards):  # input is a Stack or list of cards
+        return evaluate_cards_cached(cards)
 
     def _compare_hands(self, hand1, hand2):
-        hand_ranking = {
-            "high_card": 1,
-            "pair": 2,
-            "two_pair": 3,
-            "three_of_kind": 4,
-            "straight": 5,
-            "flush": 6,
-            "full_house": 7,
-            "four_of_kind": 8,
-            "straight_flush": 9
-        }
-
-        rank1, cards1 = hand1
-        rank2, cards2 = hand2
-
-        if hand_ranking[rank1] > hand_ranking[rank2]:
-            return 1
-        elif hand_ranking[rank1] < hand_ranking[rank2]:
-            return -1
-        else:
-            # Same rank, compare the cards
-            if rank1 in ["straight_flush", "straight", "flush", "high_card"]:  # compare cards in hands
-                for i in range(5):
-                    if cards1[i].gt(cards2[i], RANKS):
-                        return 1
-                    elif cards1[i].lt(cards2[i], RANKS):
-                        return -1
-                return 0  # Tie
-            elif rank1 in ["four_of_kind", "full_house"]:  # compare quads first, then kicker
-                if cards1[0].gt(cards2[0], RANKS):
-                    return 1
-                elif cards1[0].lt(cards2[0], RANKS):
-                    return -1
-                else:
-                    if cards1[1].gt(cards2[1], RANKS):
-                        return 1
-                    elif cards1[1].lt(cards2[1], RANKS):
-                        return -1
-                    else:
-                        return 0
-            elif rank1 in ["three_of_kind", "pair"]:  # compare trips/pair first, then kickers
-                if cards1[0].gt(cards2[0], RANKS):
-                    return 1
-                elif cards1[0].lt(cards2[0], RANKS):
-                    return -1
-                else:
-                    for i in range(len(cards1[1])):
-                        if cards1[1][i].gt(cards2[1][i], RANKS):
-                            return 1
-                        elif cards1[1][i].lt(cards2[1][i], RANKS):
-                            return -1
-                    return 0
-            elif rank1 == "two_pair":  # compare high pair, then low pair, then kicker
-                if cards1[0].gt(cards2[0], RANKS):
-                    return 1
-                elif cards1[0].lt(cards2[0], RANKS):
-                    return -1
-                else:
-                    if cards1[1].gt(cards2[1], RANKS):
-                        return 1
-                    elif cards1[1].lt(cards2[1], RANKS):
-                        return -1
-                    else:
-                        if cards1[2].gt(cards2[2], RANKS):
-                            return 1
-                        elif cards1[2].lt(cards2[2], RANKS):
-                            return -1
-                        else:
-                            return 0
-            return None  # wrong input
+        strength1 = result_strength(hand1)
+        strength2 = result_strength(hand2)
+        return (strength1 > strength2) - (strength1 < strength2)
 
     async def _reset_game(self):
-        self.deck = None
-        self.board_cards = Stack()
+        if self.hand_rng is not None:
+            self.shuffle_service.reveal(self.id, self.hand_number, self.hand_rng, self.session)
+            self.hand_rng = None
+        self.board_cards = []
+        self.hand_states = {}
         self.pot = 0
         self.current_max_bet = 0
         self.current_player_position = None
@@ -538,8 +463,8 @@ class PokerGame:
         active_players = self.get_all_players()
         return len(active_players) >= 2 and self.game_state == 'waiting'
 
-    async def start_game(self):
-        ''' Start a new poker game if there are enough players. Set dealer'''
+    def _begin_hand(self):
+        ''' Move the dealer button if a new hand can start '''
         active_players = self.get_all_players()
         if self.can_start_game() and self.ready_for_new_round:
             if self.dealer_position is None:
@@ -550,55 +475,115 @@ class PokerGame:
                     next_position = (next_position + 1) % len(self.players)
                 self.dealer_position = next_position
             self.ready_for_new_round = False
-            await self._transition_state("pre_flop")
             return True
         return False
 
+    async def start_game(self):
+        '''
+        Start a new poker game if there are enough players. The calling task becomes
+        the table driver and keeps playing hands until the table cannot continue.
+        '''
+        if self.driver_running or not self._begin_hand():
+            return False
+        await self._run_table('pre_flop')
+        return True
+
     def add_player(self, player):
         for i in self.players:
             if self.players[i] is None:
-                self.players[i] = {
-                    'username': player.username,
-                    'chip_count': self.default_chip_count,
-                    'cards': None,
-                    'folded': False,
-                    'all_in': False,
-                    'current_bet': 0,
-                    'active': False, # pending implementation
-                }
+                self.players[i] = Seat(self, i, player.username, self.default_chip_count)
+                self.players[i].time_bank = self.time_bank
+                self.seat_index[player.username] = i
+                self.seated_mask |= 1 << i
+                self.public_version += 1
                 return i
         return None  # No available slot
 
     def remove_player(self, identifier):
         position, player = self.get_player(identifier)
         if position is not None:
-            if self.current_player_position == position and self.waiting_for_player and not self.player_action_event.is_set():
-                self.waiting_for_player = False
-                self.player_action_event.set()
+            if self.current_player_position == position and self.waiting_for_player:
+                self.waiting_for_player = False # stops the wait for their action
             self.players[position] = None
+            self.seat_index.pop(player['username'], None)
+            self.seated_mask &= ~(1 << position)
+            self.in_hand_mask &= ~(1 << position)
+            self.acting_mask &= ~(1 << position)
+            self.public_version += 1
             return position
         return None
 
     def get_player(self, identifier): # get player by username or position
         if isinstance(identifier, str):
-            for i in self.players:
-                if self.players[i] and self.players[i]['username'] == identifier:
-                    return i, self.players[i]
+            position = self.seat_index.get(identifier)
+            if position is not None:
+                return position, self.players[position]
         elif isinstance(identifier, int):
             if identifier in self.players and self.players[identifier]:
                 return identifier, self.players[identifier]
         return None, None  # Player not found
 
     def get_all_players(self):
-        return {i: self.players[i] for i in self.players if self.players[i] is not None}
+        return SeatSet(self.players, self.seated_mask)
 
     def get_all_active_players(self):
-        return {i: self.players[i] for i in self.players if self.players[i] is not None \
-                and not self.players[i]['folded'] and not self.players[i]['all_in'] and self.players[i]['active']}
+        return SeatSet(self.players, self.acting_mask)
 
     def get_not_folded_players(self):
-        return {i: self.players[i] for i in self.players if self.players[i] is not None \
-                and not self.players[i]['folded'] and self.players[i]['active']}
+        return SeatSet(self.players, self.in_hand_mask)
+
+    def public_snapshot(self):
+        '''
+        JSON text of the table state every viewer shares, as of room frame `seq`: seats
+        with the hands face down, board, pot and the acting player. Built when first asked
+        for and kept until a broadcast or a seat change, so a crowd of spectators joining
+        between two events is served one encoded blob.
+        '''
+        key = (self.public_version, self.seq)
+        if self.public_state is None or self.public_state[0] != key:
+            players = {}
+            for pos, seat in self.get_all_players().items():
+                player = players[pos] = seat.copy()
+                if player['cards'] is not None:
+                    player['cards'] = ['reverse', 'reverse']
+            acting = self._acting_seat()
+            self.public_state = (key, json.dumps({
+                'seq': self.seq,
+                'game_state': self.game_state,
+                'players': players,
+                'dealer_position': self.dealer_position,
+                'board_cards': [str(card) for card in self.board_cards],
+                'pot': self.pot,
+                'acting': acting['username'] if acting else None,
+            }))
+        return self.public_state[1]
+
+    def snapshot(self, message_type='snapshot', username=None):
+        '''
+        A `message_type` message with the table state, for a client joining or one that
+        missed a frame: it applies the snapshot and then the frames numbered after it. The
+        seat, cards and turn of `username` go in front of the shared public snapshot.
+        '''
+        private = {'type': message_type, 'your_position': self.seat_index.get(username)}
+        if private['your_position'] is not None:
+            seat = self.players[private['your_position']]
+            if seat['cards'] is not None:
+                private['your_cards'] = [str(card) for card in seat['cards']]
+            if self._acting_seat() is seat:
+                private['your_turn'] = self._turn_info(seat)
+        return json.dumps(private)[:-1] + ', ' + self.public_snapshot()[1:]
+
+    def _acting_seat(self):
+        if self.waiting_for_player and self.current_player_position is not None:
+            return self.players[self.current_player_position]
+        return None
+
+    def _update_seat_masks(self, seat):
+        ''' Called by Seat when active, folded or all_in changes '''
+        bit = 1 << seat.position
+        in_hand = seat.active and not seat.folded
+        self.in_hand_mask = self.in_hand_mask | bit if in_hand else self.in_hand_mask & ~bit
+        self.acting_mask = self.acting_mask | bit if in_hand and not seat.all_in else self.acting_mask & ~bit
 
     def player_bet(self, identifier, amount):
         position, player = self.get_player(identifier)
@@ -622,13 +607,167 @@ class PokerGame:
     async def _wait_for_player_action(self, position):
         ''' Notify player to act and wait for their action '''
         self.waiting_for_player = True
-        self.player_action_event.clear()
         pos, player = self.get_player(position)
 
-        if pos is not None and player:
+        if pos is not None and player and self.action_policy:
+            action, amount = self.action_policy.act(self, position)
+            accepted, error = await self.player_action(position, action, amount)
+            if not accepted:
+                raise RuntimeError(f"Policy action {action} {amount} at seat {position} rejected: {error}")
+        elif pos is not None and player:
             await self.notify_player_turn(position)
             await self.broadcast_player_turn(position)
-            await self.player_action_event.wait()  # Wait until player acts
+            if not await self._serve_until(self._player_acted, self.action_timeout) \
+                    and not await self._spend_time_bank(position, player):
+                await self._act_on_timeout(position, player)
+
+    async def _spend_time_bank(self, position, player):
+        ''' Keep waiting out of the seat's time bank, True if the player acted in time '''
+        if player.time_bank <= 0:
+            return False
+        await self._send_broadcast_message('time_bank', {
+            'position': position,
+            'seconds': player.time_bank,
+        })
+        started = time.perf_counter()
+        acted = await self._serve_until(self._player_acted, player.time_bank)
+        player.time_bank = max(0, int(player.time_bank - (time.perf_counter() - started))) if acted else 0
+        return acted
+
+    def _player_acted(self):
+        return not self.waiting_for_player
+
+    async def _act_on_timeout(self, position, player):
+        ''' Check if possible, fold otherwise '''
+        action = 'call' if player['current_bet'] == self.current_max_bet else 'fold'
+        await self._send_private_message(player['username'], 'action_timeout', {'action': action})
+        await self.player_action(position, action)
+
+    async def post(self, command, *args):
+        '''
+        Queue a command for the table actor and wait for its result: join (user),
+        leave (username), action (username, action, amount), start, seats or snapshot
+        (message type, username or None). The actor task
+        is started on demand and exits when the table is empty.
+        '''
+        loop = asyncio.get_running_loop()
+        if self.actor_task is None or self.actor_task.done():
+            self.actor_task = loop.create_task(self._serve_forever())
+        future = loop.create_future()
+        await self.inbox.put((command, args, future, time.perf_counter()))
+        self.actor_stats['max_depth'] = max(self.actor_stats['max_depth'], self.inbox.qsize())
+        return await future
+
+    def _post_timeout(self, token):
+        ''' Timer wheel callback: a clock expiry reaches the table as a command '''
+        try:
+            self.inbox.put_nowait(('timeout', (token,), None, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.timers.schedule(0, self._post_timeout, token) # try again next tick
+
+    async def _serve_forever(self):
+        while True:
+            await self._handle(await self.inbox.get())
+            await self._flush_messages()
+            if not self.seated_mask and self.inbox.empty() and not self.driver_running:
+                return # nobody left to send commands, post() starts a new actor
+
+    async def _serve_until(self, done, seconds):
+        '''
+        Handle commands from inside a running hand until done() is true, False if
+        `seconds` passed first. The deadline arrives through the inbox as well, so only
+        the task running the table ever changes its state.
+        '''
+        if done():
+            return True
+        self.clock_token += 1
+        token = self.clock_token
+        timer = self.timers.schedule(seconds, self._post_timeout, token)
+        try:
+            while not done():
+                await self._flush_messages() # the table waits, the step is over
+                command = await self.inbox.get()
+                if command[0] == 'timeout':
+                    if command[1][0] == token:
+                        return False
+                    continue # clock stopped before it fired
+                await self._handle(command)
+            return True
+        finally:
+            timer.cancel()
+
+    async def _handle(self, command):
+        kind, args, future, posted = command
+        if kind == 'timeout':
+            return
+        started = False
+        try:
+            result = await self.command_handlers[kind](*args)
+            started = kind == 'start' and result
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        self._record_command(kind, time.perf_counter() - posted)
+        if started:
+            try:
+                await self._run_table('pre_flop')
+            except Exception:
+                logger.exception("Table %s stopped in state %s", self.id, self.game_state)
+                await self._abort_hand()
+
+    async def _abort_hand(self):
+        ''' Back to waiting after the driver failed, players keep their seats and chips left '''
+        self.game_state = 'waiting'
+        self.waiting_for_player = False
+        await self._reset_game()
+        await self.notify_reset()
+
+    def _record_command(self, kind, latency):
+        stats = self.actor_stats
+        stats['commands'][kind] = stats['commands'].get(kind, 0) + 1
+        total, longest = stats['latency'].get(kind, (0.0, 0.0))
+        stats['latency'][kind] = (total + latency, max(longest, latency))
+
+    async def _on_join(self, user):
+        ''' Seat a player, the room learns about them from one new_player event '''
+        position = self.add_player(user)
+        if position is not None:
+            await self._send_broadcast_message('new_player', {
+                'position': position,
+                'username': user.username,
+                'chip_count': self.players[position]['chip_count'],
+            })
+        return position
+
+    async def _on_leave(self, username):
+        position = self.remove_player(username)
+        if position is not None:
+            await self._send_broadcast_message('player_left', {'position': position})
+        return position
+
+    async def _on_seats(self):
+        ''' Seats as plain dicts with card names, for consumers in this or another process '''
+        seats = {pos: seat.copy() for pos, seat in self.get_all_players().items()}
+        for seat in seats.values():
+            if seat['cards'] is not None:
+                seat['cards'] = [str(card) for card in seat['cards']]
+        return seats
+
+    async def _on_snapshot(self, message_type='snapshot', username=None):
+        await self._flush_messages() # pending events get their number before the snapshot is taken
+        return self.snapshot(message_type, username)
+
+    async def _on_binary(self, count):
+        ''' A socket taking binary frames connected (1) or left (-1) '''
+        self.binary_sockets = max(0, self.binary_sockets + count)
+        return self.binary_sockets
+
+    async def _on_start(self):
+        ''' True if a hand starts, the actor then plays it after replying '''
+        return not self.driver_running and self._begin_hand()
 
     async def player_action(self, identifier, action, amount=0):
         '''check is handled as call with amount 0'''
@@ -676,7 +815,6 @@ class PokerGame:
             return False, "Invalid action."
 
         self.waiting_for_player = False
-        self.player_action_event.set()
         return True, None
     
     async def notify_clear_betting(self):
@@ -725,16 +863,17 @@ class PokerGame:
     async def notify_player_turn(self, identifier):
         position, player = self.get_player(identifier)
         if position is not None:
-            await self._send_private_message(
-                player['username'],
-                'your_turn',
-                {
-                    'current_bet': self.current_max_bet,
-                    'player_bet': player['current_bet'],
-                    'chip_count': player['chip_count'],
-                    'pot': self.pot,
-                }
-            )
+            await self._send_private_message(player['username'], 'your_turn', self._turn_info(player))
+
+    def _turn_info(self, player):
+        return {
+            'current_bet': self.current_max_bet,
+            'player_bet': player['current_bet'],
+            'chip_count': player['chip_count'],
+            'pot': self.pot,
+            'time_to_act': self.action_timeout,
+            'time_bank': player.time_bank,
+        }
 
     async def notify_showdown(self, remaining_players):
         await self._send_broadcast_message(
@@ -756,9 +895,57 @@ class PokerGame:
 
 
     async def _send_broadcast_message(self, type, message):
+        self.public_version += 1 # every change of the public state is announced to the room
         if self.message_callback:
             await self.message_callback(type, message)
+        if self.frame_callback:
+            self._queue_event(self.outbox, type, message)
 
     async def _send_private_message(self, username, type, message):
         if self.private_message_callback:
-            await self.private_message_callback(username, type, message)
\ No newline at end of file
+            await self.private_message_callback(username, type, message)
+        if self.private_frame_callback:
+            self._queue_event(self.private_outbox.setdefault(username, []), type, message)
+
+    def _queue_event(self, events, type, message):
+        events.append({'type': type, **message})
+        if self.batch_window and self.batch_timer is None:
+            self.batch_timer = self.timers.schedule(self.batch_window, self._flush_later)
+
+    def _flush_later(self):
+        ''' Timer wheel callback: a step that takes longer than batch_window sends what it has '''
+        self.batch_timer = None
+        task = asyncio.ensure_future(self._flush_messages())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        self.flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Table %s could not send its messages", self.id, exc_info=task.exception())
+
+    async def _flush_messages(self):
+        '''
+        Send the queued events as one frame per stream, the room and each player. The actor
+        flushes whenever it is about to wait for a command, so a step (an action and the
+        street, turn and hand changes it causes) reaches every socket as a single frame.
+        Events keep their order within a stream. Frames are only binary encoded while a
+        socket of the room takes them.
+        '''
+        if self.batch_timer is not None:
+            self.batch_timer.cancel()
+            self.batch_timer = None
+        if not self.outbox and not self.private_outbox:
+            return
+        async with self.flush_lock:
+            events, self.outbox = self.outbox, []
+            private_events, self.private_outbox = self.private_outbox, {}
+            binary = self.binary_sockets > 0
+            if events and self.frame_callback:
+                self.seq += 1
+                await self.frame_callback(encode_frame(events, self.seq),
+                                          wire.encode_frame(events, self.seq) if binary else None)
+            if self.private_frame_callback:
+                for username, events in private_events.items():
+                    await self.private_frame_callback(username, encode_frame(events),
+                                                      wire.encode_frame(events) if binary else None)
\ No newline at end of file
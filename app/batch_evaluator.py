@@ -0,0 +1,49 @@
+'''
+Vectorized hand evaluation for offline jobs (equity tables, bot training, regression runs).
+Scores whole (N, k) arrays of card codes with the same lookup tables as hand_ranks,
+so every result is identical to the scalar hand_ranks.rank_codes.
+'''
+import numpy as np
+
+from . import hand_ranks
+
+BINOMIALS = np.array(hand_ranks.BINOMIALS, dtype=np.int64)
+DEFAULT_CHUNK_SIZE = 1 << 18
+
+
+def _tables():
+    tables = hand_ranks._tables or hand_ranks._load()
+    return {key: np.frombuffer(table, dtype=np.uint32) for key, table in tables.items()}
+
+
+def _evaluate_chunk(codes, tables):
+    size = codes.shape[1]
+    ranks = codes % 13
+    suits = codes // 13
+    rank_bits = np.left_shift(1, ranks)
+
+    # a hand of at most 7 cards has at most one suit with 5 or more cards
+    flush_masks = np.zeros(len(codes), dtype=np.int64)
+    for suit in range(4):
+        in_suit = suits == suit
+        suit_mask = np.where(in_suit, rank_bits, 0).sum(axis=1)
+        flush_masks += np.where(in_suit.sum(axis=1) >= 5, suit_mask, 0)
+
+    sorted_ranks = np.sort(ranks, axis=1)
+    index = BINOMIALS[np.arange(size), sorted_ranks].sum(axis=1)
+    return np.where(flush_masks > 0, tables['flush'][flush_masks], tables[size][index])
+
+
+def evaluate_batch(codes, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    Evaluate an (N, k) array of card codes (5 <= k <= 7, see hand_evaluator) and
+    return an (N,) uint32 array of hand strengths comparable with hand_ranks.rank_codes.
+    '''
+    codes = np.asarray(codes, dtype=np.int64)
+    if codes.ndim != 2 or codes.shape[1] not in hand_ranks.HAND_SIZES:
+        raise ValueError(f"Expected an (N, 5-7) array of card codes, got shape {codes.shape}.")
+    tables = _tables()
+    result = np.empty(len(codes), dtype=np.uint32)
+    for start in range(0, len(codes), chunk_size):
+        result[start:start + chunk_size] = _evaluate_chunk(codes[start:start + chunk_size], tables)
+    return result
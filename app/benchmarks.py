@@ -0,0 +1,142 @@
+'''
+Throughput benchmarks for hand evaluation on fixed, seeded 7 card inputs, following
+the path live tables take: a seat's HandState gets the hole cards and the board street
+by street with a result() for every hand_value push (hand_state), and showdown ranks
+the seats by HandState.strength() (showdown). PokerGame._evaluate_hand and
+PokerGame._compare_hands are measured as a reference for the older code path.
+Results are plain dicts that can be saved as JSON and compared against a saved baseline.
+'''
+import json
+import platform
+import random
+import time
+from pathlib import Path
+
+from .cards import card
+from .hand_evaluator import HandState, evaluation_cache
+from .PokerGame import PokerGame
+
+SCENARIOS = ('random', 'flush_heavy', 'paired')
+DEFAULT_HANDS = 20000
+DEFAULT_REPEAT = 5
+DEFAULT_SEED = 1
+DEFAULT_TOLERANCE = 0.15  # allowed relative drop in hands per second
+
+
+def _random_hand(rng):
+    return rng.sample(range(52), 7)
+
+
+def _flush_heavy_hand(rng):
+    ''' 5-7 cards of one suit, so every hand goes down the flush branches. '''
+    suit = rng.randrange(4)
+    suited = rng.randint(5, 7)
+    cards = [suit * 13 + rank for rank in rng.sample(range(13), suited)]
+    others = [code for code in range(52) if code // 13 != suit]
+    return cards + rng.sample(others, 7 - suited)
+
+
+def _paired_hand(rng):
+    ''' Random hole cards on a board with at least one pair. '''
+    pair_rank, *ranks = rng.sample(range(13), 4)
+    board = [suit * 13 + pair_rank for suit in rng.sample(range(4), 2)]
+    board += [rng.randrange(4) * 13 + rank for rank in ranks[:3]]
+    return rng.sample([code for code in range(52) if code not in board], 2) + board
+
+
+HAND_MAKERS = {
+    'random': _random_hand,
+    'flush_heavy': _flush_heavy_hand,
+    'paired': _paired_hand,
+}
+
+
+def make_hands(scenario, count=DEFAULT_HANDS, seed=DEFAULT_SEED):
+    ''' The same `count` hands (lists of pydealer cards) for a given scenario and seed. '''
+    rng = random.Random(f'{scenario}:{seed}')
+    return [[card(code) for code in HAND_MAKERS[scenario](rng)] for _ in range(count)]
+
+
+def _best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        evaluation_cache.clear() # every run evaluates the hands, as live play mostly does
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _play_streets(cards):
+    ''' A seat through a hand: hole cards, then flop, turn and river with a result() each '''
+    state = HandState(cards[:2])
+    state.add_cards(cards[2:5])
+    state.result()
+    state.add(cards[5])
+    state.result()
+    state.add(cards[6])
+    return state.result()
+
+
+def _showdown(inputs):
+    ''' Winners of neighbouring hands paired up, ranked by strength as _setup_showdown does '''
+    strengths = [HandState(cards).strength() for cards in inputs]
+    return [max(pair) for pair in zip(strengths, strengths[1:] + strengths[:1])]
+
+
+def run_benchmarks(hands=DEFAULT_HANDS, repeat=DEFAULT_REPEAT, seed=DEFAULT_SEED):
+    '''
+    Hands per second of every benchmark and scenario, best of `repeat`. hand_state and
+    showdown are the live path, evaluate_hand and compare_hands the reference.
+    '''
+    game = PokerGame(id=0, big_blind=2)
+    results = {}
+    for scenario in SCENARIOS:
+        inputs = make_hands(scenario, hands, seed)
+        seconds = _best_time(lambda: [_play_streets(cards) for cards in inputs], repeat)
+        results[f'hand_state/{scenario}'] = hands / seconds
+        seconds = _best_time(lambda: _showdown(inputs), repeat)
+        results[f'showdown/{scenario}'] = hands / seconds
+
+        evaluate_hand = game._evaluate_hand
+        seconds = _best_time(lambda: [evaluate_hand(cards) for cards in inputs], repeat)
+        results[f'evaluate_hand/{scenario}'] = hands / seconds
+
+        evaluated = [evaluate_hand(cards) for cards in inputs]
+        pairs = list(zip(evaluated, evaluated[1:] + evaluated[:1]))
+        compare_hands = game._compare_hands
+        seconds = _best_time(lambda: [compare_hands(hand1, hand2) for hand1, hand2 in pairs], repeat)
+        results[f'compare_hands/{scenario}'] = hands / seconds
+    return {
+        'hands': hands,
+        'repeat': repeat,
+        'seed': seed,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def save_results(report, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2) + '\n')
+
+
+def load_results(path):
+    return json.loads(Path(path).read_text())
+
+
+def compare_results(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    '''
+    Benchmarks whose throughput dropped by more than `tolerance` (a fraction) against
+    the baseline, as (name, baseline, current) tuples. Benchmarks missing from either
+    side are ignored.
+    '''
+    regressions = []
+    for name, expected in baseline['results'].items():
+        current = report['results'].get(name)
+        if current is not None and current < expected * (1 - tolerance):
+            regressions.append((name, expected, current))
+    return regressions
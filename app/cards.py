@@ -0,0 +1,86 @@
+'''
+Flyweight playing cards and an array backed deck.
+
+The 52 cards are created once per process and shared by every table. A card is
+identified by its code (see hand_evaluator) and its websocket name is computed once.
+A deck is a bytearray of codes dealt with a partial Fisher-Yates shuffle: only the
+cards actually dealt are shuffled and a new hand allocates nothing.
+'''
+import random
+
+from pydealer.card import Card, card_abbrev, card_name
+
+from .hand_evaluator import SUITS, VALUES
+
+
+class PlayingCard(Card):
+    ''' Immutable pydealer compatible card that knows its code. '''
+
+    def __init__(self, code):
+        value, suit = VALUES[code % 13], SUITS[code // 13]
+        for attribute, attribute_value in (('code', code), ('value', value), ('suit', suit),
+                                           ('abbrev', card_abbrev(value, suit)),
+                                           ('name', card_name(value, suit))):
+            object.__setattr__(self, attribute, attribute_value)
+
+    def __setattr__(self, attribute, value):
+        raise AttributeError("Cards are shared by all tables and cannot be modified.")
+
+    __delattr__ = __setattr__
+
+    def __str__(self):
+        return self.name
+
+    def __hash__(self):
+        return self.code
+
+    def __reduce__(self):
+        return card, (self.code,)
+
+
+CARDS = tuple(PlayingCard(code) for code in range(52))
+CARD_NAMES = tuple(card.name for card in CARDS)
+FRESH_DECK = bytes(range(52))
+
+
+def card(code):
+    return CARDS[code]
+
+
+class CardDeck:
+    '''
+    52 card codes in a bytearray. Each deal swaps a uniformly chosen undealt card into
+    the dealt prefix, so only dealt cards are ever shuffled. `rng` is anything with
+    randrange, the random module by default.
+    '''
+    __slots__ = ('codes', 'dealt', 'rng')
+
+    def __init__(self, rng=None):
+        self.codes = bytearray(FRESH_DECK)
+        self.dealt = 0
+        self.rng = rng or random
+
+    def shuffle(self, rng=None):
+        ''' Start a new hand, optionally with a new index source (see shuffle.HandRng). '''
+        self.codes[:] = FRESH_DECK  # same start order every hand, so a seed fully determines the deal
+        self.dealt = 0
+        if rng is not None:
+            self.rng = rng
+
+    def deal_codes(self, count=1):
+        start, end = self.dealt, self.dealt + count
+        if end > 52:
+            raise ValueError(f"Cannot deal {count} cards, {52 - start} left in the deck.")
+        codes = self.codes
+        randrange = self.rng.randrange
+        for i in range(start, end):
+            j = randrange(i, 52)
+            codes[i], codes[j] = codes[j], codes[i]
+        self.dealt = end
+        return codes[start:end]
+
+    def deal(self, count=1):
+        return [CARDS[code] for code in self.deal_codes(count)]
+
+    def __len__(self):
+        return 52 - self.dealt
@@ -0,0 +1,281 @@
+'''
+Channel layer for several ASGI worker processes on one host, without Redis.
+
+A broker process (manage.py run_channel_broker) owns every channel queue and group and
+serves them on a Unix socket. BrokerChannelLayer is the channels backend the workers
+use, each layer call is one request to the broker (see ipc.py). Capacity and expiry
+work like InMemoryChannelLayer: the broker applies the values the sending worker's
+layer is configured with. Messages must be JSON serialisable apart from bytes values.
+'''
+import asyncio
+import os
+import random
+import re
+import string
+import tempfile
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+from .ipc import IpcClient, encode, read_frame, start_server
+
+BROKER_PATH = os.getenv('POKER_CHANNEL_BROKER', str(Path(tempfile.gettempdir()) / 'poker-channel-broker.sock'))
+SWEEP_INTERVAL = 10 # seconds between expiry sweeps over all channels
+PARKED = object() # receive waiting for a message, answered later
+
+
+class ChannelBroker:
+    def __init__(self, path=BROKER_PATH):
+        self.path = path
+        self.channels = {} # channel -> deque of (expires, message)
+        self.waiters = {} # channel -> deque of (stream writer, request id) parked in receive
+        self.groups = {} # group -> {channel: joined at}
+        self.memberships = {} # channel -> set of groups
+        self._patterns = {}
+
+    async def serve(self):
+        server = await start_server(self.path, self._connection)
+        sweeper = asyncio.create_task(self._sweep())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            now = time.time()
+            for channel in list(self.channels):
+                self._expire(channel, now)
+
+    async def _connection(self, reader, connection):
+        try:
+            while True:
+                request = await read_frame(reader)
+                try:
+                    result = getattr(self, f"op_{request['op']}")(connection, **request)
+                except Exception as e:
+                    connection.write(_reply(request['id'], error=repr(e)))
+                else:
+                    if result is not PARKED:
+                        connection.write(_reply(request['id'], result))
+                await connection.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass # client went away or the broker is shutting down
+        finally:
+            for channel in list(self.waiters):
+                self._drop_waiters(channel, lambda waiter: waiter[0] is connection)
+            connection.close()
+
+    # operations, all synchronous so every request is applied atomically and in order
+
+    def op_send(self, connection, channel, message, capacity, expiry, **request):
+        return self._deliver(channel, message, capacity, expiry, time.time())
+
+    def op_receive(self, connection, channel, id, **request):
+        self._expire(channel, time.time())
+        queue = self.channels.get(channel)
+        if queue:
+            message = queue.popleft()[1]
+            if not queue:
+                del self.channels[channel]
+            return message
+        self.waiters.setdefault(channel, deque()).append((connection, id))
+        return PARKED
+
+    def op_cancel(self, connection, target, **request):
+        ''' Drop a parked receive the client gave up on, answered with None '''
+        for channel in list(self.waiters):
+            if self._drop_waiters(channel, lambda waiter: waiter == (connection, target)):
+                connection.write(_reply(target, None))
+                return True
+        return False # already answered, the client keeps the message for its next receive
+
+    def op_group_add(self, connection, group, channel, **request):
+        self.groups.setdefault(group, {})[channel] = time.time()
+        self.memberships.setdefault(channel, set()).add(group)
+        return True
+
+    def op_group_discard(self, connection, group, channel, **request):
+        self._discard(group, channel)
+        return True
+
+    def op_group_send(self, connection, group, message, capacity, channel_capacity, expiry, group_expiry,
+                      **request):
+        now = time.time()
+        members = self.groups.get(group, {})
+        for channel, joined in list(members.items()):
+            if joined < now - group_expiry:
+                self._discard(group, channel)
+                continue
+            self._expire(channel, now)
+            if channel in members: # a full channel just misses the message, as in the other layers
+                self._deliver(channel, message, self._capacity(channel, capacity, channel_capacity), expiry, now)
+        return True
+
+    def op_flush(self, connection, **request):
+        for channel in list(self.waiters):
+            self._drop_waiters(channel, lambda waiter: True)
+        self.channels.clear()
+        self.groups.clear()
+        self.memberships.clear()
+        return True
+
+    def _deliver(self, channel, message, capacity, expiry, now):
+        self._expire(channel, now)
+        waiters = self.waiters.get(channel)
+        if waiters:
+            connection, request_id = waiters.popleft()
+            if not waiters:
+                del self.waiters[channel]
+            connection.write(_reply(request_id, message))
+            return True
+        queue = self.channels.setdefault(channel, deque())
+        if len(queue) >= capacity:
+            return False
+        queue.append((now + expiry, message))
+        return True
+
+    def _expire(self, channel, now):
+        ''' Drop expired messages, a channel nobody reads from also leaves its groups '''
+        queue = self.channels.get(channel)
+        if not queue or queue[0][0] >= now:
+            return
+        while queue and queue[0][0] < now:
+            queue.popleft()
+        if not queue:
+            del self.channels[channel]
+        for group in list(self.memberships.get(channel, ())):
+            self._discard(group, channel)
+
+    def _discard(self, group, channel):
+        members = self.groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+        groups = self.memberships.get(channel)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self.memberships[channel]
+
+    def _drop_waiters(self, channel, match):
+        waiters = self.waiters[channel]
+        kept = deque(waiter for waiter in waiters if not match(waiter))
+        dropped = len(kept) != len(waiters)
+        if kept:
+            self.waiters[channel] = kept
+        else:
+            del self.waiters[channel]
+        return dropped
+
+    def _capacity(self, channel, capacity, channel_capacity):
+        for pattern, value in channel_capacity:
+            if pattern not in self._patterns:
+                self._patterns[pattern] = re.compile(pattern)
+            if self._patterns[pattern].match(channel):
+                return value
+        return capacity
+
+
+def _reply(request_id, result=None, error=None):
+    return encode({'id': request_id, 'error': error} if error else {'id': request_id, 'result': result})
+
+
+def run_broker(path=BROKER_PATH):
+    asyncio.run(ChannelBroker(path).serve())
+
+
+class BrokerClient(IpcClient):
+    def __init__(self, path):
+        super().__init__(path)
+        self.stash = {} # channel -> messages answered to receives that were cancelled
+
+    def cancelled(self, request_id, op, fields):
+        if op == 'receive':
+            asyncio.ensure_future(self._cancel(request_id))
+
+    async def _cancel(self, request_id):
+        try:
+            await self.request('cancel', target=request_id)
+        except ConnectionError:
+            pass
+
+    def orphaned(self, op, fields, result):
+        if op == 'receive' and result is not None:
+            self.stash.setdefault(fields['channel'], deque()).append(result)
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    '''
+    CHANNEL_LAYERS backend talking to a ChannelBroker:
+    {'BACKEND': 'app.channel_layer.BrokerChannelLayer', 'CONFIG': {'path': ...}}
+    '''
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path=BROKER_PATH, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = path
+        self.group_expiry = group_expiry
+        self.client_prefix = uuid.uuid4().hex # process specific channels of this layer
+        self._broker = None
+
+    def _client(self):
+        if self._broker is None or self._broker.loop is not asyncio.get_running_loop():
+            self._broker = BrokerClient(self.path)
+        return self._broker
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        if not await self._client().request('send', channel=channel, message=message,
+                                            capacity=self.get_capacity(channel), expiry=self.expiry):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        client = self._client()
+        stashed = client.stash.get(channel)
+        if stashed:
+            message = stashed.popleft()
+            if not stashed:
+                del client.stash[channel]
+            return message
+        return await client.request('receive', channel=channel)
+
+    async def new_channel(self, prefix='specific.'):
+        return '%s.%s!%s' % (prefix, self.client_prefix, ''.join(random.choice(string.ascii_letters)
+                                                                    for _ in range(12)))
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._client().request('group_add', group=group, channel=channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        await self._client().request('group_discard', group=group, channel=channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self._client().request('group_send', group=group, message=message, capacity=self.capacity,
+                                     channel_capacity=[[pattern.pattern, value]
+                                                       for pattern, value in self.channel_capacity],
+                                     expiry=self.expiry, group_expiry=self.group_expiry)
+
+    async def flush(self):
+        await self._client().request('flush')
+
+    async def close(self):
+        pass
@@ -0,0 +1,222 @@
+'''
+Monte Carlo equity calculator built on the batch evaluator.
+
+Given hole cards for every seat, a partial board and dead cards, runouts are sampled
+and scored in NumPy chunks. Sampling is split into independent jobs that run on a
+shared process pool, so the daphne event loop never does the CPU work itself.
+Heads-up and three-way spots on the flop or turn are enumerated exactly instead, and
+suit-isomorphic spots share one memoized result. Cards are passed as integer codes
+(see hand_evaluator).
+'''
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, permutations
+
+import numpy as np
+
+from . import hand_ranks, metrics
+from .batch_evaluator import evaluate_batch
+from .cache import LRUCache
+
+DEFAULT_ITERATIONS = 20000
+DEFAULT_TIME_BUDGET = 0.5  # seconds per request
+CHUNK_SIZE = 2000
+EXACT_MAX_SEATS = 3
+EXACT_MIN_BOARD = 3
+EXACT_CACHE_SIZE = 4096
+
+SUIT_PERMUTATIONS = tuple(permutations(range(4)))
+
+_executor = None
+_warm_jobs = [] # start up job of every pool worker, see pool_ready
+exact_cache = LRUCache(EXACT_CACHE_SIZE)
+metrics.register('exact_equity_cache', exact_cache.stats)
+
+
+def get_executor():
+    ''' Process pool shared by all tables in this process, created on first use. '''
+    global _executor, _warm_jobs
+    if _executor is None:
+        workers = int(os.getenv('POKER_EQUITY_WORKERS', 0)) or max(1, (os.cpu_count() or 2) - 1)
+        # spawn: forking a process that runs an event loop and threads is not safe
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        # one job per worker starts them all now, a spawned worker takes seconds to import and map the tables
+        _warm_jobs = [_executor.submit(_load_worker) for _ in range(workers)]
+    return _executor
+
+
+def _load_worker():
+    ''' Start up job: the worker imports this module and maps the rank tables once '''
+    hand_ranks._tables or hand_ranks._load()
+    return os.getpid()
+
+
+def warm_up():
+    ''' Start the pool when the process starts rather than on the first equity request. Does not wait. '''
+    get_executor()
+
+
+def pool_ready():
+    ''' True once the pool exists and every worker finished its start up job '''
+    return _executor is not None and all(job.done() for job in _warm_jobs)
+
+
+def _remaining_deck(hole_cards, board, dead):
+    used = {code for hand in hole_cards for code in hand} | set(board) | set(dead)
+    if len(used) != sum(len(hand) for hand in hole_cards) + len(board) + len(dead):
+        raise ValueError("The same card is used more than once.")
+    return np.array([code for code in range(52) if code not in used], dtype=np.int64)
+
+
+def _new_counts(seats):
+    return {'wins': [0] * seats, 'ties': [0] * seats, 'shares': [0.0] * seats, 'samples': 0}
+
+
+def _score_runouts(hole_cards, board, runouts, counts):
+    ''' Score an (N, missing) array of runouts and add the outcomes to counts. '''
+    samples = len(runouts)
+    boards = np.hstack([np.broadcast_to(np.array(board, dtype=np.int64), (samples, len(board))), runouts])
+    strengths = np.stack([
+        evaluate_batch(np.hstack([np.broadcast_to(np.array(hand, dtype=np.int64), (samples, 2)), boards]))
+        for hand in hole_cards
+    ], axis=1)
+    winners = strengths == strengths.max(axis=1, keepdims=True)
+    winner_counts = winners.sum(axis=1)
+    for seat in range(len(hole_cards)):
+        seat_wins = winners[:, seat]
+        counts['wins'][seat] += int((seat_wins & (winner_counts == 1)).sum())
+        counts['ties'][seat] += int((seat_wins & (winner_counts > 1)).sum())
+        counts['shares'][seat] += float((seat_wins / winner_counts).sum())
+    counts['samples'] += samples
+    return counts
+
+
+def _simulate(hole_cards, board, dead, iterations, time_budget, seed):
+    ''' Worker job: sample up to `iterations` runouts or stop after `time_budget` seconds. '''
+    deadline = time.monotonic() + time_budget if time_budget else None
+    rng = np.random.default_rng(seed)
+    deck = _remaining_deck(hole_cards, board, dead)
+    missing = 5 - len(board)
+    counts = _new_counts(len(hole_cards))
+    while counts['samples'] < iterations:
+        samples = min(CHUNK_SIZE, iterations - counts['samples'])
+        if missing:
+            # partial shuffle: take the first `missing` columns of a random permutation
+            runouts = deck[np.argpartition(rng.random((samples, len(deck))), missing, axis=1)[:, :missing]]
+        else:
+            runouts = np.empty((samples, 0), dtype=np.int64)
+        _score_runouts(hole_cards, board, runouts, counts)
+        if not missing or (deadline and time.monotonic() >= deadline):
+            break
+    return counts
+
+
+def _merge(results, seats):
+    total = _new_counts(seats)
+    for counts in results:
+        for key in ('wins', 'ties', 'shares'):
+            total[key] = [a + b for a, b in zip(total[key], counts[key])]
+        total['samples'] += counts['samples']
+    samples = total['samples'] or 1
+    return {
+        'win': [wins / samples for wins in total['wins']],
+        'tie': [ties / samples for ties in total['ties']],
+        'equity': [share / samples for share in total['shares']],
+        'samples': total['samples'],
+    }
+
+
+def _validate(hole_cards, board, dead):
+    if len(hole_cards) < 2 or any(len(hand) != 2 for hand in hole_cards):
+        raise ValueError("Equity needs at least two seats with two hole cards each.")
+    if len(board) > 5:
+        raise ValueError("A board has at most 5 cards.")
+    _remaining_deck(hole_cards, board, dead)
+
+
+def _jobs(hole_cards, board, dead, iterations, time_budget, jobs, seed):
+    hole_cards = [tuple(hand) for hand in hole_cards]
+    _validate(hole_cards, board, dead)  # fail before scheduling work
+    seeds = np.random.SeedSequence(seed).spawn(jobs)
+    per_job = -(-iterations // jobs)
+    return [(hole_cards, tuple(board), tuple(dead), per_job, time_budget, job_seed) for job_seed in seeds]
+
+
+def estimate_equity(hole_cards, board=(), dead=(), iterations=DEFAULT_ITERATIONS,
+                    time_budget=None, seed=None):
+    ''' Estimate win/tie probabilities in the current process. '''
+    jobs = _jobs(hole_cards, board, dead, iterations, time_budget, 1, seed)
+    return _merge([_simulate(*job) for job in jobs], len(hole_cards))
+
+
+def canonical_spot(hole_cards, board=(), dead=()):
+    '''
+    Key shared by every suit relabelling of a spot. Seat order is kept, cards inside a
+    hand, the board and dead cards are order independent.
+    '''
+    best = None
+    for permutation in SUIT_PERMUTATIONS:
+        def relabel(cards):
+            return tuple(sorted(permutation[code // 13] * 13 + code % 13 for code in cards))
+        key = (tuple(relabel(hand) for hand in hole_cards), relabel(board), relabel(dead))
+        if best is None or key < best:
+            best = key
+    return best
+
+
+def can_enumerate(hole_cards, board):
+    return len(hole_cards) <= EXACT_MAX_SEATS and EXACT_MIN_BOARD <= len(board) < 5
+
+
+def _enumerate(hole_cards, board, dead):
+    ''' Worker job: score every remaining runout. '''
+    deck = _remaining_deck(hole_cards, board, dead)
+    runouts = np.array(list(combinations(deck.tolist(), 5 - len(board))), dtype=np.int64)
+    return _score_runouts(hole_cards, board, runouts, _new_counts(len(hole_cards)))
+
+
+def exact_equity(hole_cards, board, dead=()):
+    ''' Enumerate all runouts in the current process, memoized by canonical spot. '''
+    key = canonical_spot(hole_cards, board, dead)
+    result = exact_cache.get(key)
+    if result is None:
+        _validate(hole_cards, board, dead)
+        result = _merge([_enumerate(*key)], len(hole_cards))
+        exact_cache.put(key, result)
+    return result
+
+
+async def calculate_equity_async(hole_cards, board=(), dead=(), executor=None, **kwargs):
+    '''
+    Exact equities when the spot is small enough to enumerate (memoized), otherwise
+    a Monte Carlo estimate. Neither runs on the event loop.
+    '''
+    if not can_enumerate(hole_cards, board):
+        return await estimate_equity_async(hole_cards, board, dead, executor=executor, **kwargs)
+    key = canonical_spot(hole_cards, board, dead)
+    result = exact_cache.get(key)
+    if result is None:
+        _validate(hole_cards, board, dead)
+        loop = asyncio.get_running_loop()
+        counts = await loop.run_in_executor(executor or get_executor(), _enumerate, *key)
+        result = _merge([counts], len(hole_cards))
+        exact_cache.put(key, result)
+    return result
+
+
+async def estimate_equity_async(hole_cards, board=(), dead=(), iterations=DEFAULT_ITERATIONS,
+                                time_budget=DEFAULT_TIME_BUDGET, seed=None, executor=None):
+    '''
+    Estimate win/tie probabilities on the process pool without blocking the event loop.
+    Work is split into one job per pool worker; each job stops at its share of the
+    iterations or when the time budget runs out, whichever comes first.
+    '''
+    executor = executor or get_executor()
+    jobs = _jobs(hole_cards, board, dead, iterations, time_budget,
+                 getattr(executor, '_max_workers', 1), seed)
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(loop.run_in_executor(executor, _simulate, *job) for job in jobs))
+    return _merge(results, len(hole_cards))
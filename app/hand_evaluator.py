@@ -0,0 +1,297 @@
+'''
+Bitmask based poker hand evaluator.
+
+Cards are encoded as integers ``suit * 13 + rank`` where rank 0 is a deuce and
+rank 12 is an ace, and suits follow pydealer ordering (Diamonds < Clubs < Hearts < Spades).
+A set of cards is a 52-bit mask, so every suit is a 13-bit rank mask and the whole
+hand is classified with a handful of bit operations instead of repeated scans.
+'''
+import os
+
+from . import metrics
+from .cache import LRUCache
+
+VALUES = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen', 'King', 'Ace')
+SUITS = ('Diamonds', 'Clubs', 'Hearts', 'Spades')
+
+HAND_CATEGORIES = (
+    'high_card',
+    'pair',
+    'two_pair',
+    'three_of_kind',
+    'straight',
+    'flush',
+    'full_house',
+    'four_of_kind',
+    'straight_flush',
+)
+
+RANK_MASK = 0x1FFF
+EVALUATION_CACHE_SIZE = int(os.getenv('POKER_EVALUATION_CACHE_SIZE', 16384))
+CARD_CODES = {(value, suit_name): suit * 13 + rank
+              for suit, suit_name in enumerate(SUITS)
+              for rank, value in enumerate(VALUES)}
+
+
+def _straight_high(rank_mask):
+    ''' Highest rank of a straight contained in rank_mask or -1. '''
+    for high in range(12, 3, -1):
+        window = 0x1F << (high - 4)
+        if rank_mask & window == window:
+            return high
+    wheel = (1 << 12) | 0xF
+    if rank_mask & wheel == wheel:
+        return 3
+    return -1
+
+
+# straight lookup for every possible 13-bit rank mask
+STRAIGHT_HIGH = tuple(_straight_high(mask) for mask in range(RANK_MASK + 1))
+
+
+def card_code(card):
+    return CARD_CODES[(card.value, card.suit)]
+
+
+def cards_to_mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << CARD_CODES[(card.value, card.suit)]
+    return mask
+
+
+def codes_to_mask(codes):
+    mask = 0
+    for code in codes:
+        mask |= 1 << code
+    return mask
+
+
+def _top_ranks(rank_mask, count):
+    ''' Return up to count highest ranks set in rank_mask, highest first. '''
+    ranks = []
+    while rank_mask and len(ranks) < count:
+        rank = rank_mask.bit_length() - 1
+        ranks.append(rank)
+        rank_mask ^= 1 << rank
+    return ranks
+
+
+def evaluate_mask(mask):
+    '''
+    Classify a 5-7 card hand given as a 52-bit card mask.
+    Returns (category, ranks) where category indexes HAND_CATEGORIES and ranks
+    holds the deciding ranks in comparison order, e.g. (trips, kicker, kicker).
+    '''
+    suit_masks = (mask & RANK_MASK, (mask >> 13) & RANK_MASK,
+                  (mask >> 26) & RANK_MASK, (mask >> 39) & RANK_MASK)
+
+    # bit-sliced rank counting: a rank bit lands in `twos` when seen twice etc.
+    ones = twos = threes = fours = 0
+    flush_mask = 0
+    for suit_mask in suit_masks:
+        fours |= threes & suit_mask
+        threes |= twos & suit_mask
+        twos |= ones & suit_mask
+        ones |= suit_mask
+        if suit_mask.bit_count() >= 5:
+            flush_mask = suit_mask
+    return _evaluate_bits(ones, twos, threes, fours, flush_mask)
+
+
+def _evaluate_bits(ones, twos, threes, fours, flush_mask):
+    ''' Classify a hand from its rank multiplicity masks and flush suit rank mask. '''
+    if flush_mask:
+        high = STRAIGHT_HIGH[flush_mask]
+        if high >= 0:
+            return 8, (high,)
+
+    if fours:
+        quad = fours.bit_length() - 1
+        return 7, (quad, (ones & ~(1 << quad)).bit_length() - 1)
+
+    if threes:
+        trips = threes.bit_length() - 1
+        pair_mask = twos & ~(1 << trips)
+        if pair_mask:
+            return 6, (trips, pair_mask.bit_length() - 1)
+
+    if flush_mask:
+        return 5, tuple(_top_ranks(flush_mask, 5))
+
+    high = STRAIGHT_HIGH[ones]
+    if high >= 0:
+        return 4, (high,)
+
+    if threes:
+        trips = threes.bit_length() - 1
+        return 3, (trips, *_top_ranks(ones & ~(1 << trips), 2))
+
+    if twos:
+        high_pair = twos.bit_length() - 1
+        low_pairs = twos & ~(1 << high_pair)
+        if low_pairs:
+            low_pair = low_pairs.bit_length() - 1
+            kicker = (ones & ~(1 << high_pair) & ~(1 << low_pair)).bit_length() - 1
+            return 2, (high_pair, low_pair, kicker)
+        return 1, (high_pair, *_top_ranks(ones & ~(1 << high_pair), 3))
+
+    return 0, tuple(_top_ranks(ones, 5))
+
+
+def evaluate_codes(codes):
+    return evaluate_mask(codes_to_mask(codes))
+
+
+def _straight_ranks(high):
+    if high == 3:  # wheel, ace plays low
+        return [3, 2, 1, 0, 12]
+    return list(range(high, high - 5, -1))
+
+
+def hand_strength(category, ranks):
+    '''
+    Pack a (category, ranks) evaluation into one integer, higher is better.
+    Layout is 4 bits of category followed by five 4-bit ranks in comparison order.
+    '''
+    if category == 4 or category == 8:
+        ranks = _straight_ranks(ranks[0])
+    strength = category
+    for i in range(5):
+        strength = (strength << 4) | (ranks[i] if i < len(ranks) else 0)
+    return strength
+
+
+def result_strength(hand):
+    ''' Integer strength of a (category_name, cards) result returned by evaluate_cards. '''
+    name, cards = hand
+    ranks = [CARD_CODES[(card.value, card.suit)] % 13
+             for group in cards for card in (group if isinstance(group, list) else [group])]
+    strength = HAND_CATEGORIES.index(name)
+    for i in range(5):
+        strength = (strength << 4) | (ranks[i] if i < len(ranks) else 0)
+    return strength
+
+
+# (category, ranks) of 5+ card sets by card bitmask, one cache per process shared by every table it hosts
+evaluation_cache = LRUCache(EVALUATION_CACHE_SIZE)
+metrics.register('evaluation_cache', evaluation_cache.stats)
+
+
+class HandState:
+    '''
+    Evaluation state of one seat, updated card by card as the board is dealt.
+    Keeps rank counts, suit counts and rank multiplicity masks, so adding a card and
+    re-evaluating are O(1) instead of a full pass over the hole cards and board.
+    Evaluations of 5 or more cards go through evaluation_cache, keyed by the card mask.
+    '''
+    __slots__ = ('count', 'mask', 'rank_counts', 'suit_counts', 'suit_masks', 'count_masks',
+                 'by_code', 'first_by_rank', 'best_by_rank', '_evaluation')
+
+    def __init__(self, cards=()):
+        self.count = 0
+        self.mask = 0
+        self.rank_counts = [0] * 13
+        self.suit_counts = [0] * 4
+        self.suit_masks = [0] * 4
+        self.count_masks = [0] * 5  # count_masks[n]: ranks seen at least n times
+        self.by_code = {}
+        self.first_by_rank = [None] * 13  # first card of each rank in input order
+        self.best_by_rank = [None] * 13   # highest suited card of each rank
+        self._evaluation = None
+        for card in cards:
+            self.add(card)
+
+    def add(self, card):
+        code = CARD_CODES[(card.value, card.suit)]
+        rank = code % 13
+        suit = code // 13
+        bit = 1 << rank
+        self.count += 1
+        self.mask |= 1 << code
+        self.rank_counts[rank] += 1
+        self.count_masks[self.rank_counts[rank]] |= bit
+        self.suit_counts[suit] += 1
+        self.suit_masks[suit] |= bit
+        self.by_code[code] = card
+        if self.first_by_rank[rank] is None:
+            self.first_by_rank[rank] = card
+        best = self.best_by_rank[rank]
+        if best is None or CARD_CODES[(best.value, best.suit)] < code:
+            self.best_by_rank[rank] = card
+        self._evaluation = None
+
+    def add_cards(self, cards):
+        for card in cards:
+            self.add(card)
+
+    def _flush_suit(self):
+        for suit in range(4):
+            if self.suit_counts[suit] >= 5:
+                return suit
+        return None
+
+    def evaluate(self):
+        ''' (category, ranks) as returned by evaluate_mask, cached until the next card. '''
+        if self._evaluation is None:
+            if self.count >= 5:
+                self._evaluation = evaluation_cache.get(self.mask)
+                if self._evaluation is not None:
+                    return self._evaluation
+            flush_suit = self._flush_suit()
+            counts = self.count_masks
+            self._evaluation = _evaluate_bits(counts[1], counts[2], counts[3], counts[4],
+                                              self.suit_masks[flush_suit] if flush_suit is not None else 0)
+            if self.count >= 5:
+                evaluation_cache.put(self.mask, self._evaluation)
+        return self._evaluation
+
+    def strength(self):
+        return hand_strength(*self.evaluate())
+
+    def result(self):
+        ''' (category_name, cards) in the layout of evaluate_cards, None for fewer than 5 cards. '''
+        if self.count < 5:
+            return None
+        category, ranks = self.evaluate()
+        name = HAND_CATEGORIES[category]
+        first_by_rank = self.first_by_rank
+        best_by_rank = self.best_by_rank
+
+        if category == 8 or category == 5:
+            flush_suit = self._flush_suit()
+            hand_ranks = _straight_ranks(ranks[0]) if category == 8 else ranks
+            return name, [self.by_code[flush_suit * 13 + rank] for rank in hand_ranks]
+        if category == 4:
+            return name, [first_by_rank[rank] for rank in _straight_ranks(ranks[0])]
+        if category == 7:
+            return name, (first_by_rank[ranks[0]], best_by_rank[ranks[1]])
+        if category == 6:
+            return name, (first_by_rank[ranks[0]], first_by_rank[ranks[1]])
+        if category == 3 or category == 1:
+            return name, (first_by_rank[ranks[0]], [best_by_rank[rank] for rank in ranks[1:]])
+        if category == 2:
+            return name, (first_by_rank[ranks[0]], first_by_rank[ranks[1]], best_by_rank[ranks[2]])
+        return name, [best_by_rank[rank] for rank in ranks]
+
+
+def evaluate_cards(cards):
+    '''
+    Evaluate pydealer cards and return (category_name, cards) in the layout used by
+    the frontend and PokerGame._compare_hands. None for fewer than 5 cards.
+    '''
+    if len(cards) < 5:
+        return None
+    return HandState(cards).result()
+
+
+
+def evaluate_cards_cached(cards):
+    '''
+    evaluate_cards with the evaluation looked up in evaluation_cache. The cards are taken
+    in card code order, so a card set gets the same result whatever order it is passed in.
+    '''
+    if len(cards) < 5:
+        return None
+    by_code = {CARD_CODES[(card.value, card.suit)]: card for card in cards}
+    return HandState(by_code[code] for code in sorted(by_code)).result()
@@ -0,0 +1,118 @@
+'''
+Lookup table hand ranker. Turns any 5-7 card hand into one comparable integer
+(see hand_evaluator.hand_strength), so a showdown is a max() over integers.
+
+Non-flush hands only depend on the multiset of ranks, which is indexed with the
+combinatorial number system (sorted ranks r0 <= r1 <= ... map to sum C(ri + i, i + 1)).
+Flushes are looked up by the 13-bit rank mask of the flush suit. All tables are
+generated once into a binary file by `manage.py build_hand_tables` and memory-mapped
+read-only on first use, so worker processes on one host share the same pages.
+'''
+import mmap
+import os
+import tempfile
+from array import array
+from itertools import combinations_with_replacement
+from math import comb
+from pathlib import Path
+
+from .hand_evaluator import CARD_CODES, RANK_MASK, evaluate_mask, hand_strength
+
+TABLE_PATH = Path(os.getenv('POKER_HAND_RANKS_PATH', Path(__file__).resolve().parent / 'data' / 'hand_ranks.bin'))
+
+MAGIC = b'PKHR'
+VERSION = 1
+HEADER_SIZE = 16
+HAND_SIZES = (5, 6, 7)
+FLUSH_TABLE_SIZE = RANK_MASK + 1
+NON_FLUSH_TABLE_SIZES = {size: comb(13 + size - 1, size) for size in HAND_SIZES}
+
+# BINOMIALS[i][rank] is the contribution of the i-th smallest rank to the multiset index
+BINOMIALS = tuple(tuple(comb(rank + i, i + 1) for rank in range(13)) for i in range(max(HAND_SIZES)))
+
+# per card code lookups, cheaper than dividing on every call
+CODE_RANKS = tuple(code % 13 for code in range(52))
+CODE_SUITS = tuple(code // 13 for code in range(52))
+CODE_BITS = tuple(1 << (code % 13) for code in range(52))
+
+_tables = None
+
+
+def multiset_index(sorted_ranks):
+    index = 0
+    for i, rank in enumerate(sorted_ranks):
+        index += BINOMIALS[i][rank]
+    return index
+
+
+def _generate():
+    ''' Build the flush table followed by the 5, 6 and 7 card non-flush tables. '''
+    flush_table = array('I', bytes(4 * FLUSH_TABLE_SIZE))
+    for rank_mask in range(FLUSH_TABLE_SIZE):
+        if rank_mask.bit_count() >= 5:
+            flush_table[rank_mask] = hand_strength(*evaluate_mask(rank_mask))
+
+    tables = [flush_table]
+    for size in HAND_SIZES:
+        table = array('I', bytes(4 * NON_FLUSH_TABLE_SIZES[size]))
+        for ranks in combinations_with_replacement(range(13), size):
+            if any(ranks.count(rank) > 4 for rank in set(ranks)):
+                continue
+            # consecutive cards get consecutive suits: no suit gets more than two cards
+            mask = 0
+            for i, rank in enumerate(ranks):
+                mask |= 1 << ((i % 4) * 13 + rank)
+            table[multiset_index(ranks)] = hand_strength(*evaluate_mask(mask))
+        tables.append(table)
+    return tables
+
+
+def build_tables(path=None):
+    ''' Generate the tables and atomically write them to path. '''
+    path = Path(path or TABLE_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = MAGIC + array('I', [VERSION, 0, 0]).tobytes()
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(header)
+        for table in _generate():
+            table.tofile(f)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)  # concurrent workers never see a partial file
+    return path
+
+
+def _load():
+    global _tables
+    if _tables is None:
+        if not TABLE_PATH.exists(): # generating them takes seconds, not something a showdown should wait for
+            raise FileNotFoundError(f"No hand rank tables at {TABLE_PATH}, run `manage.py build_hand_tables`.")
+        with open(TABLE_PATH, 'rb') as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if blob[:4] != MAGIC or memoryview(blob)[4:8].cast('I')[0] != VERSION:
+            raise ValueError(f"{TABLE_PATH} is not a version {VERSION} hand rank table, rebuild it.")
+        values = memoryview(blob)[HEADER_SIZE:].cast('I')
+        offset = FLUSH_TABLE_SIZE
+        tables = {'flush': values[:offset]}
+        for size in HAND_SIZES:
+            tables[size] = values[offset:offset + NON_FLUSH_TABLE_SIZES[size]]
+            offset += NON_FLUSH_TABLE_SIZES[size]
+        _tables = tables
+    return _tables
+
+
+def rank_codes(codes):
+    ''' Strength of 5-7 cards given as integer codes. '''
+    tables = _tables or _load()
+    suit_masks = [0, 0, 0, 0]
+    for code in codes:
+        suit_masks[CODE_SUITS[code]] |= CODE_BITS[code]
+    for suit_mask in suit_masks:
+        if suit_mask.bit_count() >= 5:
+            return tables['flush'][suit_mask]
+    return tables[len(codes)][multiset_index(sorted([CODE_RANKS[code] for code in codes]))]
+
+
+def rank_cards(cards):
+    ''' Strength of 5-7 pydealer cards. '''
+    return rank_codes([CARD_CODES[(card.value, card.suit)] for card in cards])
@@ -0,0 +1,162 @@
+'''
+Local IPC over Unix sockets, shared by the table hosts and the channel layer broker.
+
+A frame is a 4 byte big endian length followed by a JSON object, bytes values travel
+as {"$bytes": base64}. Requests carry an id and an op, replies carry the same id and a
+result or an error. Frames without an id are events pushed by the server.
+'''
+import asyncio
+import base64
+import json
+import os
+import socket
+import struct
+from pathlib import Path
+
+HEADER = struct.Struct('>I')
+REQUEST_TIMEOUT = 5.0 # seconds, blocking requests
+
+
+def _encode_bytes(value):
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_bytes(obj):
+    if len(obj) == 1 and '$bytes' in obj:
+        return base64.b64decode(obj['$bytes'])
+    return obj
+
+
+def encode(message):
+    body = json.dumps(message, separators=(',', ':'), default=_encode_bytes).encode()
+    return HEADER.pack(len(body)) + body
+
+
+def decode(body):
+    return json.loads(body, object_hook=_decode_bytes)
+
+
+async def read_frame(reader):
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return decode(await reader.readexactly(size))
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Server closed the connection.")
+        data += chunk
+    return data
+
+
+def call_sync(path, op, **fields):
+    ''' One blocking request, for code that runs outside the event loop (views, signals). '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(REQUEST_TIMEOUT)
+        sock.connect(path)
+        sock.sendall(encode({'id': 0, 'op': op, **fields}))
+        size, = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+        reply = decode(_recv_exactly(sock, size))
+    if 'error' in reply:
+        raise RuntimeError(f"{path}: {reply['error']}")
+    return reply['result']
+
+
+class FrameWriter:
+    ''' Serialises frames written by concurrent tasks to one stream. '''
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.lock = asyncio.Lock()
+
+    async def send(self, message):
+        async with self.lock:
+            self.writer.write(encode(message))
+            await self.writer.drain()
+
+
+class IpcClient:
+    '''
+    Connection to one server, requests from many tasks are multiplexed by id. The
+    connection is opened on the first request and reopened after it is lost.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.loop = asyncio.get_running_loop()
+        self._writer = None
+        self._reader_task = None
+        self._connecting = asyncio.Lock()
+        self._pending = {} # request id -> (future, op, fields)
+        self._next_id = 0
+
+    async def request(self, op, **fields):
+        writer = await self._connect()
+        self._next_id += 1
+        request_id = self._next_id
+        future = self.loop.create_future()
+        self._pending[request_id] = (future, op, fields)
+        try:
+            await writer.send({'id': request_id, 'op': op, **fields})
+            return await future
+        except asyncio.CancelledError:
+            self.cancelled(request_id, op, fields)
+            raise
+
+    def cancelled(self, request_id, op, fields):
+        ''' The caller gave up on a request, its reply will go to orphaned() '''
+
+    def orphaned(self, op, fields, result):
+        ''' Reply to a cancelled request '''
+
+    async def event(self, frame):
+        ''' Frame pushed by the server '''
+
+    async def _connect(self):
+        async with self._connecting:
+            if self._writer is None:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self._writer = FrameWriter(writer)
+                self._reader_task = asyncio.create_task(self._read(reader))
+            return self._writer
+
+    async def _read(self, reader):
+        error = None
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if 'id' not in frame:
+                    await self.event(frame)
+                    continue
+                future, op, fields = self._pending.pop(frame['id'], (None, None, None))
+                if future is None:
+                    continue
+                if future.done():
+                    if 'error' not in frame:
+                        self.orphaned(op, fields, frame['result'])
+                elif 'error' in frame:
+                    future.set_exception(RuntimeError(f"{self.path}: {frame['error']}"))
+                else:
+                    future.set_result(frame['result'])
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = e
+        finally:
+            self._writer.writer.close()
+            self._writer = None
+            # server went away, the next request reconnects
+            for future, _, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Lost connection to {self.path}: {error!r}"))
+            self._pending.clear()
+
+
+async def start_server(path, handle_connection):
+    ''' Unix socket server, a stale socket file left by a previous run is replaced. '''
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    return await asyncio.start_unix_server(handle_connection, path)
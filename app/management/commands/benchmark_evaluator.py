@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarks import (DEFAULT_HANDS, DEFAULT_REPEAT, DEFAULT_SEED, DEFAULT_TOLERANCE,
+                            compare_results, load_results, run_benchmarks, save_results)
+
+
+class Command(BaseCommand):
+    help = 'Measure hand evaluation throughput along the live HandState path, optionally against a saved baseline.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hands', type=int, default=DEFAULT_HANDS,
+                            help='Hands per scenario (default: %(default)s)')
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                            help='Runs per benchmark, the best one counts (default: %(default)s)')
+        parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+        parser.add_argument('--output', help='Save results as JSON to this file')
+        parser.add_argument('--compare', metavar='BASELINE', help='Fail if slower than this saved JSON result')
+        parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                            help='Allowed relative throughput drop in compare mode (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(options['hands'], options['repeat'], options['seed'])
+        baseline = load_results(options['compare']) if options['compare'] else None
+
+        for name, hands_per_second in report['results'].items():
+            line = f'{name:<28} {hands_per_second:>12,.0f} hands/s'
+            if baseline and name in baseline['results']:
+                change = hands_per_second / baseline['results'][name] - 1
+                line += f'  {change:+.1%} vs baseline'
+            self.stdout.write(line)
+
+        if options['output']:
+            save_results(report, options['output'])
+            self.stdout.write(f"Results saved to {options['output']}")
+
+        if baseline:
+            if (baseline['hands'], baseline['seed']) != (report['hands'], report['seed']):
+                self.stdout.write(self.style.WARNING('Baseline was measured on different inputs.'))
+            regressions = compare_results(report, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Throughput regressed beyond {:.0%}: {}'.format(
+                    options['tolerance'], ', '.join(name for name, _, _ in regressions)))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
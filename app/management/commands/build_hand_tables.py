@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from app.hand_ranks import TABLE_PATH, build_tables
+
+
+class Command(BaseCommand):
+    help = 'Generate the hand rank lookup tables used to compare hands at showdown.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=str(TABLE_PATH), help='Output file (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        path = build_tables(options['path'])
+        self.stdout.write(self.style.SUCCESS(f'Hand rank tables written to {path} ({path.stat().st_size} bytes).'))
@@ -0,0 +1,39 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from app.preflop import CLASS_COUNT, TABLE_PATH, compute_row, write_table
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the preflop equity table for all 169 starting hand classes.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=str(TABLE_PATH), help='Output file (default: %(default)s)')
+        parser.add_argument('--iterations-random', type=int, default=200000,
+                            help='Samples per class against a random hand (default: %(default)s)')
+        parser.add_argument('--iterations-class', type=int, default=20000,
+                            help='Samples per head-to-head matchup (default: %(default)s)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (default: %(default)s)')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = []
+        with ProcessPoolExecutor(max_workers=options['workers'],
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(compute_row, index, options['iterations_random'],
+                                       options['iterations_class'], options['seed'])
+                       for index in range(CLASS_COUNT)]
+            for done, future in enumerate(as_completed(futures), start=1):
+                rows.append(future.result())
+                if done % 13 == 0:
+                    self.stdout.write(f'{done}/{CLASS_COUNT} classes done')
+        path = write_table(rows, options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Preflop table written to {path} in {time.perf_counter() - start:.1f}s.'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.ranges import DEFAULT_ITERATIONS, parse_cards, range_equity
+
+
+class Command(BaseCommand):
+    help = 'Equity of one weighted hand range against another, e.g. "QQ+,AKs" "22+,A2s+" --board AhKd7c.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('hero', help='Hero range')
+        parser.add_argument('villain', help='Villain range')
+        parser.add_argument('--board', default='', help='Board cards, e.g. AhKd7c')
+        parser.add_argument('--dead', default='', help='Dead cards')
+        parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS,
+                            help='Runouts to sample when they cannot all be enumerated (default: %(default)s)')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            result = range_equity(options['hero'], options['villain'], parse_cards(options['board']),
+                                  parse_cards(options['dead']), options['iterations'], options['seed'])
+        except ValueError as e:
+            raise CommandError(e)
+        hero_combos, villain_combos = result['combos']
+        self.stdout.write(f"{options['hero']} ({hero_combos:g} combos) vs "
+                          f"{options['villain']} ({villain_combos:g} combos)")
+        self.stdout.write(f"equity {result['equity']:.2%}  win {result['win']:.2%}  tie {result['tie']:.2%}")
+        self.stdout.write(f"{result['runouts']} runouts {'enumerated' if result['exact'] else 'sampled'} "
+                          f"in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.cards import CARD_NAMES
+from app.shuffle import AUDIT_LOG_PATH, read_audit_log, redeal
+
+
+class Command(BaseCommand):
+    help = 'Re-deal a finished hand from the seed in the shuffle audit log.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', type=int, help='Table (room) id')
+        parser.add_argument('hand', type=int, help='Hand number at that table')
+        parser.add_argument('--session', help='Table session, needed when the table restarted since that hand')
+        parser.add_argument('--log', default=str(AUDIT_LOG_PATH), help='Audit log (default: %(default)s)')
+        parser.add_argument('--cards', type=int, default=21,
+                            help='Number of dealt cards to show (default: %(default)s, enough for 8 seats)')
+
+    def handle(self, *args, **options):
+        try:
+            seed = read_audit_log(options['table'], options['hand'], options['log'], options['session'])
+        except (LookupError, ValueError, OSError) as e:
+            raise CommandError(e)
+        self.stdout.write(f'Seed {seed.hex()} matches its commitment.')
+        self.stdout.write('Cards in deal order (two per seat starting left of the button, which is the big blind '
+                          'heads-up, ending with the button, then the board):')
+        for number, code in enumerate(redeal(seed, options['cards']), start=1):
+            self.stdout.write(f'{number:>3}. {CARD_NAMES[code]}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.channel_layer import BROKER_PATH, run_broker
+
+
+class Command(BaseCommand):
+    help = ('Run the channel layer broker shared by the ASGI workers of this host '
+            '(CHANNEL_LAYERS backend app.channel_layer.BrokerChannelLayer).')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=BROKER_PATH, help='Unix socket to serve on')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Channel broker serving on {options['path']}"))
+        try:
+            run_broker(options['path'])
+        except KeyboardInterrupt:
+            pass
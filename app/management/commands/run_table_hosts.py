@@ -0,0 +1,38 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.table_hosts import HOST_DIR, TABLE_HOSTS, host_path, run_host
+
+
+class Command(BaseCommand):
+    help = ('Run the POKER_TABLE_HOSTS table host processes. ASGI workers started with the same '
+            'POKER_TABLE_HOSTS and POKER_TABLE_HOST_DIR send their tables here.')
+    requires_system_checks = []
+
+    def handle(self, *args, **options):
+        if TABLE_HOSTS < 1:
+            raise CommandError('Set POKER_TABLE_HOSTS to the number of host processes to run.')
+        context = multiprocessing.get_context('spawn')
+
+        def start(index):
+            process = context.Process(target=run_host, args=(host_path(index),), name=f'table-host-{index}',
+                                      daemon=True)
+            process.start()
+            return process
+
+        hosts = [start(index) for index in range(TABLE_HOSTS)]
+        self.stdout.write(self.style.SUCCESS(f"{TABLE_HOSTS} table hosts serving in {HOST_DIR}"))
+        try:
+            while True:
+                time.sleep(1)
+                for index, process in enumerate(hosts):
+                    if not process.is_alive(): # its tables are gone, rooms reopen them on the next join
+                        self.stderr.write(f"Table host {index} exited with {process.exitcode}, restarting.")
+                        hosts[index] = start(index)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process in hosts:
+                process.terminate()
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.simulation import DEFAULT_BIG_BLIND, DEFAULT_SEATS, POLICIES, run_simulation
+
+
+class Command(BaseCommand):
+    help = 'Play hands on headless tables and report throughput, chip conservation and time per state.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', type=int, default=100)
+        parser.add_argument('--hands', type=int, default=10000, help='Hands in total, spread over the tables')
+        parser.add_argument('--seats', type=int, default=DEFAULT_SEATS)
+        parser.add_argument('--big-blind', type=int, default=DEFAULT_BIG_BLIND)
+        parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+        parser.add_argument('--seed', type=int, default=None, help='Makes the deals and the policy decisions reproducible')
+
+    def handle(self, *args, **options):
+        if options['tables'] < 1 or options['seats'] < 2:
+            raise CommandError('Need at least one table with two seats.')
+        report = run_simulation(options['tables'], options['hands'], seats=options['seats'],
+                                policy=options['policy'], seed=options['seed'], big_blind=options['big_blind'])
+
+        self.stdout.write(f"{report['hands']} hands on {report['tables']} tables in {report['seconds']:.2f}s "
+                          f"({report['hands_per_second']:,.0f} hands/s)")
+        for state, seconds in sorted(report['state_seconds'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {state:<10} {seconds:8.3f}s  {seconds / max(report['hands'], 1) * 1e6:8.1f}us/hand")
+        if report['conservation_errors']:
+            self.stdout.write(self.style.ERROR(
+                f"Chip conservation failed in {report['conservation_errors']} hands, "
+                f"{report['chips_lost']} chips lost."))
+        else:
+            self.stdout.write(self.style.SUCCESS('Chips conserved in every hand.'))
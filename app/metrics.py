@@ -0,0 +1,18 @@
+'''
+Process wide metrics surface. Components register a callable returning a dict of
+current values under a name, snapshot() collects all of them for the metrics view.
+'''
+_sources = {}
+
+
+def register(name, source):
+    ''' Register (or replace) a metrics source, a zero argument callable returning a dict. '''
+    _sources[name] = source
+
+
+def unregister(name):
+    _sources.pop(name, None)
+
+
+def snapshot():
+    return {name: source() for name, source in _sources.items()}
@@ -0,0 +1,156 @@
+'''
+Preflop equity table for the 169 canonical starting hands.
+
+Classes are cells of a 13x13 grid indexed by high * 13 + low for suited hands,
+low * 13 + high for offsuit hands and rank * 13 + rank for pairs (ranks as in
+hand_evaluator, 0 = deuce). The table holds the equity of every class against a
+random hand and head-to-head against every other class, stored as 16-bit fixed
+point values in a memory-mapped file, so lookups never simulate anything.
+'''
+import mmap
+import os
+import tempfile
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from .batch_evaluator import evaluate_batch
+
+TABLE_PATH = Path(os.getenv('POKER_PREFLOP_TABLE_PATH', Path(__file__).resolve().parent / 'data' / 'preflop_equity.bin'))
+
+MAGIC = b'PKPF'
+VERSION = 1
+HEADER_SIZE = 16
+CLASS_COUNT = 169
+SCALE = 65535
+RANK_NAMES = '23456789TJQKA'
+
+_table = None
+
+
+def hand_class(code1, code2):
+    ''' Class index of two hole card codes. '''
+    rank1, rank2 = code1 % 13, code2 % 13
+    high, low = max(rank1, rank2), min(rank1, rank2)
+    if code1 // 13 == code2 // 13:
+        return high * 13 + low
+    return low * 13 + high
+
+
+def class_name(index):
+    row, col = divmod(index, 13)
+    if row == col:
+        return RANK_NAMES[row] * 2
+    if row > col:
+        return RANK_NAMES[row] + RANK_NAMES[col] + 's'
+    return RANK_NAMES[col] + RANK_NAMES[row] + 'o'
+
+
+def class_index(name):
+    high, low = RANK_NAMES.index(name[0]), RANK_NAMES.index(name[1])
+    if high == low:
+        return high * 13 + high
+    if name.endswith('s'):
+        return high * 13 + low
+    return low * 13 + high
+
+
+def class_combos(index):
+    ''' All (code1, code2) combos of a class: 6 for pairs, 4 suited, 12 offsuit. '''
+    row, col = divmod(index, 13)
+    if row == col:
+        return [(s1 * 13 + row, s2 * 13 + row) for s1 in range(4) for s2 in range(s1 + 1, 4)]
+    if row > col:
+        return [(suit * 13 + row, suit * 13 + col) for suit in range(4)]
+    return [(s1 * 13 + col, s2 * 13 + row) for s1 in range(4) for s2 in range(4) if s1 != s2]
+
+
+def _deal(rng, used, count):
+    ''' Per row, draw `count` cards not in the (N, k) `used` array. '''
+    keys = rng.random((len(used), 52))
+    np.put_along_axis(keys, used, 2.0, axis=1)
+    return np.argpartition(keys, count, axis=1)[:, :count]
+
+
+def _showdown_shares(hero, villain, board):
+    hero_strength = evaluate_batch(np.hstack([hero, board]))
+    villain_strength = evaluate_batch(np.hstack([villain, board]))
+    return (hero_strength > villain_strength) + 0.5 * (hero_strength == villain_strength)
+
+
+def class_vs_random(index, iterations, seed=None):
+    ''' Equity of a class against one random hand. '''
+    rng = np.random.default_rng(seed)
+    hero = np.broadcast_to(np.array(class_combos(index)[0], dtype=np.int64), (iterations, 2))
+    rest = _deal(rng, hero, 7)
+    return float(_showdown_shares(hero, rest[:, :2], rest[:, 2:]).mean())
+
+
+def class_vs_class(index, other, iterations, seed=None):
+    ''' Equity of class `index` against class `other`, averaged over compatible combos. '''
+    rng = np.random.default_rng(seed)
+    # every combo of a class is equivalent up to suits, so one hero combo is enough
+    hero_combo = class_combos(index)[0]
+    villains = np.array([combo for combo in class_combos(other) if not set(combo) & set(hero_combo)],
+                        dtype=np.int64)
+    hero = np.broadcast_to(np.array(hero_combo, dtype=np.int64), (iterations, 2))
+    villain = villains[rng.integers(len(villains), size=iterations)]
+    board = _deal(rng, np.hstack([hero, villain]), 5)
+    return float(_showdown_shares(hero, villain, board).mean())
+
+
+def compute_row(index, iterations_vs_random, iterations_vs_class, seed=None):
+    ''' vs random equity and head-to-head equities against classes >= index. '''
+    seeds = np.random.SeedSequence([index] if seed is None else [seed, index]).spawn(CLASS_COUNT + 1)
+    vs_random = class_vs_random(index, iterations_vs_random, seeds[0])
+    vs_class = [class_vs_class(index, other, iterations_vs_class, seeds[other + 1])
+                for other in range(index, CLASS_COUNT)]
+    return index, vs_random, vs_class
+
+
+def write_table(rows, path=None):
+    ''' Write compute_row results (any order) to path atomically. '''
+    path = Path(path or TABLE_PATH)
+    vs_random = [0] * CLASS_COUNT
+    matrix = [0] * (CLASS_COUNT * CLASS_COUNT)
+    for index, random_equity, class_equities in rows:
+        vs_random[index] = round(random_equity * SCALE)
+        for other, equity in enumerate(class_equities, start=index):
+            matrix[index * CLASS_COUNT + other] = round(equity * SCALE)
+            matrix[other * CLASS_COUNT + index] = round((1 - equity) * SCALE)
+        matrix[index * CLASS_COUNT + index] = SCALE // 2  # mirror matches split by definition
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC + array('I', [VERSION, CLASS_COUNT, 0]).tobytes())
+        array('H', vs_random).tofile(f)
+        array('H', matrix).tofile(f)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _load():
+    global _table
+    if _table is None:
+        if not TABLE_PATH.exists():
+            return None
+        with open(TABLE_PATH, 'rb') as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if blob[:4] != MAGIC or memoryview(blob)[4:8].cast('I')[0] != VERSION:
+            raise ValueError(f"{TABLE_PATH} is not a version {VERSION} preflop table, rebuild it.")
+        values = memoryview(blob)[HEADER_SIZE:].cast('H')
+        _table = (values[:CLASS_COUNT], values[CLASS_COUNT:])
+    return _table
+
+
+def equity_vs_random(index):
+    ''' Equity of a class against a random hand, None when the table is not built. '''
+    table = _load()
+    return table[0][index] / SCALE if table else None
+
+
+def equity_vs_class(index, other):
+    table = _load()
+    return table[1][index * CLASS_COUNT + other] / SCALE if table else None
@@ -0,0 +1,213 @@
+'''
+Range versus range equity.
+
+A range is a weight per two card combo, stored as a float array over the 1326 combos
+in combinations(range(52), 2) order. Ranges are parsed from the usual notation
+("QQ+,AKs,A2s+,T9o:0.5,AsKd"), combos blocked by the board or dead cards get weight 0,
+and every runout scores each live combo once with the batch evaluator before all
+hero/villain pairs are compared in a single array operation. Runouts are enumerated
+when there are few enough, sampled otherwise, and split across the equity process pool.
+'''
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from .batch_evaluator import evaluate_batch
+from .equity import _remaining_deck, get_executor
+from .preflop import RANK_NAMES, class_combos, class_index
+
+SUIT_NAMES = 'dchs'  # pydealer suit order, see hand_evaluator
+COMBOS = np.array(list(combinations(range(52), 2)), dtype=np.int64)
+COMBO_COUNT = len(COMBOS)
+COMBO_MASKS = (np.uint64(1) << COMBOS[:, 0].astype(np.uint64)) | (np.uint64(1) << COMBOS[:, 1].astype(np.uint64))
+COMBO_INDEX = np.full((52, 52), -1, dtype=np.int64)
+COMBO_INDEX[COMBOS[:, 0], COMBOS[:, 1]] = COMBO_INDEX[COMBOS[:, 1], COMBOS[:, 0]] = np.arange(COMBO_COUNT)
+
+DEFAULT_ITERATIONS = 2000  # runouts
+MAX_PAIRS_PER_CHUNK = 1 << 21
+PLACEHOLDER_HAND = np.arange(7, dtype=np.int64)
+
+
+def parse_card(text):
+    ''' 'As', 'Td', '9c' -> card code '''
+    if len(text) != 2 or text[0].upper() not in RANK_NAMES or text[1].lower() not in SUIT_NAMES:
+        raise ValueError(f"Invalid card: {text!r}")
+    return SUIT_NAMES.index(text[1].lower()) * 13 + RANK_NAMES.index(text[0].upper())
+
+
+def parse_cards(text):
+    ''' 'AsKd7c' or 'As Kd 7c' -> list of card codes '''
+    text = text.replace(' ', '').replace(',', '')
+    if len(text) % 2:
+        raise ValueError(f"Invalid cards: {text!r}")
+    return [parse_card(text[i:i + 2]) for i in range(0, len(text), 2)]
+
+
+def _rank(char, token):
+    if char.upper() not in RANK_NAMES:
+        raise ValueError(f"Invalid rank in range token: {token!r}")
+    return RANK_NAMES.index(char.upper())
+
+
+def _class_names(high, low, suitedness):
+    if high == low:
+        return [RANK_NAMES[high] * 2]
+    names = [RANK_NAMES[high] + RANK_NAMES[low]]
+    return [names[0] + suffix for suffix in (suitedness or 'so')]
+
+
+def _token_combos(token):
+    ''' Combo indexes described by one range token without its weight. '''
+    if len(token) == 4 and token[1].lower() in SUIT_NAMES and token[3].lower() in SUIT_NAMES:
+        code1, code2 = parse_card(token[:2]), parse_card(token[2:])
+        if code1 == code2:
+            raise ValueError(f"Invalid combo: {token!r}")
+        return [COMBO_INDEX[code1, code2]]
+
+    plus = token.endswith('+')
+    parts = token.rstrip('+').split('-')
+    if len(parts) > 2 or any(len(part) not in (2, 3) for part in parts):
+        raise ValueError(f"Invalid range token: {token!r}")
+    suitedness = parts[0][2:].lower()
+    if suitedness not in ('', 's', 'o') or any(part[2:].lower() != suitedness for part in parts):
+        raise ValueError(f"Invalid range token: {token!r}")
+    first, second = _rank(parts[0][0], token), _rank(parts[0][1], token)
+    high, low = max(first, second), min(first, second)
+
+    if len(parts) == 2:
+        end_first, end_second = _rank(parts[1][0], token), _rank(parts[1][1], token)
+        end_high, end_low = max(end_first, end_second), min(end_first, end_second)
+        if high == low and end_high == end_low:  # 22-55
+            hands = [(rank, rank) for rank in range(min(low, end_low), max(low, end_low) + 1)]
+        elif high == end_high and high not in (low, end_low):  # A2s-A5s
+            hands = [(high, kicker) for kicker in range(min(low, end_low), max(low, end_low) + 1)]
+        else:
+            raise ValueError(f"Invalid range token: {token!r}")
+    elif plus and high == low:  # QQ+
+        hands = [(rank, rank) for rank in range(low, 13)]
+    elif plus:  # A2s+, kicker up to one below the top card
+        hands = [(high, kicker) for kicker in range(low, high)]
+    else:
+        hands = [(high, low)]
+
+    return [COMBO_INDEX[code1, code2]
+            for hand in hands
+            for name in _class_names(*hand, suitedness)
+            for code1, code2 in class_combos(class_index(name))]
+
+
+def parse_range(text):
+    '''
+    Parse a comma separated range into a weight array over COMBOS. A token may end in
+    ':weight'; when tokens overlap the later one wins.
+    '''
+    weights = np.zeros(COMBO_COUNT)
+    for token in text.replace(' ', '').split(','):
+        if not token:
+            continue
+        token, _, weight = token.partition(':')
+        try:
+            weight = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight in range token: {token!r}") from None
+        if not 0 <= weight <= 1:
+            raise ValueError(f"Range weights must be between 0 and 1: {token!r}")
+        weights[_token_combos(token)] = weight
+    return weights
+
+
+def _as_weights(hand_range):
+    return parse_range(hand_range) if isinstance(hand_range, str) else np.asarray(hand_range, dtype=np.float64)
+
+
+def _live(weights, blocked_mask):
+    ''' Indexes and weights of combos with weight that avoid the blocked cards. '''
+    live = (weights > 0) & (COMBO_MASKS & np.uint64(blocked_mask) == 0)
+    indexes = np.flatnonzero(live)
+    return indexes, weights[indexes]
+
+
+def _score(board, runouts, hero, hero_weights, villain, villain_weights):
+    '''
+    Worker job: weighted win, tie and total pair weight of hero against villain
+    summed over an (N, missing) array of runouts.
+    '''
+    union, inverse = np.unique(np.concatenate([hero, villain]), return_inverse=True)
+    hero_pos, villain_pos = inverse[:len(hero)], inverse[len(hero):]
+    pair_weights = hero_weights[:, None] * villain_weights[None, :]
+    pair_weights = pair_weights * (COMBO_MASKS[hero][:, None] & COMBO_MASKS[villain][None, :] == 0)
+
+    board = np.array(board, dtype=np.int64)
+    chunk = max(1, MAX_PAIRS_PER_CHUNK // (len(hero) * len(villain)))
+    totals = np.zeros(3)
+    for start in range(0, len(runouts), chunk):
+        part = runouts[start:start + chunk]
+        samples = len(part)
+        boards = np.hstack([np.broadcast_to(board, (samples, len(board))), part])
+        runout_masks = np.zeros(samples, dtype=np.uint64)
+        for column in part.T:
+            runout_masks |= np.uint64(1) << column.astype(np.uint64)
+        live = (COMBO_MASKS[union][None, :] & runout_masks[:, None]) == 0
+
+        hands = np.concatenate([
+            np.broadcast_to(COMBOS[union][None, :, :], (samples, len(union), 2)),
+            np.broadcast_to(boards[:, None, :], (samples, len(union), 5)),
+        ], axis=2)
+        # combos sharing a card with the runout are never compared, score a valid hand instead
+        hands = np.where(live[:, :, None], hands, PLACEHOLDER_HAND)
+        strengths = evaluate_batch(hands.reshape(-1, 7)).reshape(samples, len(union))
+
+        hero_strengths, villain_strengths = strengths[:, hero_pos], strengths[:, villain_pos]
+        valid = pair_weights[None, :, :] * (live[:, hero_pos][:, :, None] & live[:, villain_pos][:, None, :])
+        totals[0] += (valid * (hero_strengths[:, :, None] > villain_strengths[:, None, :])).sum()
+        totals[1] += (valid * (hero_strengths[:, :, None] == villain_strengths[:, None, :])).sum()
+        totals[2] += valid.sum()
+    return totals
+
+
+def _runouts(deck, missing, iterations, seed):
+    ''' All runouts when there are at most `iterations` of them, a random sample otherwise. '''
+    if comb(len(deck), missing) <= iterations:
+        runouts = list(combinations(deck.tolist(), missing))
+        return np.array(runouts, dtype=np.int64).reshape(len(runouts), missing), True
+    rng = np.random.default_rng(seed)
+    picks = np.argpartition(rng.random((iterations, len(deck))), missing, axis=1)[:, :missing]
+    return deck[picks], False
+
+
+def range_equity(hero_range, villain_range, board=(), dead=(), iterations=DEFAULT_ITERATIONS,
+                 seed=None, executor=None):
+    '''
+    Equity of hero_range against villain_range. Ranges are strings in range notation or
+    weight arrays over COMBOS, board and dead are card codes. Runouts are split across
+    the executor (the shared equity process pool by default).
+    '''
+    board, dead = tuple(board), tuple(dead)
+    if len(board) > 5:
+        raise ValueError("A board has at most 5 cards.")
+    deck = _remaining_deck([], board, dead)
+    blocked = 0
+    for code in board + dead:
+        blocked |= 1 << code
+    hero, hero_weights = _live(_as_weights(hero_range), blocked)
+    villain, villain_weights = _live(_as_weights(villain_range), blocked)
+    if not len(hero) or not len(villain):
+        raise ValueError("A range has no combos left after card removal.")
+
+    runouts, exact = _runouts(deck, 5 - len(board), iterations, seed)
+    executor = executor or get_executor()
+    jobs = min(len(runouts), getattr(executor, '_max_workers', 1))
+    results = executor.map(_score, *zip(*[(board, part, hero, hero_weights, villain, villain_weights)
+                                          for part in np.array_split(runouts, jobs)]))
+    win, tie, total = sum(results).tolist()
+    if not total:
+        raise ValueError("The ranges have no compatible combos.")
+    return {
+        'equity': (win + tie / 2) / total,
+        'win': win / total,
+        'tie': tie / total,
+        'combos': (float(hero_weights.sum()), float(villain_weights.sum())),
+        'runouts': len(runouts),
+        'exact': exact,
+    }
@@ -0,0 +1,130 @@
+'''
+Seat records for PokerGame.
+
+A Seat is a slotted record that still reads and writes like the player dicts it
+replaced (player['chip_count'] += 10). Changing active, folded or all_in updates the
+owning table's seat bitmasks, so "who is still in the hand" is a popcount and the
+get_* player collections are SeatSet snapshots of a mask instead of new dicts.
+'''
+
+SEAT_FIELDS = ('username', 'chip_count', 'cards', 'folded', 'all_in', 'current_bet', 'active')
+
+
+class Seat:
+    __slots__ = ('position', 'username', 'chip_count', 'cards', 'current_bet', 'time_bank',
+                 '_folded', '_all_in', '_active', '_table')
+
+    def __init__(self, table, position, username, chip_count):
+        self._table = table
+        self.position = position
+        self.username = username
+        self.chip_count = chip_count
+        self.cards = None
+        self.current_bet = 0
+        self.time_bank = 0 # seconds, set by the table
+        self._folded = False
+        self._all_in = False
+        self._active = False
+
+    @property
+    def folded(self):
+        return self._folded
+
+    @folded.setter
+    def folded(self, value):
+        self._folded = value
+        self._table._update_seat_masks(self)
+
+    @property
+    def all_in(self):
+        return self._all_in
+
+    @all_in.setter
+    def all_in(self, value):
+        self._all_in = value
+        self._table._update_seat_masks(self)
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, value):
+        self._active = value
+        self._table._update_seat_masks(self)
+
+    def __getitem__(self, field):
+        if field not in SEAT_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in SEAT_FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in SEAT_FIELDS else default
+
+    def update(self, fields):
+        for field, value in dict(fields).items():
+            self[field] = value
+
+    def copy(self):
+        ''' The seat as a plain dict, in the shape sent to clients. '''
+        return {field: getattr(self, field) for field in SEAT_FIELDS}
+
+    def __repr__(self):
+        return f'Seat({self.position}, {self.copy()!r})'
+
+
+class SeatSet:
+    '''
+    Read-only mapping of position -> Seat for the seats in a bitmask, in seat order.
+    The seats are captured when the set is created, like the player dicts it replaced:
+    a seat that leaves afterwards is still readable here. The seats themselves are live.
+    '''
+    __slots__ = ('_seats', '_mask')
+
+    def __init__(self, players, mask):
+        self._mask = mask
+        self._seats = tuple(players[position] for position in self)
+
+    def __iter__(self):
+        mask = self._mask
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __len__(self):
+        return self._mask.bit_count()
+
+    def __contains__(self, position):
+        return isinstance(position, int) and position >= 0 and bool(self._mask >> position & 1)
+
+    def _seat(self, position):
+        return self._seats[(self._mask & ((1 << position) - 1)).bit_count()]
+
+    def __getitem__(self, position):
+        if position not in self:
+            raise KeyError(position)
+        return self._seat(position)
+
+    def get(self, position, default=None):
+        return self._seat(position) if position in self else default
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return list(self._seats)
+
+    def items(self):
+        return list(zip(self, self._seats))
+
+    def __bool__(self):
+        return bool(self._mask)
+
+    def __repr__(self):
+        return f'SeatSet({dict(self.items())!r})'
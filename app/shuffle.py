@@ -0,0 +1,165 @@
+'''
+Shuffle service: per-hand seeds from a shared, buffered os.urandom pool and an
+append-only audit log of seed commitments.
+
+Every hand gets a fresh 32 byte seed. The deck draws its indexes from a SHA-256
+counter stream of that seed with rejection sampling, so every deal is unbiased and the
+hand can be re-dealt exactly from the seed. When a hand starts, the SHA-256 of its seed
+is appended to the audit log (commit). The seed is appended when the hand ends
+(reveal), so the log cannot be used to predict a running hand. Hand numbers restart
+with every table instance, so records also carry the session of the table that
+played the hand. Load tests can inject a
+master seed instead of os.urandom to make every hand reproducible.
+'''
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from .cards import CardDeck
+
+SEED_SIZE = 32
+ENTROPY_BLOCK_SIZE = 64 * 1024
+# runtime data lives outside the source tree
+DATA_DIR = Path(os.getenv('POKER_DATA_DIR', Path.home() / '.local' / 'share' / 'poker'))
+AUDIT_LOG_PATH = Path(os.getenv('POKER_SHUFFLE_AUDIT_LOG', DATA_DIR / 'shuffle_audit.log'))
+
+
+class EntropyPool:
+    ''' os.urandom read in large blocks and handed out in small slices. '''
+
+    def __init__(self, block_size=ENTROPY_BLOCK_SIZE):
+        self.block_size = block_size
+        self._buffer = b''
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def read(self, size):
+        with self._lock:
+            if self._offset + size > len(self._buffer):
+                self._buffer = os.urandom(max(self.block_size, size))
+                self._offset = 0
+            start = self._offset
+            self._offset += size
+            return self._buffer[start:self._offset]
+
+
+# one buffer shared by every table in the process
+entropy = EntropyPool()
+
+
+class HandRng:
+    ''' Deterministic index source for one hand, expanded from its seed with SHA-256. '''
+    __slots__ = ('seed', '_counter', '_block', '_offset')
+
+    def __init__(self, seed):
+        self.seed = seed
+        self._counter = 0
+        self._block = b''
+        self._offset = 0
+
+    @property
+    def commitment(self):
+        return hashlib.sha256(self.seed).hexdigest()
+
+    def _byte(self):
+        if self._offset == len(self._block):
+            self._block = hashlib.sha256(self.seed + self._counter.to_bytes(8, 'big')).digest()
+            self._counter += 1
+            self._offset = 0
+        self._offset += 1
+        return self._block[self._offset - 1]
+
+    def randrange(self, start, stop):
+        ''' Uniform integer in [start, stop) by rejection sampling, stop - start <= 256. '''
+        size = stop - start
+        if not 0 < size <= 256:
+            raise ValueError(f"Cannot sample from a range of size {size}.")
+        limit = 256 - 256 % size  # bytes >= limit would favour low indexes
+        while True:
+            value = self._byte()
+            if value < limit:
+                return start + value % size
+
+
+class ShuffleService:
+    '''
+    Hands out one HandRng per hand and records it in the audit log. With `seed` set,
+    hand seeds are derived from it instead of os.urandom. `audit_log=None` disables
+    the log.
+    '''
+
+    def __init__(self, seed=None, audit_log=AUDIT_LOG_PATH, entropy_pool=None):
+        self.master_seed = str(seed).encode() if seed is not None else None
+        self.audit_log = Path(audit_log) if audit_log else None
+        self.entropy = entropy_pool or entropy
+        self._hands = 0
+
+    def _next_seed(self):
+        self._hands += 1
+        if self.master_seed is None:
+            return self.entropy.read(SEED_SIZE)
+        return hashlib.sha256(self.master_seed + self._hands.to_bytes(8, 'big')).digest()
+
+    def _log(self, record):
+        if self.audit_log is None:
+            return
+        self.audit_log.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        # O_APPEND: one write per record, concurrent processes never interleave lines
+        fd = os.open(self.audit_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def new_hand(self, table_id, hand_number, session=None):
+        ''' Seed a new hand and log its commitment. '''
+        rng = HandRng(self._next_seed())
+        self._log({'event': 'commit', 'time': time.time(), 'table': table_id, 'session': session,
+                   'hand': hand_number, 'commitment': rng.commitment})
+        return rng
+
+    def reveal(self, table_id, hand_number, rng, session=None):
+        ''' Log the seed of a finished hand. '''
+        self._log({'event': 'reveal', 'time': time.time(), 'table': table_id, 'session': session,
+                   'hand': hand_number, 'seed': rng.seed.hex()})
+
+
+shuffle_service = ShuffleService(seed=os.getenv('POKER_SHUFFLE_SEED'))
+
+
+def read_audit_log(table_id, hand_number, path=AUDIT_LOG_PATH, session=None):
+    '''
+    Seed of a logged hand, checked against its commitment. `session` picks the table
+    instance when the hand number was played by more than one.
+    '''
+    hands = {} # session -> [commitment, seed]
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record['table'] != table_id or record['hand'] != hand_number:
+                continue
+            if session is not None and record.get('session') != session:
+                continue
+            if record['event'] == 'commit':
+                hands[record.get('session')] = [record['commitment'], None]
+            elif record['event'] == 'reveal':
+                hands.setdefault(record.get('session'), [None, None])[1] = bytes.fromhex(record['seed'])
+    if len(hands) > 1:
+        raise LookupError(f"Hand {hand_number} at table {table_id} was played in sessions "
+                          f"{', '.join(map(str, hands))}, pick one.")
+    commitment, seed = next(iter(hands.values()), (None, None))
+    if seed is None:
+        raise LookupError(f"No revealed seed for hand {hand_number} at table {table_id}.")
+    if HandRng(seed).commitment != commitment:
+        raise ValueError(f"Seed of hand {hand_number} at table {table_id} does not match its commitment.")
+    return seed
+
+
+def redeal(seed, count=52):
+    ''' Card codes in the order a deck seeded with `seed` deals them. '''
+    deck = CardDeck(HandRng(seed))
+    return list(deck.deal_codes(count))
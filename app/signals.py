@@ -1,7 +1,7 @@
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from .models import Player, PokerRoom
-from .PokerGame import poker_games
+from .table_hosts import close_table
 
 @receiver(post_delete, sender=Player)
 def delete_empty_room(sender, instance, **kwargs):
@@ -11,7 +11,7 @@ def delete_empty_room(sender, instance, **kwargs):
         if room:
             remaining_players = room.players.count()
             if remaining_players == 0:
-                poker_games.pop(room.id, None)
+                close_table(room.id)
                 room.delete()
     except PokerRoom.DoesNotExist:
         pass
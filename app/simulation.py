@@ -0,0 +1,136 @@
+'''
+Headless hand simulator. Drives PokerGame tables without callbacks, consumers or the
+showdown pause: a policy object answers every action request directly, and each
+table plays one hand per start_game() call. Used to measure engine throughput and to
+check rule changes (chip conservation) over many hands.
+'''
+import asyncio
+import random
+import time
+
+from .PokerGame import PokerGame
+from .shuffle import ShuffleService
+
+DEFAULT_SEATS = 6
+DEFAULT_BIG_BLIND = 10
+
+
+class SimulatedUser:
+    def __init__(self, username):
+        self.username = username
+
+
+class CallingPolicy:
+    ''' Checks or calls every bet. '''
+
+    def act(self, game, position):
+        return 'call', 0
+
+
+class RandomPolicy:
+    ''' Folds, calls or raises one to four big blinds at random, checks instead of folding. '''
+
+    def __init__(self, rng=None, fold=0.2, raise_=0.2):
+        self.rng = rng or random.Random()
+        self.fold = fold
+        self.raise_ = raise_
+
+    def act(self, game, position):
+        player = game.players[position]
+        to_call = game.current_max_bet - player['current_bet']
+        roll = self.rng.random()
+        if roll < self.fold and to_call > 0:
+            return 'fold', 0
+        if roll > 1 - self.raise_ and player['chip_count'] > to_call:
+            return 'raise', min(player['chip_count'], to_call + game.big_blind * self.rng.randint(1, 4))
+        return 'call', 0
+
+
+POLICIES = {
+    'call': lambda rng: CallingPolicy(),
+    'random': lambda rng: RandomPolicy(rng),
+}
+
+
+class StateTimer:
+    ''' Wraps a table's _transition_state to attribute wall time to the state being played. '''
+
+    def __init__(self, game, totals):
+        self.totals = totals
+        self.state = None
+        self.started = None
+        self._transition_state = game._transition_state
+        game._transition_state = self.transition_state
+
+    def mark(self, state=None):
+        now = time.perf_counter()
+        if self.state is not None:
+            self.totals[self.state] = self.totals.get(self.state, 0.0) + now - self.started
+        self.state, self.started = state, now
+
+    async def transition_state(self, new_state):
+        self.mark(new_state)
+        return await self._transition_state(new_state)
+
+
+def new_table(table_id, seats, big_blind, policy, shuffle_service):
+    game = PokerGame(id=table_id, big_blind=big_blind, max_players=seats)
+    game.action_policy = policy
+    game.shuffle_service = shuffle_service
+    game.showdown_delay = 0
+    game.auto_start = False
+    for seat in range(seats):
+        game.add_player(SimulatedUser(f'table{table_id}-seat{seat}'))
+    return game
+
+
+def total_chips(game):
+    return sum(player['chip_count'] for player in game.get_all_players().values()) + game.pot
+
+
+async def play_table(game, hands, report, state_totals):
+    ''' Play `hands` hands at one table, re-seating busted players with a fresh stack. '''
+    timer = StateTimer(game, state_totals)
+    expected = total_chips(game)
+    for _ in range(hands):
+        for seat, player in game.players.items():
+            if player is None:
+                game.add_player(SimulatedUser(f'table{game.id}-seat{seat}-{game.hand_number}'))
+                expected += game.default_chip_count
+        await game.start_game()
+        timer.mark()
+        report['hands'] += 1
+        chips = total_chips(game)
+        if chips != expected:
+            report['conservation_errors'] += 1
+            report['chips_lost'] += expected - chips
+            expected = chips
+
+
+async def simulate(tables, hands, seats=DEFAULT_SEATS, policy='random', seed=None,
+                   big_blind=DEFAULT_BIG_BLIND):
+    ''' Play `hands` hands spread over `tables` tables and return a report dict. '''
+    rng = random.Random(seed)
+    shuffle_service = ShuffleService(seed=seed if seed is not None else rng.getrandbits(64), audit_log=None)
+    games = [new_table(table_id, seats, big_blind, POLICIES[policy](random.Random(rng.getrandbits(64))),
+                       shuffle_service)
+             for table_id in range(tables)]
+    report = {'hands': 0, 'conservation_errors': 0, 'chips_lost': 0}
+    state_totals = {}
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play_table(game, hands // tables + (table_id < hands % tables), report, state_totals)
+                           for table_id, game in enumerate(games)))
+    elapsed = time.perf_counter() - start
+
+    report.update({
+        'tables': tables,
+        'seconds': elapsed,
+        'hands_per_second': report['hands'] / elapsed if elapsed else 0.0,
+        'state_seconds': state_totals,
+    })
+    return report
+
+
+def run_simulation(tables, hands, **kwargs):
+    return asyncio.run(simulate(tables, hands, **kwargs))
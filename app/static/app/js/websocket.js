@@ -1,5 +1,9 @@
 const protocol = location.protocol === "https:" ? "wss" : "ws";
-const socket = new WebSocket(`${protocol}://${location.host}/ws/room/${roomId}/?role=${role}`);
+const WIRE_SUBPROTOCOL = 'poker.binary';
+const binaryWire = new URLSearchParams(location.search).get('wire') === 'binary'; // opt in with ?wire=binary
+const socket = new WebSocket(`${protocol}://${location.host}/ws/room/${roomId}/?role=${role}`,
+                             binaryWire ? [WIRE_SUBPROTOCOL] : []);
+socket.binaryType = 'arraybuffer';
 
 const playingCards = {
     '2 of Spades': '/static/img/playing_cards/2_of_spades.png',
@@ -61,6 +65,105 @@ const playingCards = {
     'reverse': '/static/img/playing_cards/reverse2-copy.png',
 };
 
+/* Decoder of binary game frames, mirrors app/wire.py. Frames that are not game events
+ (snapshots, errors) still come as JSON text. */
+const CARD_VALUES = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen', 'King', 'Ace'];
+const CARD_SUITS = ['Diamonds', 'Clubs', 'Hearts', 'Spades'];
+const HIDDEN_CARD = 52;
+const NO_SEAT = 255;
+const RATIO_SCALE = 10000;
+const WIRE_MESSAGES = [
+    ['player_bet', [['position', 'seat'], ['amount', 'uint'], ['chip_count', 'uint'], ['pot', 'uint']]],
+    ['dealt_cards', [['cards', 'cards'], ['active_positions', 'seats']]],
+    ['player_turn', [['username', 'str']]],
+    ['your_turn', [['current_bet', 'uint'], ['player_bet', 'uint'], ['chip_count', 'uint'], ['pot', 'uint'],
+                   ['time_to_act', 'uint'], ['time_bank', 'uint']]],
+    ['time_bank', [['position', 'seat'], ['seconds', 'uint']]],
+    ['action_timeout', [['action', 'str']]],
+    ['board_cards', [['cards', 'cards']]],
+    ['clear_betting', []],
+    ['hand_value', [['hand_value', 'str'], ['hand_cards', 'cards'], ['hand_class', 'str?'], ['equity', 'ratio?']]],
+    ['player_checked', [['position', 'seat']]],
+    ['player_folded', [['position', 'seat']]],
+    ['showdown', [['hands', 'seat_cards']]],
+    ['round_winner', [['winner_positions', 'seats'], ['amount_won', 'uint']]],
+    ['equities', [['equities', 'seat_equities'], ['board_size', 'uint']]],
+    ['reset', [['chip_counts', 'seat_uints'], ['dealer_position', 'seat']]],
+    ['out_of_chips', []],
+    ['new_player', [['position', 'seat'], ['username', 'str'], ['chip_count', 'uint']]],
+    ['player_left', [['position', 'seat']]],
+];
+const textDecoder = new TextDecoder();
+
+const decodeFrame = (buffer) => {
+    const bytes = new Uint8Array(buffer);
+    let offset = 0;
+    const seatMap = (readValue) => {
+        const values = {};
+        for (let count = reader.uint(); count > 0; count--) {
+            const position = reader.seat();
+            values[position] = readValue();
+        }
+        return values;
+    };
+    const reader = {
+        byte: () => bytes[offset++],
+        uint: () => { // LEB128, without bitwise operators so amounts can exceed 32 bits
+            let value = 0;
+            let scale = 1;
+            let byte;
+            do {
+                byte = bytes[offset++];
+                value += (byte & 0x7f) * scale;
+                scale *= 128;
+            } while (byte >= 0x80);
+            return value;
+        },
+        seat: () => {
+            const position = bytes[offset++];
+            return position === NO_SEAT ? null : position;
+        },
+        str: () => {
+            const size = reader.uint();
+            offset += size;
+            return textDecoder.decode(bytes.subarray(offset - size, offset));
+        },
+        cards: () => reader.seats().map(code => code === HIDDEN_CARD
+            ? 'reverse' : `${CARD_VALUES[code % 13]} of ${CARD_SUITS[Math.floor(code / 13)]}`),
+        seats: () => {
+            const size = reader.uint();
+            offset += size;
+            return Array.from(bytes.subarray(offset - size, offset));
+        },
+        ratio: () => reader.uint() / RATIO_SCALE,
+        seat_cards: () => seatMap(reader.cards),
+        seat_uints: () => seatMap(reader.uint),
+        seat_equities: () => seatMap(() => ({win: reader.ratio(), tie: reader.ratio()})),
+    };
+
+    const seq = reader.uint();
+    const events = [];
+    for (let count = reader.uint(); count > 0; count--) {
+        const id = reader.byte();
+        if (id === 0) { // message type without a schema, sent as JSON
+            events.push(JSON.parse(reader.str()));
+            continue;
+        }
+        const [type, fields] = WIRE_MESSAGES[id - 1];
+        const message = {type};
+        for (let [name, kind] of fields) {
+            if (kind.endsWith('?')) {
+                if (!reader.byte()) {
+                    continue;
+                }
+                kind = kind.slice(0, -1);
+            }
+            message[name] = reader[kind]();
+        }
+        events.push(message);
+    }
+    return seq ? {type: 'batch', seq, events} : {type: 'batch', events};
+}
 
 const currentActionHandlers = {
     fold: null,
@@ -71,6 +174,11 @@ const currentActionHandlers = {
 
 let yourPosition = null;
 
+// room frames are numbered, see receiveRoomFrame
+let lastSeq = null;
+let resyncing = false;
+let heldFrames = [];
+
 socket.onopen = () => {
     console.log("WebSocket connection established.");
     socket.send(JSON.stringify({
@@ -79,16 +187,80 @@ socket.onopen = () => {
 }
 
 socket.onmessage = (event) => {
-    const data = JSON.parse(event.data);
+    const data = typeof event.data === 'string' ? JSON.parse(event.data) : decodeFrame(event.data);
     console.log("Message from server:", data);
 
+    if (data.type === 'init_participant' || data.type === 'init_observer' || data.type === 'snapshot') {
+        if (data.your_cards) { // the shared snapshot shows every hand face down
+            data.players[data.your_position].cards = data.your_cards;
+        }
+        handleMessage(data);
+        startFrom(data.seq);
+    } else if (data.seq !== undefined) {
+        receiveRoomFrame(data);
+    } else {
+        applyFrame(data);
+    }
+};
+
+const applyFrame = (data) => {
+    if (data.type === 'batch') { // events of one table step, applied in order before the next repaint
+        for (const message of data.events) {
+            handleMessage(message);
+        }
+    } else {
+        handleMessage(data);
+    }
+}
+
+/* A room frame that does not follow the last one means frames were lost, a slow socket
+ misses them when its channel is full. Ask for a snapshot instead of reconnecting and
+ apply the frames numbered after it. */
+const receiveRoomFrame = (frame) => {
+    if (lastSeq === null || resyncing) {
+        heldFrames.push(frame);
+        return;
+    }
+    if (frame.seq <= lastSeq) {
+        return; // already part of the snapshot
+    }
+    if (frame.seq !== lastSeq + 1) {
+        resyncing = true;
+        heldFrames.push(frame);
+        socket.send(JSON.stringify({
+            type: "resync",
+        }));
+        return;
+    }
+    lastSeq = frame.seq;
+    applyFrame(frame);
+}
+
+const startFrom = (seq) => {
+    lastSeq = seq;
+    resyncing = false;
+    const held = heldFrames;
+    heldFrames = [];
+    for (const frame of held) {
+        receiveRoomFrame(frame);
+    }
+}
+
+const handleMessage = (data) => {
     switch (data.type) {
         case 'init_participant':
             yourPosition = data.your_position;
             initParticipant(data.players);
+            showTableState(data);
             break;
         case 'init_observer':
             initObserver(data.players);
+            showTableState(data);
+            break;
+        case 'snapshot':
+            reset({});
+            renderSeats(data.players);
+            showTableState(data);
             break;
         case 'new_player':
             newPlayer(data.position, data.username, data.chip_count);
@@ -108,6 +280,12 @@ socket.onmessage = (event) => {
         case 'your_turn':
             yourTurn(data.current_bet, data.player_bet, data.chip_count, data.pot);
             break;
+        case 'time_bank':
+            timeBank(data.position, data.seconds);
+            break;
+        case 'action_timeout':
+            actionTimeout();
+            break;
         case 'board_cards':
             boardCards(data.cards);
             break;
@@ -115,7 +293,7 @@ socket.onmessage = (event) => {
             clearBetting();
             break;
         case 'hand_value':
-            handValue(data.hand_value, data.hand_cards);
+            handValue(data.hand_value, data.hand_cards, data);
             break;
         case 'player_checked':
             playerChecked(data.position);
@@ -129,6 +307,9 @@ socket.onmessage = (event) => {
         case 'round_winner':
             roundWinner(data.winner_positions, data.amount_won);
             break;
+        case 'equities':
+            showEquities(data.equities);
+            break;
         case 'reset':
             reset(data.chip_counts);
             break;
@@ -177,41 +358,10 @@ const relativePosition = (position) => {
  user position is 0, need to transform from server position to relative position
 */
 const initParticipant = (players) => {
-    const numberOfPlayers = Object.keys(players).length;
-    const playerCountDiv = document.getElementById("current-players-count");
-    playerCountDiv.textContent = `${numberOfPlayers}`;
     const entryButton = document.getElementById("entry-button");
     entryButton.textContent = "Leave";
     entryButton.addEventListener('click', leaveGame);
-    for (const pos in players) {
-        const relativePos = relativePosition(pos);
-        const playerName = players[pos].username;
-        const playerCards = players[pos].cards;
-        let card1, card2;
-        if (playerCards) {
-            // cardsHTML = playerCards.join(', ');
-            card1 = document.createElement("img");
-            card1.src = playingCards[playerCards[0]];
-            card1.alt = playerCards[0];
-            card2 = document.createElement("img");
-            card2.src = playingCards[playerCards[1]];
-            card2.alt = playerCards[1];
-        }
-        const seatDiv = document.getElementById(`seat-${relativePos}`);
-        if (seatDiv) {
-            const playerCardsDiv = seatDiv.querySelector('.player-cards');
-            const playerInfoDiv = seatDiv.querySelector('.player-info');
-
-            if (card1 && card2) {
-                playerCardsDiv.appendChild(card1);
-                playerCardsDiv.appendChild(card2);
-            }
-            playerInfoDiv.innerHTML = `
-                ${playerName}
-                <span class="chips">${players[pos].chip_count}</span>
-                <span class="bet"></span>`;
-        }
-    }
+    renderSeats(players);
 
     const actionPanel = document.querySelector(".action-panel");
     actionPanel.querySelector("#playerChips").textContent = `${players[yourPosition].chip_count}`;
@@ -219,17 +369,28 @@ const initParticipant = (players) => {
 }
 
 const initObserver = (players) => {
-    const playerCountDiv = document.getElementById("current-players-count");
-    playerCountDiv.textContent = `${Object.keys(players).length}`;
     const entryButton = document.getElementById("entry-button");
     entryButton.textContent = "Join";
     entryButton.addEventListener('click', joinGame);
+    renderSeats(players);
+}
+
+const renderSeats = (players) => {
+    const playerCountDiv = document.getElementById("current-players-count");
+    playerCountDiv.textContent = `${Object.keys(players).length}`;
+    for (const seat of document.getElementById("table").querySelectorAll('.seat')) {
+        const playerCardsDiv = seat.querySelector('.player-cards');
+        const playerInfoDiv = seat.querySelector('.player-info');
+        if (playerCardsDiv && playerInfoDiv) {
+            playerCardsDiv.innerHTML = ``;
+            playerInfoDiv.textContent = ``;
+        }
+    }
     for (const pos in players) {
         const relativePos = relativePosition(pos);
         const playerName = players[pos].username;
         const playerCards = players[pos].cards;
         let card1, card2;
-
         if (playerCards) {
             // cardsHTML = playerCards.join(', ');
             card1 = document.createElement("img");
@@ -256,6 +417,27 @@ const initObserver = (players) => {
     }
 }
 
+/* Board, bets and turn of a snapshot, the seats are already drawn */
+const showTableState = (state) => {
+    boardCards(state.board_cards);
+    document.getElementById("pot-size").textContent = state.pot ? `${state.pot}` : ``;
+    for (const pos in state.players) {
+        const player = state.players[pos];
+        if (player.folded) {
+            playerFold(pos);
+        } else if (player.current_bet) {
+            playerBet(Number(pos), player.current_bet, player.chip_count, state.pot);
+        }
+    }
+    if (state.acting) {
+        playerTurn(state.acting);
+    }
+    if (state.your_turn) {
+        const turn = state.your_turn;
+        yourTurn(turn.current_bet, turn.player_bet, turn.chip_count, turn.pot);
+    }
+}
+
 const leaveGame = () => { // leave game as participant and become observer
     document.getElementById('entry-button').removeEventListener('click', leaveGame);
   const url = new URL(window.location.href);
@@ -503,6 +685,19 @@ const yourTurn = (current_bet, your_bet, your_chip_count, pot) => {
     }
 }
 
+const timeBank = (position, seconds) => {
+    const roomInfoDiv = document.querySelector(".room-info");
+    const actingPlayerInfo = roomInfoDiv.querySelector("#acting-player")
+    const prefix = position === yourPosition ? 'Twój bank czasu' : 'Bank czasu';
+    actingPlayerInfo.textContent = `${prefix}: ${seconds} s`
+}
+
+const actionTimeout = () => { // the server acted for us, the buttons are no longer valid
+    const buttonsDiv = document.querySelector(".action-panel .action");
+    buttonsDiv.hidden = true;
+    buttonsDiv.classList.remove("d-flex");
+}
+
 const clearBetting = () => {
     const roomInfoDiv = document.querySelector(".room-info");
     const actingPlayerInfo = roomInfoDiv.querySelector("#acting-player")
@@ -581,6 +776,26 @@ const roundWinner = (winner_positions, amount_won) => {
     }
 }
 
+const showEquities = (equities) => {
+    for (const position in equities) {
+        const relativePos = relativePosition(position);
+        const seatDiv = document.getElementById(`seat-${relativePos}`);
+        const playerInfoDiv = seatDiv ? seatDiv.querySelector(".player-info") : null;
+        if (playerInfoDiv) {
+            let equitySpan = playerInfoDiv.querySelector(".equity");
+            if (!equitySpan) {
+                equitySpan = document.createElement("span");
+                equitySpan.classList.add("equity");
+                playerInfoDiv.appendChild(equitySpan);
+            }
+            const { win, tie } = equities[position];
+            equitySpan.textContent = tie > 0.005
+                ? `${(win * 100).toFixed(1)}% (remis ${(tie * 100).toFixed(1)}%)`
+                : `${(win * 100).toFixed(1)}%`;
+        }
+    }
+}
+
 const reset = (chip_counts) => {
     const actionPanel = document.querySelector(".action-panel");
     const buttonsDiv = actionPanel.querySelector(".action");
@@ -605,6 +820,10 @@ const reset = (chip_counts) => {
         if (betSpan) {
             betSpan.textContent = ``;
         }
+        const equitySpan = seat.querySelector(".equity");
+        if (equitySpan) {
+            equitySpan.remove();
+        }
     }
     for (const pos in chip_counts) {
         const relativePos = relativePosition(pos);
@@ -619,10 +838,13 @@ const reset = (chip_counts) => {
 
 }
 
-const handValue = (hand_value, hand_cards) => {
+const handValue = (hand_value, hand_cards, data) => {
     const actionPanel = document.querySelector(".action-panel");
     const playerHandDiv = actionPanel.querySelector("#playerHand");
     switch (hand_value) {
+        case 'preflop':
+            playerHandDiv.textContent = `${data.hand_class} (${Math.round(data.equity * 100)}% vs random hand)`;
+            break;
         case 'high_card':
             const highCard = hand_cards[0].match(/^(\w+)/)[1];
             playerHandDiv.textContent = `${highCard} high`;
@@ -0,0 +1,234 @@
+'''
+Table hosts: PokerGame tables sharded over worker processes.
+
+With POKER_TABLE_HOSTS=0 (the default) every table lives in the ASGI process, in
+PokerGame.poker_games. With N > 0, `manage.py run_table_hosts` starts N host processes,
+each serving its shard of tables on a Unix socket in POKER_TABLE_HOST_DIR, and a room
+is assigned to a host by consistent hashing of its id. The ASGI process then talks to
+the tables through RemoteTable proxies: commands go to the host as requests, game
+messages come back as events on the same connection (see ipc.py). Workers sharing
+their channel layer (POKER_CHANNEL_BROKER) all reach every socket, so the host sends
+each frame to one of them only.
+'''
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from .equity import warm_up
+from .ipc import FrameWriter, IpcClient, call_sync, read_frame, start_server
+from .PokerGame import PokerGame, poker_games
+
+logger = logging.getLogger(__name__)
+
+TABLE_HOSTS = int(os.getenv('POKER_TABLE_HOSTS', 0))
+SHARED_LAYER = bool(os.getenv('POKER_CHANNEL_BROKER')) # workers forward into the same groups
+HOST_DIR = Path(os.getenv('POKER_TABLE_HOST_DIR', Path(tempfile.gettempdir()) / 'poker-table-hosts'))
+RING_REPLICAS = 64 # points per host on the hash ring
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    ''' Consistent hashing of room ids to hosts: adding a host moves about 1/N of the rooms. '''
+
+    def __init__(self, hosts, replicas=RING_REPLICAS):
+        points = sorted((_hash(f'{host}#{replica}'), host) for host in hosts for replica in range(replicas))
+        self.keys = [key for key, _ in points]
+        self.hosts = [host for _, host in points]
+
+    def host_for(self, room_id):
+        if not self.hosts:
+            raise LookupError("No table hosts configured.")
+        return self.hosts[bisect.bisect(self.keys, _hash(str(room_id))) % len(self.keys)]
+
+
+def host_path(index, directory=HOST_DIR):
+    return str(Path(directory) / f'table-host-{index}.sock')
+
+
+ring = HashRing([host_path(index) for index in range(TABLE_HOSTS)])
+
+
+class HostUser:
+    ''' The user object add_player expects, rebuilt from a username on the host. '''
+
+    def __init__(self, username):
+        self.username = username
+
+
+class TableHost:
+    ''' Serves the tables of one shard. The host's tables live in its own poker_games. '''
+
+    def __init__(self, path):
+        self.path = path
+        # room id -> {connection: shared layer}, one connection per ASGI worker in subscription order
+        self.subscribers = {}
+
+    async def serve(self):
+        server = await start_server(self.path, self._connection)
+        async with server:
+            await server.serve_forever()
+
+    async def _connection(self, reader, writer):
+        connection = FrameWriter(writer)
+        try:
+            while True:
+                request = await read_frame(reader)
+                # one task per request: a command waiting for inbox space does not hold up the others
+                asyncio.create_task(self._answer(connection, request))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass # client went away or the host is shutting down
+        finally:
+            for room_id in list(self.subscribers):
+                self.subscribers[room_id].pop(connection, None)
+                if not self.subscribers[room_id]:
+                    del self.subscribers[room_id]
+            writer.close()
+
+    async def _answer(self, connection, request):
+        try:
+            reply = {'id': request['id'], 'result': await self._handle(connection, request)}
+        except Exception as e:
+            reply = {'id': request['id'], 'error': repr(e)}
+        await connection.send(reply)
+
+    async def _handle(self, connection, request):
+        op, room_id = request['op'], request.get('room')
+        if op == 'open':
+            if room_id not in poker_games:
+                poker_games[room_id] = PokerGame(room_id, big_blind=request['big_blind'],
+                                                 max_players=request['max_players'])
+            return True
+        if op == 'close':
+            return poker_games.pop(room_id, None) is not None
+        game = poker_games.get(room_id)
+        if game is None:
+            return None if op == 'post' else False
+        if op == 'subscribe':
+            self.subscribers.setdefault(room_id, {})[connection] = request.get('shared', False)
+            game.frame_callback = lambda text, binary: self._publish(room_id, None, text, binary)
+            game.private_frame_callback = lambda username, text, binary: \
+                self._publish(room_id, username, text, binary)
+            return True
+        if op == 'post':
+            args = request['args']
+            if request['command'] == 'join':
+                args = [HostUser(username) for username in args]
+            return await game.post(request['command'], *args)
+        raise ValueError(f"Unknown operation {op}.")
+
+    def _receivers(self, room_id):
+        ''' Every worker with its own channel layer and the first one of those sharing a layer '''
+        receivers, shared = [], False
+        for connection, shares_layer in self.subscribers.get(room_id, {}).items():
+            if not (shares_layer and shared):
+                receivers.append(connection)
+            shared = shared or shares_layer
+        return receivers
+
+    async def _publish(self, room_id, username, text, binary):
+        ''' Frames travel as the table encoded them, the ASGI side forwards them as they are '''
+        frame = {'event': 'frame', 'room': room_id, 'username': username, 'text': text, 'binary': binary}
+        for connection in self._receivers(room_id):
+            try:
+                await connection.send(frame)
+            except ConnectionError: # that worker went away, its connection handler drops it
+                pass
+
+
+def run_host(path):
+    ''' Entry point of a host process. '''
+    import django
+    django.setup()
+    warm_up() # the host's tables send the equities
+    asyncio.run(TableHost(path).serve())
+
+
+class RemoteTable:
+    ''' ASGI side stand-in for a PokerGame on a table host, see PokerGame.post. '''
+
+    def __init__(self, client, room_id):
+        self.client = client
+        self.id = room_id
+        self.frame_callback = None
+        self.private_frame_callback = None
+
+    async def post(self, command, *args):
+        if command == 'join':
+            args = [user.username for user in args]
+        result = await self.client.request('post', room=self.id, command=command, args=list(args))
+        if command == 'seats': # JSON object keys are strings
+            result = {int(position): seat for position, seat in result.items()}
+        return result
+
+    async def _dispatch(self, event):
+        if event['username'] is None:
+            if self.frame_callback:
+                await self.frame_callback(event['text'], event['binary'])
+        elif self.private_frame_callback:
+            await self.private_frame_callback(event['username'], event['text'], event['binary'])
+
+
+class HostClient(IpcClient):
+    ''' Connection from this process to one table host. '''
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.tables = {} # room id -> RemoteTable
+
+    async def table(self, room_id):
+        ''' Proxy of a table on this host, None if the host does not have it. '''
+        if not await self.request('subscribe', room=room_id, shared=SHARED_LAYER):
+            return None
+        if room_id not in self.tables:
+            self.tables[room_id] = RemoteTable(self, room_id)
+        return self.tables[room_id]
+
+    async def event(self, frame):
+        table = self.tables.get(frame['room'])
+        if table is not None:
+            await table._dispatch(frame)
+
+
+_clients = {}
+
+
+def get_client(path):
+    client = _clients.get(path)
+    if client is None or client.loop is not asyncio.get_running_loop():
+        client = _clients[path] = HostClient(path)
+    return client
+
+
+def open_table(room):
+    ''' Make sure the table of a room exists, in this process or on its host. Blocking. '''
+    if not TABLE_HOSTS:
+        if room.id not in poker_games:
+            poker_games[room.id] = PokerGame(room.id, big_blind=room.blinds_level, max_players=room.max_players)
+        return
+    call_sync(ring.host_for(room.id), 'open', room=room.id, big_blind=room.blinds_level,
+              max_players=room.max_players)
+
+
+def close_table(room_id):
+    ''' Drop the table of a deleted room. Blocking. '''
+    if not TABLE_HOSTS:
+        poker_games.pop(room_id, None)
+        return
+    try:
+        call_sync(ring.host_for(room_id), 'close', room=room_id)
+    except OSError: # a host that is down has no tables to drop
+        logger.exception("Could not close table %s", room_id)
+
+
+async def get_table(room_id):
+    ''' The table a consumer posts commands to: a PokerGame, a RemoteTable or None. '''
+    if not TABLE_HOSTS:
+        return poker_games.get(room_id)
+    return await get_client(ring.host_for(room_id)).table(room_id)
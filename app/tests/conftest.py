@@ -0,0 +1,23 @@
+"""
+Shared test setup
+"""
+import os
+
+import pytest
+
+from app import hand_ranks
+
+
+@pytest.fixture(scope='session', autouse=True)
+def hand_rank_tables(tmp_path_factory):
+    """Build the hand rank tables once into a temporary file, as `manage.py build_hand_tables` does on deploy"""
+    path = hand_ranks.build_tables(tmp_path_factory.mktemp('ranks') / 'hand_ranks.bin')
+    original_path, original_env = hand_ranks.TABLE_PATH, os.environ.get('POKER_HAND_RANKS_PATH')
+    hand_ranks.TABLE_PATH, hand_ranks._tables = path, None
+    os.environ['POKER_HAND_RANKS_PATH'] = str(path) # equity worker processes load the same file
+    yield path
+    hand_ranks.TABLE_PATH, hand_ranks._tables = original_path, None
+    if original_env is None:
+        os.environ.pop('POKER_HAND_RANKS_PATH')
+    else:
+        os.environ['POKER_HAND_RANKS_PATH'] = original_env
@@ -1,7 +1,10 @@
 import unittest
-from main import compare_hands
 from pydealer import Card
 
+from app.PokerGame import PokerGame
+
+compare_hands = PokerGame(id=0, big_blind=2)._compare_hands
+
 class TestCompareHands(unittest.TestCase):
     
     def test_different_ranks_higher_wins(self):
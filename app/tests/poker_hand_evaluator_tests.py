@@ -1,8 +1,14 @@
+import itertools
+import random
 import unittest
+from unittest.mock import patch
 from pydealer import Stack, Card
 
 from pydealer import Stack, POKER_RANKS
 
+from app.cards import CARDS
+from app.hand_evaluator import evaluate_cards, HAND_CATEGORIES, HandState, hand_strength, evaluate_codes
+
 RANKS = POKER_RANKS['values']
 
 
@@ -559,5 +565,65 @@ class TestEvaluateHand(unittest.TestCase):
         self.assertEqual(result[0], "straight")
         self.assertEqual(result[1][0].value, '6')
 
+
+class TestBitmaskEvaluateHand(TestEvaluateHand):
+    """Te same przypadki uruchomione na ewaluatorze bitmaskowym z app.hand_evaluator"""
+
+    def run(self, result=None):
+        with patch(f'{__name__}.evaluate_hand', evaluate_cards):
+            return super().run(result)
+
+
+def hand_key(hand):
+    """Klucz porównania: kategoria i wartości kart w kolejności rozstrzygania"""
+    category, cards = hand
+    flat = [x for card in cards for x in (card if isinstance(card, list) else [card])]
+    return HAND_CATEGORIES.index(category), [RANKS[card.value] for card in flat]
+
+
+class TestBitmaskMatchesReference(unittest.TestCase):
+
+    def test_random_hands_match_best_five_card_reference(self):
+        """Losowe ręce 5-7 kart - wynik zgodny z najlepszą piątką wg referencyjnego evaluate_hand"""
+        rng = random.Random(1234)
+        for _ in range(3000):
+            cards = [CARDS[code] for code in rng.sample(range(52), rng.choice((5, 6, 7)))]
+            expected = max(hand_key(evaluate_hand(list(five))) for five in itertools.combinations(cards, 5))
+            self.assertEqual(hand_key(evaluate_cards(cards)), expected, cards)
+
+    def test_two_trips_is_full_house(self):
+        """Dwie trójki w 7 kartach to full house"""
+        cards = [Card('Ace', 'Hearts'), Card('Ace', 'Spades'), Card('Ace', 'Clubs'),
+                 Card('King', 'Hearts'), Card('King', 'Spades'), Card('King', 'Clubs'), Card('2', 'Hearts')]
+        result = evaluate_cards(cards)
+        self.assertEqual(result[0], "full_house")
+        self.assertEqual((result[1][0].value, result[1][1].value), ('Ace', 'King'))
+
+    def test_wheel_with_king(self):
+        """Strit od asa do piątki, gdy w ręce jest też król"""
+        cards = [Card('Ace', 'Hearts'), Card('King', 'Spades'), Card('5', 'Clubs'),
+                 Card('4', 'Hearts'), Card('3', 'Spades'), Card('2', 'Diamonds'), Card('9', 'Hearts')]
+        result = evaluate_cards(cards)
+        self.assertEqual(result[0], "straight")
+        self.assertEqual([card.value for card in result[1]], ['5', '4', '3', '2', 'Ace'])
+
+
+class TestHandState(unittest.TestCase):
+
+    def test_incremental_matches_full_evaluation(self):
+        """Dodawanie kart flop/turn/river daje ten sam wynik co pełna ewaluacja"""
+        rng = random.Random(99)
+        for _ in range(1000):
+            codes = rng.sample(range(52), 7)
+            cards = [CARDS[code] for code in codes]
+            state = HandState(cards[:2])
+            self.assertIsNone(state.result())
+            state.add_cards(cards[2:5])
+            for street in (5, 6, 7):
+                if street > 5:
+                    state.add(cards[street - 1])
+                self.assertEqual(state.result(), evaluate_cards(cards[:street]))
+                self.assertEqual(state.strength(), hand_strength(*evaluate_codes(codes[:street])))
+
 if __name__ == '__main__':
     unittest.main()
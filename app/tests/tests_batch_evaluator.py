@@ -0,0 +1,37 @@
+"""
+Tests for the vectorized batch evaluator
+"""
+import numpy as np
+import pytest
+
+from app.batch_evaluator import evaluate_batch
+from app.hand_evaluator import evaluate_codes, hand_strength
+
+
+def random_hands(rng, count, size):
+    """Distinct card codes per row"""
+    return np.argsort(rng.random((count, 52)), axis=1)[:, :size]
+
+
+@pytest.mark.parametrize('size', [5, 6, 7])
+def test_matches_scalar_evaluator(size):
+    """Batch results equal the scalar evaluator on randomized hands"""
+    rng = np.random.default_rng(size)
+    codes = random_hands(rng, 5000, size)
+    result = evaluate_batch(codes, chunk_size=1024)
+    assert result.shape == (5000,)
+    expected = [hand_strength(*evaluate_codes(row.tolist())) for row in codes]
+    assert result.tolist() == expected
+
+
+def test_flush_heavy_hands():
+    """Hands built mostly from one suit hit the flush table"""
+    rng = np.random.default_rng(42)
+    codes = np.array([rng.choice(13, 5, replace=False).tolist() + [13, 26] for _ in range(500)])
+    expected = [hand_strength(*evaluate_codes(row.tolist())) for row in codes]
+    assert evaluate_batch(codes).tolist() == expected
+
+
+def test_rejects_bad_shape():
+    with pytest.raises(ValueError):
+        evaluate_batch(np.zeros((3, 4), dtype=np.int64))
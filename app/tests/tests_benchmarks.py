@@ -0,0 +1,49 @@
+"""
+Tests for the evaluator benchmark helpers
+"""
+import pytest
+
+from app.benchmarks import (SCENARIOS, _play_streets, _showdown, compare_results, load_results, make_hands,
+                            run_benchmarks, save_results)
+from app.hand_evaluator import evaluate_cards, result_strength
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_inputs_are_fixed(scenario):
+    """The same seed always produces the same seven distinct cards per hand"""
+    hands = make_hands(scenario, 200, seed=7)
+    assert [list(map(str, hand)) for hand in hands] == [list(map(str, hand)) for hand in make_hands(scenario, 200, seed=7)]
+    assert all(len({str(card) for card in hand}) == 7 for hand in hands)
+
+
+def test_scenarios_shape_hands():
+    """Flush heavy hands are flushes or better, paired boards never make high card"""
+    assert all(evaluate_cards(hand)[0] in ('flush', 'straight_flush')
+               for hand in make_hands('flush_heavy', 300))
+    assert all(evaluate_cards(hand)[0] != 'high_card' for hand in make_hands('paired', 300))
+
+
+def test_live_path_matches_reference():
+    """The HandState benchmarks rank hands like the reference evaluate/compare path"""
+    hands = make_hands('random', 200)
+    assert [_play_streets(cards) for cards in hands] == [evaluate_cards(cards) for cards in hands]
+    strengths = [result_strength(evaluate_cards(cards)) for cards in hands]
+    assert _showdown(hands) == [max(pair) for pair in zip(strengths, strengths[1:] + strengths[:1])]
+
+
+def test_report_round_trip(tmp_path):
+    """A report is saved as JSON and passes comparison against itself"""
+    report = run_benchmarks(hands=100, repeat=1)
+    assert set(report['results']) == {f'{benchmark}/{scenario}'
+                                      for benchmark in ('hand_state', 'showdown', 'evaluate_hand', 'compare_hands')
+                                      for scenario in SCENARIOS}
+    save_results(report, tmp_path / 'baseline.json')
+    assert load_results(tmp_path / 'baseline.json') == report
+    assert compare_results(report, report) == []
+
+
+def test_compare_flags_drops_beyond_tolerance():
+    baseline = {'results': {'evaluate_hand/random': 1000.0, 'compare_hands/random': 1000.0}}
+    report = {'results': {'evaluate_hand/random': 800.0, 'compare_hands/random': 900.0}}
+    assert compare_results(report, baseline, tolerance=0.15) == [('evaluate_hand/random', 1000.0, 800.0)]
+    assert compare_results(report, baseline, tolerance=0.25) == []
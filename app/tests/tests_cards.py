@@ -0,0 +1,60 @@
+"""
+Tests for the flyweight card table and the array backed deck
+"""
+import pickle
+import random
+from collections import Counter
+
+import pytest
+from pydealer import Card
+
+from app.cards import CARDS, CardDeck, card
+from app.hand_evaluator import card_code
+
+
+def test_cards_match_pydealer():
+    """Shared cards compare, print and encode like pydealer cards"""
+    assert CARDS[51] == Card('Ace', 'Spades')
+    assert str(CARDS[51]) == 'Ace of Spades'
+    assert all(card_code(shared) == code == shared.code for code, shared in enumerate(CARDS))
+
+
+def test_cards_are_immutable_and_interned():
+    with pytest.raises(AttributeError):
+        CARDS[0].value = 'Ace'
+    assert pickle.loads(pickle.dumps(CARDS[7])) is CARDS[7]
+    assert card(7) is CARDS[7]
+
+
+def test_deal_whole_deck():
+    """Every card is dealt exactly once and the deck runs out after 52"""
+    deck = CardDeck(random.Random(1))
+    dealt = deck.deal(2) + deck.deal(50)
+    assert len(set(dealt)) == 52
+    assert all(shared is CARDS[shared.code] for shared in dealt)
+    assert len(deck) == 0
+    with pytest.raises(ValueError):
+        deck.deal()
+
+
+def test_shuffle_reuses_deck():
+    """A new hand starts from the full deck without reallocating it"""
+    deck = CardDeck(random.Random(2))
+    codes = deck.codes
+    deck.deal(9)
+    deck.shuffle()
+    assert len(deck) == 52
+    assert deck.codes is codes
+    assert len(set(deck.deal(52))) == 52
+
+
+def test_partial_shuffle_is_uniform():
+    """Each card is equally likely in every dealt slot, whatever order earlier hands left"""
+    deck = CardDeck(random.Random(3))
+    counts = Counter()
+    for _ in range(26000):
+        deck.shuffle()
+        counts.update(deck.deal_codes(2))
+    assert len(counts) == 52
+    assert max(counts.values()) < 1000 * 1.15
+    assert min(counts.values()) > 1000 * 0.85
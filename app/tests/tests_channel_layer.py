@@ -0,0 +1,130 @@
+"""
+Tests for the Unix socket broker channel layer
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from channels.exceptions import ChannelFull
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import channel_layers
+from channels.testing import WebsocketCommunicator
+
+from app.channel_layer import BrokerChannelLayer, ChannelBroker
+
+
+@pytest_asyncio.fixture
+async def broker(tmp_path):
+    path = str(tmp_path / 'broker.sock')
+    server = ChannelBroker(path)
+    task = asyncio.create_task(server.serve())
+    while not (tmp_path / 'broker.sock').exists():
+        await asyncio.sleep(0.01)
+    yield server
+    task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_send_and_receive_across_layers(broker):
+    """Two layers stand for two worker processes sharing the broker"""
+    first, second = BrokerChannelLayer(broker.path), BrokerChannelLayer(broker.path)
+    channel = await first.new_channel()
+    assert first.client_prefix != second.client_prefix
+
+    receiving = asyncio.create_task(first.receive(channel))
+    await asyncio.sleep(0.01)
+    await second.send(channel, {'type': 'test.message', 'text': 'parked'})
+    assert await receiving == {'type': 'test.message', 'text': 'parked'}
+
+    await second.send(channel, {'type': 'test.message', 'text': 'queued'})
+    assert await first.receive(channel) == {'type': 'test.message', 'text': 'queued'}
+
+
+@pytest.mark.asyncio
+async def test_groups_are_shared(broker):
+    first, second = BrokerChannelLayer(broker.path), BrokerChannelLayer(broker.path)
+    channel1, channel2 = await first.new_channel(), await second.new_channel()
+    await first.group_add('poker_room_1', channel1)
+    await second.group_add('poker_room_1', channel2)
+    await first.group_send('poker_room_1', {'type': 'game.message', 'n': 1})
+    assert await first.receive(channel1) == {'type': 'game.message', 'n': 1}
+    assert await second.receive(channel2) == {'type': 'game.message', 'n': 1}
+
+    await second.group_discard('poker_room_1', channel2)
+    await first.group_send('poker_room_1', {'type': 'game.message', 'n': 2})
+    assert await first.receive(channel1) == {'type': 'game.message', 'n': 2}
+    assert 'poker_room_1' in broker.groups and channel2 not in broker.groups['poker_room_1']
+
+
+@pytest.mark.asyncio
+async def test_capacity_and_expiry(broker):
+    """Full channels raise ChannelFull, expired messages drop the channel from its groups"""
+    layer = BrokerChannelLayer(broker.path, capacity=2, expiry=0.05, channel_capacity={'small.*': 1})
+    channel = await layer.new_channel()
+    await layer.send(channel, {'type': 'a'})
+    await layer.send(channel, {'type': 'b'})
+    with pytest.raises(ChannelFull):
+        await layer.send(channel, {'type': 'c'})
+    await layer.send('small.one', {'type': 'a'})
+    with pytest.raises(ChannelFull):
+        await layer.send('small.one', {'type': 'b'})
+
+    await layer.group_add('poker_user_x', channel)
+    await asyncio.sleep(0.06)
+    await layer.group_send('poker_user_x', {'type': 'late'})  # expires the backlog first
+    assert 'poker_user_x' not in broker.groups
+    assert channel not in broker.channels
+
+
+@pytest.mark.asyncio
+async def test_group_expiry(broker):
+    layer = BrokerChannelLayer(broker.path, group_expiry=0)
+    channel = await layer.new_channel()
+    await layer.group_add('poker_room_2', channel)
+    await asyncio.sleep(0.01)
+    await layer.group_send('poker_room_2', {'type': 'x'})
+    assert 'poker_room_2' not in broker.groups
+
+
+@pytest.mark.asyncio
+async def test_cancelled_receive_keeps_message(broker):
+    """A message answered to a receive that was cancelled is returned by the next receive"""
+    layer = BrokerChannelLayer(broker.path)
+    channel = await layer.new_channel()
+    receiving = asyncio.create_task(layer.receive(channel))
+    await asyncio.sleep(0.01)
+    receiving.cancel()
+    await layer.send(channel, {'type': 'kept'})
+    assert await asyncio.wait_for(layer.receive(channel), 1) == {'type': 'kept'}
+    assert not broker.waiters
+
+
+class EchoConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        await self.channel_layer.group_add('echo', self.channel_name)
+        await self.accept()
+
+    async def receive_json(self, content):
+        await self.channel_layer.group_send('echo', {'type': 'echo.message', 'content': content})
+
+    async def echo_message(self, event):
+        await self.send_json(event['content'])
+
+
+@pytest.mark.asyncio
+async def test_websocket_consumers_share_groups(broker):
+    """Consumers on two layers (two processes) reach each other through a group"""
+    previous = channel_layers.set('default', BrokerChannelLayer(broker.path))
+    try:
+        first = WebsocketCommunicator(EchoConsumer.as_asgi(), '/ws/echo/')
+        second = WebsocketCommunicator(EchoConsumer.as_asgi(), '/ws/echo/')
+        assert (await first.connect())[0] and (await second.connect())[0]
+        await first.send_json_to({'hello': 'room'})
+        assert await second.receive_json_from(timeout=1) == {'hello': 'room'}
+        assert await first.receive_json_from(timeout=1) == {'hello': 'room'}
+        await first.disconnect()
+        await second.disconnect()
+    finally:
+        channel_layers.backends.pop('default', None)
+        if previous is not None:
+            channel_layers.set('default', previous)
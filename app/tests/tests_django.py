@@ -397,3 +397,26 @@ class CreateRoomTest(TestCase):
 
 
 
+
+
+class MetricsViewTest(TestCase):
+    def setUp(self):
+        """Przygotowanie użytkowników: zwykłego i z uprawnieniami personelu"""
+        self.client = Client()
+        self.metrics_url = reverse('metrics')
+        self.user = User.objects.create_user(username='player', password='testpassword123')
+        self.staff = User.objects.create_user(username='staff', password='testpassword123', is_staff=True)
+
+    def test_metrics_for_staff(self):
+        """Personel dostaje liczniki cache w formacie JSON"""
+        self.client.login(username='staff', password='testpassword123')
+        response = self.client.get(self.metrics_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hits', response.json()['evaluation_cache'])
+
+    def test_metrics_for_regular_user(self):
+        """Zwykły użytkownik jest przekierowywany do logowania"""
+        self.client.login(username='player', password='testpassword123')
+        response = self.client.get(self.metrics_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response.url)
@@ -0,0 +1,211 @@
+"""
+Tests for the Monte Carlo equity calculator
+"""
+import asyncio
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from pydealer import Card, Stack
+
+from app import equity
+from app.cache import LRUCache
+from app.equity import (estimate_equity, estimate_equity_async, calculate_equity_async,
+                        exact_equity, exact_cache)
+from app.hand_evaluator import card_code
+from app.hand_ranks import rank_codes
+from app.PokerGame import PokerGame
+
+
+def codes(*cards):
+    return [card_code(Card(value, suit)) for value, suit in cards]
+
+
+ACES = codes(('Ace', 'Spades'), ('Ace', 'Hearts'))
+KINGS = codes(('King', 'Spades'), ('King', 'Hearts'))
+
+
+class MockUser:
+    def __init__(self, username):
+        self.username = username
+
+
+def test_preflop_aces_vs_kings():
+    """AA is about an 82% favourite against KK"""
+    result = estimate_equity([ACES, KINGS], iterations=20000, seed=1)
+    assert result['samples'] == 20000
+    assert result['win'][0] == pytest.approx(0.82, abs=0.02)
+    assert result['equity'][0] + result['equity'][1] == pytest.approx(1.0)
+
+
+def test_complete_board_is_exact():
+    """With five board cards there is nothing to sample"""
+    board = codes(('Ace', 'Clubs'), ('King', 'Clubs'), ('7', 'Diamonds'), ('4', 'Hearts'), ('2', 'Spades'))
+    result = estimate_equity([ACES, KINGS], board, iterations=1000)
+    assert result['samples'] > 0
+    assert result['win'] == [1.0, 0.0]
+
+
+def test_split_pot_on_board():
+    """Board plays for both seats"""
+    board = codes(('Ace', 'Clubs'), ('King', 'Clubs'), ('Queen', 'Clubs'), ('Jack', 'Clubs'), ('10', 'Clubs'))
+    result = estimate_equity([ACES, KINGS], board)
+    assert result['tie'] == [1.0, 1.0]
+    assert result['equity'] == [0.5, 0.5]
+
+
+def test_duplicate_cards_rejected():
+    with pytest.raises(ValueError):
+        estimate_equity([ACES, ACES])
+    with pytest.raises(ValueError):
+        estimate_equity([ACES, KINGS], dead=[ACES[0]])
+
+
+@pytest.mark.asyncio
+async def test_async_uses_process_pool():
+    """Jobs are spread across the pool and merged"""
+    executor = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        result = await estimate_equity_async([ACES, KINGS], iterations=4000, time_budget=None,
+                                             seed=3, executor=executor)
+    finally:
+        executor.shutdown()
+    assert result['samples'] == 4000
+    assert result['win'][0] == pytest.approx(0.82, abs=0.04)
+
+
+@pytest.mark.asyncio
+async def test_game_broadcasts_equities_when_all_in():
+    """PokerGame sends an equities message once betting is closed by an all in"""
+    game = PokerGame(id=1, big_blind=10)
+    game.message_callback = AsyncMock()
+    for name in ("player1", "player2"):
+        pos = game.add_player(MockUser(name))
+        game.players[pos].update({'active': True, 'all_in': True})
+    game.players[0]['cards'] = Stack(cards=[Card('Ace', 'Spades'), Card('Ace', 'Hearts')])
+    game.players[1]['cards'] = Stack(cards=[Card('King', 'Spades'), Card('King', 'Hearts')])
+
+    fake_result = {'win': [0.8, 0.2], 'tie': [0.0, 0.0], 'equity': [0.8, 0.2], 'samples': 10}
+    with patch('app.PokerGame.calculate_equity_async', AsyncMock(return_value=fake_result)):
+        await game._send_equities()
+        await game._send_equities()  # only once per board
+
+    game.message_callback.assert_called_once_with('equities', {
+        'equities': {0: {'win': 0.8, 'tie': 0.0}, 1: {'win': 0.2, 'tie': 0.0}},
+        'board_size': 0,
+    })
+
+
+
+@pytest.mark.asyncio
+async def test_failed_equities_are_logged_not_sent(caplog):
+    """A calculation over its latency budget is logged as a warning and nothing is broadcast"""
+    game = PokerGame(id=1, big_blind=10)
+    game.message_callback = AsyncMock()
+    for name in ("player1", "player2"):
+        pos = game.add_player(MockUser(name))
+        game.players[pos].update({'active': True, 'all_in': True})
+    game.players[0]['cards'] = Stack(cards=[Card('Ace', 'Spades'), Card('Ace', 'Hearts')])
+    game.players[1]['cards'] = Stack(cards=[Card('King', 'Spades'), Card('King', 'Hearts')])
+
+    with patch('app.PokerGame.calculate_equity_async', AsyncMock(side_effect=asyncio.TimeoutError)):
+        await game._send_equities()
+
+    game.message_callback.assert_not_called()
+    assert [record.levelname for record in caplog.records] == ['WARNING']
+    assert caplog.records[0].exc_info is not None
+
+
+def all_in_game():
+    game = PokerGame(id=1, big_blind=10)
+    game.message_callback = AsyncMock()
+    for name in ("player1", "player2"):
+        pos = game.add_player(MockUser(name))
+        game.players[pos].update({'active': True, 'all_in': True})
+    game.players[0]['cards'] = Stack(cards=[Card('Ace', 'Spades'), Card('Ace', 'Hearts')])
+    game.players[1]['cards'] = Stack(cards=[Card('King', 'Spades'), Card('King', 'Hearts')])
+    return game
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('ready', [False, True])
+async def test_latency_budget_waits_for_the_pool(ready):
+    """A pool still starting up is not held to the latency budget, a started one is"""
+    game = all_in_game()
+    game.equity_latency_budget = 0.01
+
+    async def slow_equity(*args):
+        await asyncio.sleep(0.05)
+        return {'win': [0.8, 0.2], 'tie': [0.0, 0.0], 'equity': [0.8, 0.2], 'samples': 10}
+
+    with patch('app.PokerGame.calculate_equity_async', slow_equity), \
+            patch('app.PokerGame.pool_ready', return_value=ready):
+        await game._send_equities()
+    assert game.message_callback.called is not ready
+
+
+def test_warm_up_starts_every_worker(monkeypatch):
+    """The pool is created with a start up job per worker and is ready once they ran"""
+    monkeypatch.setenv('POKER_EQUITY_WORKERS', '2')
+    monkeypatch.setattr(equity, '_executor', None)
+    monkeypatch.setattr(equity, '_warm_jobs', [])
+    assert not equity.pool_ready()
+    equity.warm_up()
+    try:
+        assert len(equity._warm_jobs) == 2
+        for job in equity._warm_jobs:
+            job.result(timeout=60)
+        assert equity.pool_ready()
+    finally:
+        equity._executor.shutdown()
+
+def test_exact_flop_enumeration():
+    """Exact equity on the flop covers all 990 runouts"""
+    board = codes(('Queen', 'Diamonds'), ('7', 'Clubs'), ('2', 'Hearts'))
+    exact_cache.clear()
+    result = exact_equity([ACES, KINGS], board)
+    assert result['samples'] == 990
+
+    deck = [code for code in range(52) if code not in ACES + KINGS + board]
+    kings_win = sum(rank_codes(KINGS + board + list(runout)) > rank_codes(ACES + board + list(runout))
+                    for runout in itertools.combinations(deck, 2))
+    assert result['win'][1] == pytest.approx(kings_win / 990)
+    assert result['win'][0] + result['win'][1] + result['tie'][0] == pytest.approx(1.0)
+
+
+def test_suit_isomorphic_spots_share_cache_entry():
+    """Relabelling suits gives the same memoized result"""
+    exact_cache.clear()
+    board = codes(('Queen', 'Diamonds'), ('7', 'Clubs'), ('2', 'Hearts'), ('9', 'Spades'))
+    relabelled = codes(('Queen', 'Hearts'), ('7', 'Spades'), ('2', 'Diamonds'), ('9', 'Clubs'))
+    aces = codes(('Ace', 'Clubs'), ('Ace', 'Diamonds'))
+    kings = codes(('King', 'Clubs'), ('King', 'Diamonds'))
+    first = exact_equity([ACES, KINGS], board)
+    second = exact_equity([aces, kings], relabelled)
+    assert first == second
+    assert len(exact_cache) == 1
+    assert exact_cache.hits == 1
+
+
+def test_exact_cache_is_bounded():
+    cache = LRUCache(2)
+    for key in 'abc':
+        cache.put(key, key)
+    assert len(cache) == 2
+    assert cache.get('a') is None
+    assert cache.get('c') == 'c'
+
+
+@pytest.mark.asyncio
+async def test_calculate_equity_picks_exact_on_turn():
+    """Heads-up on the turn is enumerated, preflop falls back to sampling"""
+    exact_cache.clear()
+    board = codes(('Queen', 'Diamonds'), ('7', 'Clubs'), ('2', 'Hearts'), ('9', 'Spades'))
+    executor = ThreadPoolExecutor(max_workers=1)
+    result = await calculate_equity_async([ACES, KINGS], board, executor=executor)
+    assert result['samples'] == 44
+    assert result['win'][1] == pytest.approx(2 / 44)
+    sampled = await calculate_equity_async([ACES, KINGS], executor=executor, iterations=500, seed=1)
+    assert sampled['samples'] == 500
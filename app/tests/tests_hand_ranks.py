@@ -0,0 +1,63 @@
+"""
+Tests for the lookup table hand ranker
+"""
+import random
+
+import pytest
+from pydealer import Card
+
+from app import hand_ranks
+from app.cards import CARDS
+from app.hand_evaluator import evaluate_codes, hand_strength, evaluate_cards, result_strength
+
+
+@pytest.fixture(scope='module', autouse=True)
+def table_file(tmp_path_factory):
+    """Build the tables into a temporary file instead of app/data"""
+    path = tmp_path_factory.mktemp('ranks') / 'hand_ranks.bin'
+    original_path, original_tables = hand_ranks.TABLE_PATH, hand_ranks._tables
+    hand_ranks.TABLE_PATH, hand_ranks._tables = path, None
+    yield path
+    hand_ranks.TABLE_PATH, hand_ranks._tables = original_path, original_tables
+
+
+def test_missing_tables_are_not_built_on_use(table_file):
+    """Without the tables file a lookup points at build_hand_tables, once built the file is memory-mapped"""
+    assert not table_file.exists()
+    with pytest.raises(FileNotFoundError, match='build_hand_tables'):
+        hand_ranks.rank_codes([0, 1, 2, 3, 17])
+    assert not table_file.exists()
+    hand_ranks.build_tables(table_file)
+    assert hand_ranks.rank_codes([0, 1, 2, 3, 17]) == hand_strength(*evaluate_codes([0, 1, 2, 3, 17]))
+
+
+@pytest.mark.parametrize('size', [5, 6, 7])
+def test_matches_evaluator(size):
+    """Table strength equals packed evaluator result for random hands"""
+    rng = random.Random(size)
+    for _ in range(3000):
+        codes = rng.sample(range(52), size)
+        assert hand_ranks.rank_codes(codes) == hand_strength(*evaluate_codes(codes))
+
+
+def test_matches_result_strength():
+    """Strength of the (category, cards) layout matches the table"""
+    rng = random.Random(7)
+    for _ in range(1000):
+        cards = [CARDS[code] for code in rng.sample(range(52), 7)]
+        assert hand_ranks.rank_cards(cards) == result_strength(evaluate_cards(cards))
+
+
+def test_ordering_and_ties():
+    """Higher hands get higher integers, identical ranks tie across suits"""
+    wheel = [Card('Ace', 'Hearts'), Card('2', 'Spades'), Card('3', 'Clubs'), Card('4', 'Hearts'), Card('5', 'Diamonds')]
+    six_high = [Card('2', 'Spades'), Card('3', 'Clubs'), Card('4', 'Hearts'), Card('5', 'Diamonds'), Card('6', 'Hearts')]
+    trips = [Card('Ace', 'Hearts'), Card('Ace', 'Spades'), Card('Ace', 'Clubs'), Card('King', 'Hearts'), Card('Queen', 'Diamonds')]
+    steel_wheel = [Card(value, 'Clubs') for value in ('Ace', '2', '3', '4', '5')]
+    assert hand_ranks.rank_cards(trips) < hand_ranks.rank_cards(wheel) < hand_ranks.rank_cards(six_high)
+    assert hand_ranks.rank_cards(steel_wheel) > hand_ranks.rank_cards(six_high)
+
+    board = [Card('King', 'Hearts'), Card('9', 'Spades'), Card('7', 'Clubs'), Card('4', 'Diamonds'), Card('2', 'Hearts')]
+    hand1 = [Card('Ace', 'Spades'), Card('Queen', 'Diamonds')] + board
+    hand2 = [Card('Ace', 'Clubs'), Card('Queen', 'Hearts')] + board
+    assert hand_ranks.rank_cards(hand1) == hand_ranks.rank_cards(hand2)
@@ -2,10 +2,15 @@
 Tests for PokerGame class logic
 """
 import asyncio
+import json
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
-from pydealer import Stack, Card
+from pydealer import Stack, Card, Deck
 from app.PokerGame import PokerGame
+from app.wire import decode_frame
+from app.cards import CARDS
+from app.hand_evaluator import HandState, evaluation_cache, result_strength
+from app.shuffle import ShuffleService
 
 
 class MockUser:
@@ -14,6 +19,12 @@ class MockUser:
         self.username = username
 
 
+@pytest.fixture(autouse=True)
+def no_audit_log(monkeypatch):
+    """Tables dealt by the tests do not write to the shuffle audit log"""
+    monkeypatch.setattr('app.PokerGame.shuffle_service', ShuffleService(audit_log=None))
+
+
 @pytest.fixture
 def poker_game():
     """Create a fresh PokerGame instance for each test"""
@@ -125,6 +136,56 @@ class TestPokerGameBasics:
         poker_game.add_player(user2)
         assert poker_game.can_start_game()  # Now we can start
 
+    def test_seat_masks_follow_player_state(self, poker_game):
+        """Seat bitmasks change with active, folded and all_in"""
+        pos1 = poker_game.add_player(MockUser("player1"))
+        pos2 = poker_game.add_player(MockUser("player2"))
+        assert poker_game.seated_mask == 0b11
+        assert poker_game.in_hand_mask == 0
+
+        poker_game.players[pos1]['active'] = True
+        poker_game.players[pos2].update({'active': True, 'all_in': True})
+        assert poker_game.in_hand_mask == 0b11
+        assert poker_game.acting_mask == 0b01
+
+        poker_game.players[pos1]['folded'] = True
+        assert poker_game.in_hand_mask == 0b10
+        assert poker_game.acting_mask == 0
+
+        poker_game.remove_player("player2")
+        assert poker_game.seated_mask == 0b01
+        assert poker_game.in_hand_mask == 0
+        assert poker_game.get_player("player2") == (None, None)
+
+    def test_seat_reads_like_a_dict(self, poker_game):
+        """Seats keep the player dict interface and copy() gives the client shape"""
+        pos = poker_game.add_player(MockUser("player1"))
+        seat = poker_game.players[pos]
+        seat['chip_count'] -= 10
+        assert seat.chip_count == 990
+        assert seat.get('missing', 'default') == 'default'
+        with pytest.raises(KeyError):
+            seat['missing'] = True
+        assert seat.copy() == {'username': 'player1', 'chip_count': 990, 'cards': None, 'folded': False,
+                               'all_in': False, 'current_bet': 0, 'active': False}
+
+    def test_player_collections_are_live_seats(self, poker_game):
+        """get_* collections list seats in order and hand out the seats themselves"""
+        for name in ("player1", "player2", "player3"):
+            poker_game.players[poker_game.add_player(MockUser(name))]['active'] = True
+        poker_game.players[1]['folded'] = True
+        not_folded = poker_game.get_not_folded_players()
+        assert list(not_folded) == [0, 2]
+        assert 1 not in not_folded
+        assert not_folded[2] is poker_game.players[2]
+        with pytest.raises(KeyError):
+            not_folded[1]
+
+        seat = poker_game.players[2]
+        poker_game.remove_player("player3")
+        assert not_folded[2] is seat and not_folded.get(2) is seat  # captured when the set was built
+        assert list(not_folded.items()) == [(0, poker_game.players[0]), (2, seat)]
+
 
 class TestPokerGameBetting:
     """Test betting functionality"""
@@ -372,6 +433,84 @@ class TestPokerGameAsync:
         await poker_game.notify_dealt_cards(pos, cards, [0, 1])
         mock_callbacks['private_message_callback'].assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_frames_binary_encoded_only_for_binary_sockets(self, poker_game):
+        """No binary frame is built while no socket of the room takes one"""
+        poker_game.frame_callback = AsyncMock()
+        poker_game.private_frame_callback = AsyncMock()
+        poker_game.batch_window = 0
+        pos = poker_game.add_player(MockUser("player1"))
+
+        with patch('app.PokerGame.wire.encode_frame') as encode:
+            await poker_game.notify_bet(pos)
+            await poker_game.notify_player_turn(pos)
+            await poker_game._flush_messages()
+        encode.assert_not_called()
+        assert poker_game.frame_callback.call_args.args[1] is None
+        assert poker_game.private_frame_callback.call_args.args[2] is None
+
+        await poker_game._on_binary(1)
+        await poker_game.notify_bet(pos)
+        await poker_game._flush_messages()
+        assert decode_frame(poker_game.frame_callback.call_args.args[1])[1][0]['type'] == 'player_bet'
+        assert await poker_game._on_binary(-1) == 0
+
+    @pytest.mark.asyncio
+    async def test_frame_callbacks_get_batched_events(self, poker_game, mock_callbacks):
+        """Events of a step go out as one frame per stream, encoded once"""
+        poker_game.message_callback = mock_callbacks['message_callback']
+        poker_game.frame_callback = AsyncMock()
+        poker_game.private_frame_callback = AsyncMock()
+        poker_game.batch_window = 0
+        pos = poker_game.add_player(MockUser("player1"))
+
+        await poker_game.notify_bet(pos)
+        await poker_game.notify_clear_betting()
+        await poker_game.notify_player_turn(pos)
+        assert mock_callbacks['message_callback'].call_count == 2
+        poker_game.frame_callback.assert_not_called()
+
+        assert await poker_game._on_binary(1) == 1 # a binary socket is in the room
+        with patch('app.PokerGame.json.dumps', wraps=json.dumps) as dumps:
+            await poker_game._flush_messages()
+        assert dumps.call_count == 2
+        text, binary = poker_game.frame_callback.call_args.args
+        assert decode_frame(binary) == (1, json.loads(text)['events'])
+        frame = json.loads(text)
+        assert frame['type'] == 'batch'
+        assert [event['type'] for event in frame['events']] == ['player_bet', 'clear_betting']
+        bet = mock_callbacks['message_callback'].call_args_list[0].args[1]
+        assert frame['events'][0] == {'type': 'player_bet', **bet}
+        username, text, _ = poker_game.private_frame_callback.call_args.args
+        assert username == "player1" and json.loads(text)['type'] == 'your_turn' # a lone event is sent as is
+
+        await poker_game._flush_messages()
+        assert poker_game.frame_callback.call_count == 1
+        assert frame['seq'] == poker_game.seq == 1 and 'seq' not in json.loads(text) # only room frames are numbered
+
+    @pytest.mark.asyncio
+    async def test_batch_window_flushes_long_steps(self, poker_game):
+        """An event waits at most batch_window for its step to end"""
+        poker_game.frame_callback = AsyncMock()
+        poker_game.batch_window = 0.05
+        poker_game.add_player(MockUser("player1"))
+        await poker_game.notify_clear_betting()
+        await asyncio.sleep(0.3)
+        assert json.loads(poker_game.frame_callback.call_args.args[0]) == {'type': 'clear_betting', 'seq': 1}
+        assert poker_game.batch_timer is None
+        assert not poker_game.flush_tasks
+
+    @pytest.mark.asyncio
+    async def test_failed_timer_flush_is_logged(self, poker_game, caplog):
+        """A flush started by the batch timer is held by the table and its failure is logged"""
+        poker_game.frame_callback = AsyncMock(side_effect=ConnectionError("gone"))
+        poker_game.batch_window = 0.05
+        poker_game.add_player(MockUser("player1"))
+        await poker_game.notify_clear_betting()
+        await asyncio.sleep(0.3)
+        assert not poker_game.flush_tasks
+        assert "Table 1 could not send its messages" in caplog.text and "ConnectionError" in caplog.text
+
     @pytest.mark.asyncio
     async def test_reset_game(self, poker_game, mock_callbacks):
         """Test game reset functionality"""
@@ -396,6 +535,150 @@ class TestPokerGameAsync:
         assert poker_game.players[pos]['current_bet'] == 0
         assert poker_game.ready_for_new_round is True
 
+    @pytest.mark.asyncio
+    async def test_actor_applies_posted_commands(self, poker_game, mock_callbacks):
+        """Join, start, action and leave commands are applied in order by the table actor"""
+        poker_game.message_callback = mock_callbacks['message_callback']
+        poker_game.private_message_callback = mock_callbacks['private_message_callback']
+        poker_game.auto_start = False
+
+        assert await poker_game.post('join', MockUser("player1")) == 0
+        assert await poker_game.post('join', MockUser("player2")) == 1
+        assert await poker_game.post('start') is True
+        assert await poker_game.post('start') is False  # hand already running
+        assert poker_game.current_player_position == 0  # heads up, dealer acts first
+
+        assert await poker_game.post('action', "player2", 'fold') == (False, "Not your turn.")
+        assert await poker_game.post('action', "player1", 'fold') == (True, None)
+        assert await poker_game.post('leave', "player1") == 0  # queued behind the rest of the hand
+        assert poker_game.game_state == 'waiting'
+        assert poker_game.players[1]['chip_count'] == 1005
+
+        assert await poker_game.post('leave', "player2") == 1
+        await asyncio.wait_for(poker_game.actor_task, 1)  # empty table, actor exits
+        assert poker_game.actor_stats['commands'] == {'join': 2, 'start': 2, 'action': 2, 'leave': 2}
+
+    @pytest.mark.asyncio
+    async def test_snapshot_follows_room_frames(self, poker_game):
+        """A snapshot is numbered after the frames it includes and hides the other hands"""
+        poker_game.frame_callback = AsyncMock()
+        poker_game.auto_start = False
+        await poker_game.post('join', MockUser("player1"))
+        await poker_game.post('join', MockUser("player2"))
+        await poker_game.post('start')
+        await poker_game.post('action', "player1", 'call')
+
+        snapshot = json.loads(await poker_game.post('snapshot', 'init_participant', "player2"))
+        frames = [json.loads(call.args[0]) for call in poker_game.frame_callback.call_args_list]
+        assert [frame['seq'] for frame in frames] == [1, 2, 3, 4] # two joins, the blinds, the call
+        assert snapshot['type'] == 'init_participant'
+        assert snapshot['seq'] == 4
+        assert snapshot['your_position'] == 1
+        assert snapshot['your_cards'] == [str(card) for card in poker_game.players[1]['cards']]
+        assert snapshot['players']['1']['cards'] == snapshot['players']['0']['cards'] == ['reverse', 'reverse']
+        assert snapshot['pot'] == 20 and snapshot['players']['0']['current_bet'] == 10
+        assert snapshot['acting'] == "player2"
+        assert snapshot['your_turn']['current_bet'] == 10
+
+        observer = json.loads(await poker_game.post('snapshot'))
+        assert observer['type'] == 'snapshot' and observer['your_position'] is None
+        assert 'your_turn' not in observer and 'your_cards' not in observer
+        assert {key: observer[key] for key in observer if not key.startswith(('type', 'your_'))} == \
+            {key: snapshot[key] for key in snapshot if not key.startswith(('type', 'your_'))}
+
+        await poker_game.post('leave', "player1")
+        await poker_game.post('leave', "player2")
+
+    @pytest.mark.asyncio
+    async def test_public_snapshot_is_cached(self, poker_game):
+        """Joiners share one encoded public snapshot until a broadcast or seat change"""
+        poker_game.add_player(MockUser("player1"))
+        public = poker_game.public_snapshot()
+        assert poker_game.snapshot('init_observer').endswith(public[1:])
+        assert poker_game.public_snapshot() is public
+
+        await poker_game._send_private_message("player1", 'hand_value', {})
+        assert poker_game.public_snapshot() is public
+        poker_game.add_player(MockUser("player2"))
+        assert json.loads(poker_game.public_snapshot())['players']['1']['username'] == "player2"
+
+        public = poker_game.public_snapshot()
+        await poker_game.notify_clear_betting()
+        assert poker_game.public_snapshot() is not public
+
+    @pytest.mark.asyncio
+    async def test_joins_reach_the_room_as_one_event(self, poker_game):
+        """A participant join or leave is one small room event, an observer's snapshot sends nothing"""
+        poker_game.frame_callback = AsyncMock()
+        poker_game.auto_start = False
+        await poker_game.post('join', MockUser("player1"))
+        assert json.loads(poker_game.frame_callback.call_args.args[0]) == \
+            {'type': 'new_player', 'position': 0, 'username': "player1", 'chip_count': 1000, 'seq': 1}
+
+        await poker_game.post('snapshot')
+        assert poker_game.frame_callback.call_count == 1
+
+        await poker_game.post('leave', "player1")
+        assert json.loads(poker_game.frame_callback.call_args.args[0]) == {'type': 'player_left', 'position': 0, 'seq': 2}
+
+    @pytest.mark.asyncio
+    async def test_raiser_leaving_mid_round(self, poker_game):
+        """The betting round ends normally when the last raiser has left the table"""
+        poker_game.auto_start = False
+        for name in ("player1", "player2", "player3"):
+            await poker_game.post('join', MockUser(name))
+        assert await poker_game.post('start') is True
+        assert poker_game.current_player_position == 0  # dealer acts first three handed
+        assert await poker_game.post('action', "player1", 'raise', 40) == (True, None)
+        assert await poker_game.post('leave', "player1") == 0
+        assert await poker_game.post('action', "player2", 'call') == (True, None)
+        assert await poker_game.post('action', "player3", 'call') == (True, None)
+        assert poker_game.game_state == 'flop'
+        assert poker_game.driver_running
+
+        await poker_game.post('leave', "player2")
+        await poker_game.post('leave', "player3")
+
+    @pytest.mark.asyncio
+    async def test_failing_driver_resets_table(self, poker_game, caplog):
+        """A hand that raises goes back to waiting, the room gets a reset and a new hand can start"""
+        poker_game.auto_start = False
+        poker_game.message_callback = AsyncMock()
+        for name in ("player1", "player2"):
+            await poker_game.post('join', MockUser(name))
+        with patch.dict(poker_game.state_setup_methods, flop=AsyncMock(side_effect=RuntimeError("boom"))):
+            assert await poker_game.post('start') is True
+            assert await poker_game.post('action', "player1", 'call') == (True, None)
+            assert await poker_game.post('action', "player2", 'call') == (True, None)
+        await poker_game.post('seats') # the actor is done with the failed hand
+        assert "Table 1 stopped" in caplog.text and "boom" in caplog.text
+        assert poker_game.game_state == 'waiting'
+        assert not poker_game.driver_running
+        assert poker_game.pot == 0
+        assert all(seat['cards'] is None and not seat['active'] for seat in poker_game.get_all_players().values())
+        assert poker_game.message_callback.call_args.args[0] == 'reset'
+
+        assert await poker_game.post('start') is True
+        assert poker_game.game_state == 'pre_flop'
+        await poker_game.post('leave', "player1")
+        await poker_game.post('leave', "player2")
+
+    @pytest.mark.asyncio
+    async def test_table_metrics(self, poker_game):
+        """Actor statistics of every table are exposed through the metrics registry"""
+        from app import metrics
+        from app.PokerGame import poker_games
+        poker_games[poker_game.id] = poker_game
+        try:
+            await poker_game.post('join', MockUser("player1"))
+            tables = metrics.snapshot()['tables']
+            await poker_game.post('leave', "player1")
+        finally:
+            poker_games.pop(poker_game.id)
+        assert tables['tables'] >= 1
+        assert tables['commands']['join'] >= 1
+        assert tables['max_latency_ms']['join'] >= tables['mean_latency_ms']['join'] > 0
+
 
 class TestPokerGameHandEvaluation:
     """Test hand evaluation (basic tests, you have separate files for comprehensive tests)"""
@@ -433,6 +716,43 @@ class TestPokerGameHandEvaluation:
         result = poker_game._evaluate_hand(cards)
         assert result is None
 
+    def test_evaluate_hand_cache(self, poker_game):
+        """The same card set in any order is evaluated once and gives the same result"""
+        evaluation_cache.clear()
+        cards = [Card('Ace', 'Spades'), Card('Ace', 'Hearts'), Card('King', 'Diamonds'),
+                 Card('King', 'Clubs'), Card('Jack', 'Spades'), Card('2', 'Hearts'), Card('3', 'Clubs')]
+
+        first = poker_game._evaluate_hand(cards)
+        second = poker_game._evaluate_hand(Stack(cards=cards[::-1]))
+        assert first == second
+        assert first[0] == 'two_pair'
+        assert (evaluation_cache.hits, evaluation_cache.misses, len(evaluation_cache)) == (1, 1, 1)
+
+    def test_evaluate_hand_cache_is_bounded(self, poker_game):
+        """Least recently used card sets are evicted once the cache is full"""
+        with patch.object(evaluation_cache, 'maxsize', 10):
+            evaluation_cache.clear()
+            for start in range(14):
+                poker_game._evaluate_hand([CARDS[code] for code in range(start, start + 7)])
+            assert len(evaluation_cache) == 10
+            poker_game._evaluate_hand([CARDS[code] for code in range(0, 7)])
+            assert evaluation_cache.misses == 15
+        evaluation_cache.clear()
+
+    def test_hand_states_share_the_cache(self):
+        """Seat hand states look their 5+ card evaluations up in the cache, as hand_value and showdown do"""
+        evaluation_cache.clear()
+        hole = [CARDS[0], CARDS[13]]
+        board = [CARDS[code] for code in (26, 5, 19)]
+        state = HandState(hole)
+        assert state.strength() and len(evaluation_cache) == 0 # fewer than 5 cards are not cached
+        state.add_cards(board)
+        assert state.result()[0] == 'three_of_kind'
+        other = HandState(board[::-1] + hole)
+        assert other.strength() == state.strength()
+        assert (evaluation_cache.hits, evaluation_cache.misses, len(evaluation_cache)) == (1, 1, 1)
+        evaluation_cache.clear()
+
     def test_compare_hands_same_rank(self, poker_game):
         """Test comparing hands of the same rank"""
         # Create two pairs, first should win
@@ -477,4 +797,47 @@ class TestPokerGameHandEvaluation:
         hand2 = poker_game._evaluate_hand(cards2)
         
         result = poker_game._compare_hands(hand1, hand2)
-        assert result == -1  # straight wins over pair
\ No newline at end of file
+        assert result == -1  # straight wins over pair
+
+    @pytest.mark.asyncio
+    async def test_hand_states_follow_board(self, poker_game, mock_callbacks):
+        """Board cards are added to every seat's hand state as they are dealt"""
+        poker_game.private_message_callback = mock_callbacks['private_message_callback']
+        for name in ("player1", "player2"):
+            pos = poker_game.add_player(MockUser(name))
+            poker_game.players[pos]['active'] = True
+
+        poker_game.deck = Deck()
+        for pos in (0, 1):
+            poker_game.players[pos]['cards'] = Stack(cards=poker_game.deck.deal(2))
+            poker_game.hand_states[pos] = HandState(poker_game.players[pos]['cards'])
+
+        for count in (3, 1, 1):
+            poker_game._deal_board_cards(count)
+            await poker_game._calculate_players_hand_values()
+            for pos in (0, 1):
+                expected = poker_game._evaluate_hand(poker_game.players[pos]['cards'] + poker_game.board_cards)
+                assert result_strength(poker_game.hand_states[pos].result()) == result_strength(expected)
+
+        assert mock_callbacks['private_message_callback'].call_count == 6
+
+    @pytest.mark.asyncio
+    async def test_preflop_hand_value(self, poker_game, mock_callbacks):
+        """Before the flop players get their starting hand class and its table equity"""
+        poker_game.private_message_callback = mock_callbacks['private_message_callback']
+        pos = poker_game.add_player(MockUser("player1"))
+        poker_game.players[pos]['active'] = True
+        poker_game.players[pos]['cards'] = Stack(cards=[Card('Ace', 'Spades'), Card('King', 'Spades')])
+
+        with patch('app.PokerGame.equity_vs_random', return_value=0.67):
+            await poker_game._calculate_players_hand_values()
+        username, message_type, message = mock_callbacks['private_message_callback'].call_args.args
+        assert (username, message_type) == ("player1", 'hand_value')
+        assert message['hand_value'] == 'preflop'
+        assert message['hand_class'] == 'AKs'
+        assert message['equity'] == 0.67
+
+        mock_callbacks['private_message_callback'].reset_mock()
+        with patch('app.PokerGame.equity_vs_random', return_value=None):
+            await poker_game._calculate_players_hand_values()
+        mock_callbacks['private_message_callback'].assert_not_called()
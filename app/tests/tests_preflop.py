@@ -0,0 +1,57 @@
+"""
+Tests for the preflop equity table
+"""
+from itertools import combinations
+
+import pytest
+
+from app import preflop
+
+
+@pytest.fixture
+def table_file(tmp_path):
+    """Point the module at a temporary table file"""
+    path = tmp_path / 'preflop_equity.bin'
+    original_path, original_table = preflop.TABLE_PATH, preflop._table
+    preflop.TABLE_PATH, preflop._table = path, None
+    yield path
+    preflop.TABLE_PATH, preflop._table = original_path, original_table
+
+
+def test_every_combo_has_one_class():
+    """1326 two card combos fall into 169 classes with 6, 4 or 12 combos each"""
+    classes = {}
+    for code1, code2 in combinations(range(52), 2):
+        classes.setdefault(preflop.hand_class(code1, code2), set()).add(frozenset((code1, code2)))
+    assert len(classes) == preflop.CLASS_COUNT
+    for index, combos in classes.items():
+        assert combos == {frozenset(combo) for combo in preflop.class_combos(index)}
+        assert len(combos) == {'': 6, 's': 4, 'o': 12}[preflop.class_name(index)[2:]]
+
+
+def test_class_names():
+    """Names round trip and use the usual notation"""
+    ace, king = 12, 11
+    assert preflop.class_name(preflop.hand_class(ace, 13 + ace)) == 'AA'
+    assert preflop.class_name(preflop.hand_class(ace, king)) == 'AKs'
+    assert preflop.class_name(preflop.hand_class(king, 13 + ace)) == 'AKo'
+    for index in range(preflop.CLASS_COUNT):
+        assert preflop.class_index(preflop.class_name(index)) == index
+
+
+def test_missing_table(table_file):
+    """Without a built table lookups return None instead of simulating"""
+    assert preflop.equity_vs_random(preflop.class_index('AA')) is None
+
+
+def test_write_and_load(table_file):
+    """Rows written by write_table are read back, mirrored matchups sum to one"""
+    aces, kings = preflop.class_index('AA'), preflop.class_index('KK')
+    rows = [preflop.compute_row(index, 2000, 200, seed=1) for index in (aces, kings)]
+    preflop.write_table(rows)
+
+    assert preflop.equity_vs_random(aces) == pytest.approx(0.85, abs=0.03)
+    assert preflop.equity_vs_class(aces, kings) == pytest.approx(0.82, abs=0.06)
+    assert preflop.equity_vs_class(aces, kings) + preflop.equity_vs_class(kings, aces) \
+        == pytest.approx(1, abs=1e-4)
+    assert preflop.equity_vs_class(aces, aces) == pytest.approx(0.5, abs=1e-4)
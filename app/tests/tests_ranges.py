@@ -0,0 +1,77 @@
+"""
+Tests for range versus range equity
+"""
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.equity import exact_equity
+from app.ranges import COMBOS, parse_cards, parse_range, range_equity
+
+
+def combos_of(text):
+    weights = parse_range(text)
+    return {tuple(COMBOS[index]): weights[index] for index in weights.nonzero()[0]}
+
+
+@pytest.fixture(scope='module')
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize('text, count', [
+    ('AA', 6), ('AKs', 4), ('AKo', 12), ('AK', 16), ('QQ+', 18), ('22+', 78),
+    ('A2s+', 48), ('KTo+', 36), ('22-55', 24), ('A2s-A5s', 16), ('AsKd', 1),
+    ('QQ+,AKs', 22), ('22+,A2s+', 126),
+])
+def test_parse_range_counts(text, count):
+    """Range notation expands to the expected number of combos"""
+    assert len(combos_of(text)) == count
+
+
+def test_parse_range_weights():
+    """Weights apply per token and later tokens override earlier ones"""
+    weights = combos_of('QQ+:0.5,AA')
+    assert sorted(set(weights.values())) == [0.5, 1.0]
+    assert sum(weights.values()) == 6 + 12 * 0.5
+
+
+@pytest.mark.parametrize('text', ['AAA', 'A1s', 'AKx', 'AA:2', 'AsAs', 'AK-QJ'])
+def test_parse_range_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_range(text)
+
+
+def test_matches_combo_by_combo_enumeration(executor):
+    """Weighted range equity equals the weighted average of exact combo matchups"""
+    board = parse_cards('Ah7d2c5s')
+    hero, villain = combos_of('KK,AKs:0.5'), combos_of('77,A5s+')
+    total = equity = 0.0
+    for (hero_combo, hero_weight), (villain_combo, villain_weight) in itertools.product(hero.items(), villain.items()):
+        if set(hero_combo) & set(villain_combo) or set(hero_combo + villain_combo) & set(board):
+            continue
+        weight = hero_weight * villain_weight
+        equity += weight * exact_equity([hero_combo, villain_combo], board)['equity'][0]
+        total += weight
+
+    result = range_equity('KK,AKs:0.5', '77,A5s+', board, executor=executor)
+    assert result['exact']
+    assert result['equity'] == pytest.approx(equity / total)
+
+
+def test_blocked_combos_removed(executor):
+    """Combos using board or dead cards are dropped before scoring"""
+    result = range_equity('AA', 'KK', parse_cards('AsKd7c'), dead=parse_cards('Ah'), executor=executor)
+    assert result['combos'] == (1, 3)
+    with pytest.raises(ValueError):
+        range_equity('AsAh', 'KK', parse_cards('As7d2c'), executor=executor)
+
+
+def test_sampled_preflop(executor):
+    """Preflop runouts are sampled, AA is about 82% against KK"""
+    result = range_equity('AA', 'KK', iterations=1000, seed=3, executor=executor)
+    assert not result['exact']
+    assert result['runouts'] == 1000
+    assert result['equity'] == pytest.approx(0.82, abs=0.04)
@@ -0,0 +1,107 @@
+"""
+Tests for the shuffle service and its audit log
+"""
+from collections import Counter
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.PokerGame import PokerGame
+from app.cards import CardDeck
+from app.shuffle import EntropyPool, HandRng, ShuffleService, read_audit_log, redeal
+
+
+class MockUser:
+    def __init__(self, username):
+        self.username = username
+
+
+def test_entropy_pool_reads_in_blocks():
+    """Small reads are served from one os.urandom block"""
+    pool = EntropyPool(block_size=1024)
+    with patch('app.shuffle.os.urandom', wraps=__import__('os').urandom) as urandom:
+        seeds = [pool.read(32) for _ in range(64)]
+    assert urandom.call_count == 2
+    assert len(set(seeds)) == 64 and all(len(seed) == 32 for seed in seeds)
+
+
+def test_hand_rng_is_deterministic_and_unbiased():
+    """The same seed gives the same deal, indexes are uniform over the range"""
+    assert redeal(b'seed') == redeal(b'seed') != redeal(b'other seed')
+    assert sorted(redeal(b'seed')) == list(range(52))
+
+    rng = HandRng(b'uniformity')
+    counts = Counter(rng.randrange(0, 52) for _ in range(52000))
+    assert len(counts) == 52
+    assert 850 < min(counts.values()) and max(counts.values()) < 1150
+    with pytest.raises(ValueError):
+        rng.randrange(0, 300)
+
+
+def test_injected_seed_reproduces_hands(tmp_path):
+    """Two services with the same master seed deal the same hands"""
+    decks = []
+    for _ in range(2):
+        service = ShuffleService(seed=42, audit_log=None)
+        deck = CardDeck()
+        hands = []
+        for hand in range(3):
+            deck.shuffle(service.new_hand(1, hand))
+            hands.append(deck.deal(9))
+        decks.append(hands)
+    assert decks[0] == decks[1]
+    assert decks[0][0] != decks[0][1]
+
+
+def test_audit_log_commit_and_reveal(tmp_path):
+    """A logged hand is re-dealt from its revealed seed, which matches the commitment"""
+    log = tmp_path / 'audit.log'
+    service = ShuffleService(audit_log=log)
+    rng = service.new_hand(7, 3)
+    deck = CardDeck()
+    deck.shuffle(rng)
+    dealt = [card.code for card in deck.deal(2) + deck.deal(2) + deck.deal(3)]
+
+    with pytest.raises(LookupError):
+        read_audit_log(7, 3, log)  # committed but not revealed yet
+    service.reveal(7, 3, rng)
+    assert redeal(read_audit_log(7, 3, log), 7) == dealt
+
+    lines = log.read_text().splitlines()
+    assert len(lines) == 2 and rng.seed.hex() not in lines[0]
+    log.write_text(lines[0] + '\n' + lines[1].replace(rng.seed.hex(), '00' * 32) + '\n')
+    with pytest.raises(ValueError):
+        read_audit_log(7, 3, log)
+
+
+def test_restarted_table_hands_are_told_apart_by_session(tmp_path):
+    """Hand numbers restart with the table, the session picks the right seed"""
+    log = tmp_path / 'audit.log'
+    service = ShuffleService(audit_log=log)
+    rngs = {}
+    for session in ('before', 'after'):
+        rngs[session] = service.new_hand(7, 1, session)
+        service.reveal(7, 1, rngs[session], session)
+
+    with pytest.raises(LookupError, match='before, after'):
+        read_audit_log(7, 1, log)
+    assert read_audit_log(7, 1, log, 'before') == rngs['before'].seed
+    assert read_audit_log(7, 1, log, 'after') == rngs['after'].seed
+
+@pytest.mark.asyncio
+async def test_game_uses_shuffle_service(tmp_path):
+    """Each hand at a table is committed when dealt and revealed on reset"""
+    game = PokerGame(id=5, big_blind=10)
+    game.shuffle_service = ShuffleService(seed='table', audit_log=tmp_path / 'audit.log')
+    game.message_callback = AsyncMock()
+    game.private_message_callback = AsyncMock()
+    for name in ("player1", "player2"):
+        game.add_player(MockUser(name))
+    game.dealer_position = 0
+
+    with patch.object(game, '_betting_round', AsyncMock(return_value=None)):
+        await game._setup_pre_flop()
+    hole_cards = [card.code for pos in (1, 0) for card in game.players[pos]['cards']]
+    await game._reset_game()
+
+    assert redeal(read_audit_log(5, 1, tmp_path / 'audit.log', game.session), 4) == hole_cards
@@ -0,0 +1,80 @@
+"""
+Tests for the headless hand simulator
+"""
+import random
+import sys
+
+import pytest
+
+from app.shuffle import ShuffleService
+from app.simulation import CallingPolicy, RandomPolicy, new_table, play_table, simulate, total_chips
+
+
+def chip_counts(game):
+    return {pos: player['chip_count'] for pos, player in game.get_all_players().items()}
+
+
+@pytest.mark.asyncio
+async def test_calling_tables_conserve_chips():
+    """Calling stations always reach showdown, no chips appear or vanish with two seats"""
+    report = await simulate(tables=3, hands=30, seats=2, policy='call', seed=1)
+    assert report['hands'] == 30
+    assert report['conservation_errors'] == 0
+    assert set(report['state_seconds']) == {'pre_flop', 'flop', 'turn', 'river', 'showdown', 'waiting'}
+
+
+@pytest.mark.asyncio
+async def test_one_hand_per_start_game():
+    """Without auto start a table stops in waiting after each hand"""
+    game = new_table(0, 4, 10, CallingPolicy(), ShuffleService(seed=1, audit_log=None))
+    chips = total_chips(game)
+    await game.start_game()
+    assert game.game_state == 'waiting'
+    assert game.hand_number == 1
+    assert total_chips(game) == chips
+
+
+@pytest.mark.asyncio
+async def test_seeded_simulation_is_reproducible():
+    """Same seed, same deals and decisions, same chip counts"""
+    results = []
+    for _ in range(2):
+        game = new_table(0, 6, 10, RandomPolicy(random.Random(5)), ShuffleService(seed=5, audit_log=None))
+        report = {'hands': 0, 'conservation_errors': 0, 'chips_lost': 0}
+        await play_table(game, 40, report, {})
+        results.append(chip_counts(game))
+    assert results[0] == results[1]
+
+
+@pytest.mark.asyncio
+async def test_rejected_policy_action_raises():
+    """An invalid policy action fails loudly instead of waiting for a player forever"""
+    class RaiseNothing:
+        def act(self, game, position):
+            return 'raise', 0
+
+    game = new_table(0, 2, 10, RaiseNothing(), ShuffleService(seed=1, audit_log=None))
+    with pytest.raises(RuntimeError):
+        await game.start_game()
+
+
+@pytest.mark.asyncio
+async def test_driver_stack_depth_is_constant():
+    """One start_game call plays many hands without the stack growing"""
+    depths = {}
+
+    class DepthPolicy(CallingPolicy):
+        def act(self, game, position):
+            frame, depth = sys._getframe(), 0
+            while frame:
+                frame, depth = frame.f_back, depth + 1
+            depths.setdefault(game.hand_number, set()).add(depth)
+            if game.hand_number == 200:
+                game.auto_start = False
+            return super().act(game, position)
+
+    game = new_table(0, 3, 10, DepthPolicy(), ShuffleService(seed=1, audit_log=None))
+    game.auto_start = True
+    await game.start_game()
+    assert game.hand_number == 200
+    assert depths[200] == depths[1]
@@ -0,0 +1,181 @@
+"""
+Tests for table hosts: hash ring, IPC framing and a table served over a Unix socket
+"""
+import asyncio
+import json
+
+import pytest
+from unittest.mock import AsyncMock
+
+from app.PokerGame import poker_games
+from app.shuffle import ShuffleService
+from app.table_hosts import HashRing, HostClient, TableHost, call_sync, close_table, host_path
+from app.wire import decode_frame
+
+
+def events(frames):
+    """Events of the frames a callback got, or of one frame, checked against the binary encoding if any"""
+    if isinstance(frames, tuple):
+        text, binary = frames
+        frame = json.loads(text)
+        decoded = frame['events'] if frame['type'] == 'batch' else [frame]
+        if binary is not None:
+            assert [event['type'] for event in decode_frame(binary)[1]] == [event['type'] for event in decoded]
+        return decoded
+    return [event for call in frames.call_args_list for event in events(call.args[-2:])]
+
+
+@pytest.fixture(autouse=True)
+def no_audit_log(monkeypatch):
+    """Tables dealt by the tests do not write to the shuffle audit log"""
+    monkeypatch.setattr('app.PokerGame.shuffle_service', ShuffleService(audit_log=None))
+
+
+class MockUser:
+    def __init__(self, username):
+        self.username = username
+
+
+def test_ring_spreads_rooms_over_hosts():
+    """Every host gets a share of the rooms and the assignment is stable"""
+    ring = HashRing([host_path(index) for index in range(4)])
+    assignment = {room_id: ring.host_for(room_id) for room_id in range(4000)}
+    counts = {host: list(assignment.values()).count(host) for host in set(assignment.values())}
+    assert len(counts) == 4
+    assert min(counts.values()) > 500
+    rebuilt = HashRing([host_path(index) for index in reversed(range(4))])
+    assert assignment == {room_id: rebuilt.host_for(room_id) for room_id in range(4000)}
+
+
+def test_adding_a_host_only_moves_rooms_to_it():
+    """Consistent hashing: rooms either stay or move to the new host"""
+    before = HashRing([host_path(index) for index in range(4)])
+    after = HashRing([host_path(index) for index in range(5)])
+    moved = [room_id for room_id in range(4000) if before.host_for(room_id) != after.host_for(room_id)]
+    assert all(after.host_for(room_id) == host_path(4) for room_id in moved)
+    assert 400 < len(moved) < 1400
+
+
+def test_empty_ring_has_no_host():
+    with pytest.raises(LookupError):
+        HashRing([]).host_for(1)
+
+
+def test_closing_on_a_host_that_is_down_is_logged(tmp_path, monkeypatch, caplog):
+    """A host that cannot be reached has no table to drop, the error is logged"""
+    monkeypatch.setattr('app.table_hosts.TABLE_HOSTS', 1)
+    monkeypatch.setattr('app.table_hosts.ring', HashRing([str(tmp_path / 'down.sock')]))
+    close_table(9004)
+    assert caplog.records[0].levelname == 'ERROR' and "Could not close table 9004" in caplog.text
+
+@pytest.mark.asyncio
+async def test_table_served_by_host(tmp_path):
+    """Commands reach the table on the host and game messages come back to the proxy"""
+    path = str(tmp_path / 'host.sock')
+    server = asyncio.create_task(TableHost(path).serve())
+    while not (tmp_path / 'host.sock').exists():
+        await asyncio.sleep(0.01)
+    try:
+        assert await asyncio.to_thread(call_sync, path, 'open', room=9001, big_blind=10, max_players=4) is True
+        client = HostClient(path)
+        assert await client.table(404) is None
+        table = await client.table(9001)
+        table.frame_callback = AsyncMock()
+        table.private_frame_callback = AsyncMock()
+        assert await table.post('binary', 1) == 1 # frames come with their binary encoding
+
+        assert await table.post('join', MockUser("player1")) == 0
+        assert await table.post('join', MockUser("player2")) == 1
+        seats = await table.post('seats')
+        assert seats[1]['username'] == "player2"
+        assert seats[1]['chip_count'] == 1000
+
+        await asyncio.sleep(0.05)
+        assert [event['type'] for event in events(table.frame_callback)] == ['new_player', 'new_player']
+        table.frame_callback.reset_mock()
+
+        assert await table.post('start') is True
+        assert await table.post('action', "player2", 'fold') == [False, "Not your turn."]
+        await asyncio.sleep(0.05)
+        table.frame_callback.assert_called_once() # blinds and the first turn go out as one batch
+        assert {'type': 'player_bet', 'position': 1, 'amount': 10, 'chip_count': 990, 'pot': 15} \
+            in events(table.frame_callback)
+        dealt = {call.args[0] for call in table.private_frame_callback.call_args_list
+                 if any(event['type'] == 'dealt_cards' for event in events(call.args[1:]))}
+        assert dealt == {"player1", "player2"}
+        snapshot = json.loads(await table.post('snapshot', 'init_participant', "player1"))
+        assert snapshot['seq'] == 3 and snapshot['your_position'] == 0 and len(snapshot['your_cards']) == 2
+
+        assert await table.post('leave', "player1") == 0
+        assert await table.post('leave', "player2") == 1
+        assert await asyncio.to_thread(call_sync, path, 'close', room=9001) is True
+    finally:
+        server.cancel()
+        poker_games.pop(9001, None)
+
+
+@pytest.mark.asyncio
+async def test_every_subscriber_gets_the_frames(tmp_path):
+    """Each ASGI worker subscribed to a table gets its frames, a closed one is dropped"""
+    path = str(tmp_path / 'host.sock')
+    host = TableHost(path)
+    server = asyncio.create_task(host.serve())
+    while not (tmp_path / 'host.sock').exists():
+        await asyncio.sleep(0.01)
+    try:
+        assert await asyncio.to_thread(call_sync, path, 'open', room=9002, big_blind=10, max_players=4) is True
+        first, second = HostClient(path), HostClient(path)
+        tables = [await first.table(9002), await second.table(9002)]
+        assert len(host.subscribers[9002]) == 2
+        for table in tables:
+            table.frame_callback = AsyncMock()
+
+        assert await tables[0].post('join', MockUser("player1")) == 0
+        await asyncio.sleep(0.05)
+        for table in tables:
+            assert [event['type'] for event in events(table.frame_callback)] == ['new_player']
+            assert table.frame_callback.call_args.args[1] is None # no binary socket in the room
+
+        second._reader_task.cancel()
+        while len(host.subscribers[9002]) > 1:
+            await asyncio.sleep(0.01)
+        assert await tables[0].post('leave', "player1") == 0
+        await asyncio.sleep(0.05)
+        assert [event['type'] for event in events(tables[0].frame_callback)] == ['new_player', 'player_left']
+        assert await asyncio.to_thread(call_sync, path, 'close', room=9002) is True
+    finally:
+        server.cancel()
+        poker_games.pop(9002, None)
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_a_layer_get_each_frame_once(tmp_path, monkeypatch):
+    """With a shared channel layer one worker forwards a frame, the next one takes over when it leaves"""
+    monkeypatch.setattr('app.table_hosts.SHARED_LAYER', True)
+    path = str(tmp_path / 'host.sock')
+    host = TableHost(path)
+    server = asyncio.create_task(host.serve())
+    while not (tmp_path / 'host.sock').exists():
+        await asyncio.sleep(0.01)
+    try:
+        assert await asyncio.to_thread(call_sync, path, 'open', room=9003, big_blind=10, max_players=4) is True
+        first, second = HostClient(path), HostClient(path)
+        tables = [await first.table(9003), await second.table(9003)]
+        for table in tables:
+            table.frame_callback = AsyncMock()
+
+        assert await tables[1].post('join', MockUser("player1")) == 0
+        await asyncio.sleep(0.05)
+        assert [event['type'] for event in events(tables[0].frame_callback)] == ['new_player']
+        tables[1].frame_callback.assert_not_called()
+
+        first._reader_task.cancel()
+        while len(host.subscribers[9003]) > 1:
+            await asyncio.sleep(0.01)
+        assert await tables[1].post('leave', "player1") == 0
+        await asyncio.sleep(0.05)
+        assert [event['type'] for event in events(tables[1].frame_callback)] == ['player_left']
+        assert await asyncio.to_thread(call_sync, path, 'close', room=9003) is True
+    finally:
+        server.cancel()
+        poker_games.pop(9003, None)
@@ -0,0 +1,117 @@
+"""
+Tests for the hierarchical timer wheel and the table clocks built on it
+"""
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock
+
+from app.PokerGame import PokerGame
+from app.timers import TimerWheel
+
+
+class MockUser:
+    def __init__(self, username):
+        self.username = username
+
+
+def test_timers_fire_on_their_tick():
+    """Timers on every wheel level fire on the tick they are due, in order"""
+    wheel = TimerWheel(resolution=1, slots=4, levels=3)  # 64 tick span
+    fired = []
+    for delay in (1, 3, 4, 5, 17, 63, 40):
+        wheel.schedule(delay, lambda d=delay: fired.append((d, wheel.current)))
+    wheel.advance(64)
+    # callbacks run after the tick counter moved past their tick
+    assert fired == [(d, d + 1) for d in (1, 3, 4, 5, 17, 40, 63)]
+    assert wheel.pending == 0
+
+
+def test_timers_beyond_the_span_are_reinserted():
+    """A delay longer than the wheels can hold still fires on time"""
+    wheel = TimerWheel(resolution=1, slots=4, levels=2)  # 16 tick span
+    fired = []
+    wheel.schedule(50, fired.append, 'late')
+    wheel.advance(50)
+    assert fired == []
+    wheel.advance(1)
+    assert fired == ['late']
+
+
+def test_cancelled_timers_do_not_fire():
+    wheel = TimerWheel(resolution=1, slots=4, levels=2)
+    fired = []
+    timer = wheel.schedule(6, fired.append, 'cancelled')
+    wheel.schedule(6, fired.append, 'kept')
+    timer.cancel()
+    timer.cancel()
+    assert wheel.pending == 1
+    wheel.advance(10)
+    assert fired == ['kept']
+
+
+def test_timer_scheduled_by_callback_runs_later():
+    """A callback scheduling a new timer does not run it in the same tick"""
+    wheel = TimerWheel(resolution=1, slots=4, levels=2)
+    fired = []
+    wheel.schedule(1, lambda: wheel.schedule(0, fired.append, wheel.current))
+    wheel.advance(3)
+    assert fired == []
+    wheel.advance(1)
+    assert fired == [2]
+
+
+def test_failing_callback_is_logged(caplog):
+    """A callback that raises is logged with its traceback and the other timers still fire"""
+    wheel = TimerWheel(resolution=1, slots=4, levels=2)
+    fired = []
+    wheel.schedule(1, lambda: 1 / 0)
+    wheel.schedule(1, fired.append, 'next')
+    wheel.advance(2)
+    assert fired == ['next']
+    assert caplog.records[0].levelname == 'ERROR' and 'ZeroDivisionError' in caplog.text
+
+@pytest.mark.asyncio
+async def test_sleep_and_wait_event():
+    """The driver task advances the wheel in real time"""
+    wheel = TimerWheel(resolution=0.01)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await wheel.sleep(0.05)
+    assert loop.time() - start >= 0.04
+
+    event = asyncio.Event()
+    assert await wheel.wait_event(event, 0.03) is False
+    loop.call_later(0.01, event.set)
+    assert await wheel.wait_event(event, 5) is True
+    await asyncio.sleep(0)  # the alarm cancels its timer from a done callback
+    assert wheel.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_idle_player_is_checked_or_folded():
+    """A seat that never acts uses its time bank and then checks or folds"""
+    game = PokerGame(id=1, big_blind=10)
+    game.timers = TimerWheel(resolution=0.01)
+    game.action_timeout = 0.03
+    game.time_bank = 0.03
+    game.message_callback = AsyncMock()
+    game.private_message_callback = AsyncMock()
+    pos1 = game.add_player(MockUser("player1"))
+    pos2 = game.add_player(MockUser("player2"))
+    game.game_state = 'flop'
+    for pos in (pos1, pos2):
+        game.players[pos]['active'] = True
+    game.current_player_position = pos1
+
+    await game._wait_for_player_action(pos1)
+    assert game.players[pos1]['folded'] is False  # nothing to call, checked
+    assert game.players[pos1].time_bank == 0
+    game.private_message_callback.assert_any_call("player1", 'action_timeout', {'action': 'call'})
+    game.message_callback.assert_any_call('time_bank', {'position': pos1, 'seconds': 0.03})
+
+    game.current_max_bet = 20
+    game.current_player_position = pos2
+    game.players[pos2].time_bank = 0
+    await game._wait_for_player_action(pos2)
+    assert game.players[pos2]['folded'] is True
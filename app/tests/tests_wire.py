@@ -0,0 +1,64 @@
+"""
+Tests for the binary game frame encoding
+"""
+import json
+
+import pytest
+
+from app.cards import CARDS
+from app.ipc import decode, encode, HEADER
+from app.wire import HIDDEN_CARD, MESSAGES, decode_frame, encode_frame
+
+
+def test_frame_round_trip():
+    """Every field kind decodes to the message that was encoded"""
+    events = [
+        {'type': 'player_bet', 'position': 1, 'amount': 10, 'chip_count': 990, 'pot': 2 ** 40},
+        {'type': 'dealt_cards', 'cards': ['Ace of Spades', '10 of Hearts'], 'active_positions': [0, 1, 5]},
+        {'type': 'hand_value', 'hand_value': 'preflop', 'hand_cards': ['Ace of Spades', '2 of Diamonds'],
+         'hand_class': 'A2o', 'equity': 0.5523},
+        {'type': 'hand_value', 'hand_value': 'pair', 'hand_cards': ['Ace of Spades', 'Ace of Clubs']},
+        {'type': 'showdown', 'hands': {0: ['King of Clubs', 'reverse'], 3: ['2 of Hearts', '3 of Hearts']}},
+        {'type': 'equities', 'equities': {0: {'win': 0.25, 'tie': 0.01}}, 'board_size': 3},
+        {'type': 'reset', 'chip_counts': {0: 1000, 3: 0}, 'dealer_position': None},
+        {'type': 'player_turn', 'username': 'gracz_ąę'},
+        {'type': 'clear_betting'},
+    ]
+    assert decode_frame(encode_frame(events, 300)) == (300, events)
+    assert decode_frame(encode_frame(events[:1])) == (None, events[:1])
+
+
+def test_cards_and_seats_are_single_bytes():
+    frame = encode_frame([{'type': 'board_cards', 'cards': [str(card) for card in CARDS[:3]]}], 1)
+    assert frame == bytes([1, 1, 7, 3, 0, 1, 2])
+    frame = encode_frame([{'type': 'player_folded', 'position': 7}], 1)
+    assert frame == bytes([1, 1, 11, 7])
+    assert decode_frame(bytes([0, 1, 7, 1, HIDDEN_CARD]))[1] == [{'type': 'board_cards', 'cards': ['reverse']}]
+
+
+def test_message_without_schema_falls_back_to_json():
+    event = {'type': 'new_event', 'data': {'nested': [1, 2]}}
+    frame = encode_frame([event])
+    assert frame[2] == 0
+    assert decode_frame(frame) == (None, [event])
+
+
+def test_frames_are_smaller_than_json():
+    events = [{'type': 'player_bet', 'position': 2, 'amount': 40, 'chip_count': 960, 'pot': 70},
+              {'type': 'player_turn', 'username': 'player3'},
+              {'type': 'board_cards', 'cards': ['Queen of Diamonds', '9 of Spades', 'Ace of Hearts']}]
+    assert len(encode_frame(events, 12)) * 5 < len(json.dumps({'type': 'batch', 'seq': 12, 'events': events}))
+
+
+def test_every_message_has_a_unique_type():
+    names = [name for name, _ in MESSAGES]
+    assert len(names) == len(set(names))
+    with pytest.raises(KeyError):
+        encode_frame([{'type': 'player_bet', 'position': 1}])
+
+
+def test_ipc_frames_carry_bytes():
+    """Binary frames pass through table hosts and the channel broker"""
+    message = {'text': '{"type": "x"}', 'binary': b'\x00\xff', 'nested': [{'$other': 1}]}
+    frame = encode(message)
+    assert decode(frame[HEADER.size:]) == message
@@ -0,0 +1,157 @@
+'''
+Process-wide hierarchical timer wheel.
+
+Every table schedules its action clocks, time banks and showdown pauses here instead
+of sleeping in its own task. Timers are bucketed by expiry tick in LEVELS wheels of
+SLOTS buckets each: the lowest wheel holds the next SLOTS ticks, each higher wheel
+covers SLOTS times the span of the one below and is cascaded down when the lower
+wheel wraps. Scheduling and cancelling are O(1), one tick touches one bucket, however
+many tables are waiting. A single driver task per event loop advances the wheel and
+stops when no timers are pending.
+'''
+import asyncio
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION = float(os.getenv('POKER_TIMER_RESOLUTION', 0.1)) # seconds per tick
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+LEVELS = 4 # 64 ** 4 ticks, about 19 days at 0.1 s
+
+
+class Timer:
+    __slots__ = ('wheel', 'expires', 'callback', 'args', 'cancelled')
+
+    def __init__(self, wheel, expires, callback, args):
+        self.wheel = wheel
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        ''' Cancelled timers stay in their bucket and are dropped when it is reached. '''
+        if not self.cancelled:
+            self.cancelled = True
+            self.wheel.pending -= 1
+
+
+class TimerWheel:
+    def __init__(self, resolution=RESOLUTION, slots=SLOTS, levels=LEVELS):
+        self.resolution = resolution
+        self.slot_bits = slots.bit_length() - 1
+        if slots != 1 << self.slot_bits:
+            raise ValueError(f"Slot count {slots} is not a power of two.")
+        self.slot_mask = slots - 1
+        self.span = slots ** levels
+        self.wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.current = 0 # next tick to run
+        self.pending = 0
+        self._loop = None
+        self._driver = None
+
+    def schedule(self, delay, callback, *args):
+        ''' Call callback(*args) from the wheel after `delay` seconds, rounded up to a tick. '''
+        self._ensure_driver()
+        ticks = max(1, math.ceil(delay / self.resolution - 1e-9))
+        timer = Timer(self, self.current + ticks, callback, args)
+        self._insert(timer)
+        self.pending += 1
+        return timer
+
+    def sleep(self, delay):
+        ''' Future resolved after `delay` seconds, cancelling it cancels the timer. '''
+        future = asyncio.get_running_loop().create_future()
+        timer = self.schedule(delay, _resolve, future)
+        future.add_done_callback(lambda _: timer.cancel())
+        return future
+
+    async def wait_event(self, event, timeout):
+        ''' Wait for an asyncio.Event for at most `timeout` seconds, True if it was set. '''
+        if event.is_set():
+            return True
+        waiter = asyncio.ensure_future(event.wait())
+        alarm = self.sleep(timeout)
+        try:
+            await asyncio.wait((waiter, alarm), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            alarm.cancel()
+        return event.is_set()
+
+    def advance(self, ticks=1):
+        ''' Run `ticks` ticks now, used by the driver and by tests. '''
+        for _ in range(ticks):
+            self._tick()
+
+    def _insert(self, timer):
+        delta = timer.expires - self.current
+        if delta >= self.span: # parked in the top wheel and re-inserted until due
+            target, level = self.current + self.span - 1, len(self.wheels) - 1
+        else:
+            target, level = timer.expires, max(0, delta.bit_length() - 1) // self.slot_bits
+        self.wheels[level][target >> level * self.slot_bits & self.slot_mask].append(timer)
+
+    def _tick(self):
+        current = self.current
+        level = 0
+        while level + 1 < len(self.wheels) and not current >> level * self.slot_bits & self.slot_mask:
+            level += 1 # lower wheel wrapped, bring the next bucket of the wheel above down
+            bucket_index = current >> level * self.slot_bits & self.slot_mask
+            bucket, self.wheels[level][bucket_index] = self.wheels[level][bucket_index], []
+            for timer in bucket:
+                if not timer.cancelled:
+                    self._insert(timer)
+        index = current & self.slot_mask
+        bucket, self.wheels[0][index] = self.wheels[0][index], []
+        self.current = current + 1 # timers scheduled by callbacks land in later ticks
+        for timer in bucket:
+            if timer.cancelled:
+                continue
+            timer.cancelled = True
+            self.pending -= 1
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                logger.exception("Timer callback %r failed", timer.callback)
+
+    def _clear(self):
+        for wheel in self.wheels:
+            for bucket in wheel:
+                bucket.clear()
+        self.pending = 0
+
+    def _ensure_driver(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # no event loop, the wheel is advanced by hand
+        if loop is not self._loop:
+            self._clear() # timers of another (finished) event loop can never run
+            self._loop, self._driver = loop, None
+        if self._driver is None or self._driver.done():
+            self._driver = loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        start_time, start_tick = loop.time(), self.current
+        while self.pending > 0:
+            due = start_tick + int((loop.time() - start_time) / self.resolution)
+            while self.current <= due and self.pending > 0:
+                self._tick() # catches up if the loop was blocked
+            if self.pending <= 0:
+                break
+            await asyncio.sleep(start_time + (self.current - start_tick) * self.resolution - loop.time())
+        self._clear() # only cancelled timers are left
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# one wheel shared by every table in the process
+timer_wheel = TimerWheel()
@@ -12,4 +12,5 @@ urlpatterns = [
     path('room/<int:room_id>/', views.joinRoom, name='join_room'),
     path('room-delete/<int:room_id>/', views.deleteRoom, name='delete_room'),
     path('forbidden/', views.errorMessage, name='forbidden'),
+    path('metrics/', views.metricsView, name='metrics'),
 ]
\ No newline at end of file
@@ -1,14 +1,16 @@
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.models import User
 from django.shortcuts import render, redirect, get_object_or_404
 from django.db.models import Q
 from django.urls import reverse
+from django.http import JsonResponse
 
 from app.forms import RegisterForm, RoomForm
 from app.models import PokerRoom, Player
-from .PokerGame import PokerGame, poker_games
+from . import metrics
+from .table_hosts import open_table
 
 
 # Create your views here.
@@ -113,7 +115,7 @@ def createRoom(request):
             room = form.save(commit=False)
             room.host = request.user
             room.save()
-            poker_games[room.id] = PokerGame(room.id, big_blind=room.blinds_level,max_players=room.max_players)
+            open_table(room) # in this process or on the room's table host
             return redirect(f"{reverse("join_room", kwargs={'room_id': room.id})}?role=participant")
     else:
         form = RoomForm()
@@ -122,6 +124,7 @@ def createRoom(request):
 @login_required(login_url='login')
 def joinRoom(request, room_id):
     room = get_object_or_404(PokerRoom, id=room_id)
+    open_table(room) # no-op unless the table (or its host) was restarted
     role = request.GET.get('role', 'observer')
     current_players_count = Player.objects.filter(room=room, is_participant=True).count()
     if role == 'participant' and current_players_count >= room.max_players:
@@ -149,3 +152,7 @@ def deleteRoom(request, room_id):
         messages.error(request, "Tylko gospodarz pokoju może go usunąć.")
         return redirect('forbidden')
     return redirect('rooms')
+
+@user_passes_test(lambda user: user.is_staff, login_url='login')
+def metricsView(request):
+    return JsonResponse(metrics.snapshot())
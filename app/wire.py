@@ -0,0 +1,201 @@
+'''
+Compact binary encoding of game frames, the opt-in `poker.binary` websocket subprotocol.
+
+A frame is the room sequence number (0 for private frames), the number of messages
+and the messages. A message is its type id followed by its fields in schema order:
+seats and cards are one byte (a card is its code, see hand_evaluator, HIDDEN_CARD is a
+face down card and NO_SEAT stands for None), counts and chip amounts are unsigned LEB128
+varints, strings a varint length and UTF-8, ratios (equities) varints in 1/10000 and
+optional fields a presence byte first. A message type without a schema is sent as id 0
+and its JSON text. The decoder in static/app/js/websocket.js mirrors this module.
+'''
+import json
+
+from .cards import CARD_NAMES
+
+SUBPROTOCOL = 'poker.binary'
+HIDDEN_CARD = 52
+NO_SEAT = 255
+RATIO_SCALE = 10000
+
+MESSAGES = (
+    ('player_bet', (('position', 'seat'), ('amount', 'uint'), ('chip_count', 'uint'), ('pot', 'uint'))),
+    ('dealt_cards', (('cards', 'cards'), ('active_positions', 'seats'))),
+    ('player_turn', (('username', 'str'),)),
+    ('your_turn', (('current_bet', 'uint'), ('player_bet', 'uint'), ('chip_count', 'uint'), ('pot', 'uint'),
+                   ('time_to_act', 'uint'), ('time_bank', 'uint'))),
+    ('time_bank', (('position', 'seat'), ('seconds', 'uint'))),
+    ('action_timeout', (('action', 'str'),)),
+    ('board_cards', (('cards', 'cards'),)),
+    ('clear_betting', ()),
+    ('hand_value', (('hand_value', 'str'), ('hand_cards', 'cards'), ('hand_class', 'str?'), ('equity', 'ratio?'))),
+    ('player_checked', (('position', 'seat'),)),
+    ('player_folded', (('position', 'seat'),)),
+    ('showdown', (('hands', 'seat_cards'),)),
+    ('round_winner', (('winner_positions', 'seats'), ('amount_won', 'uint'))),
+    ('equities', (('equities', 'seat_equities'), ('board_size', 'uint'))),
+    ('reset', (('chip_counts', 'seat_uints'), ('dealer_position', 'seat'))),
+    ('out_of_chips', ()),
+    ('new_player', (('position', 'seat'), ('username', 'str'), ('chip_count', 'uint'))),
+    ('player_left', (('position', 'seat'),)),
+)
+MESSAGE_IDS = {name: (index, fields) for index, (name, fields) in enumerate(MESSAGES, 1)}
+CARD_CODES = {name: code for code, name in enumerate(CARD_NAMES)}
+CARD_CODES['reverse'] = HIDDEN_CARD
+
+
+def _uint(out, value):
+    value = int(value)
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _seat(out, position):
+    out.append(NO_SEAT if position is None else int(position))
+
+
+def _str(out, text):
+    data = text.encode()
+    _uint(out, len(data))
+    out += data
+
+
+def _cards(out, cards):
+    _uint(out, len(cards))
+    out += bytes(CARD_CODES[card] for card in cards)
+
+
+def _seats(out, positions):
+    _uint(out, len(positions))
+    out += bytes(int(position) for position in positions)
+
+
+def _ratio(out, value):
+    _uint(out, round(value * RATIO_SCALE))
+
+
+def _seat_cards(out, hands):
+    _uint(out, len(hands))
+    for position, cards in hands.items():
+        _seat(out, position)
+        _cards(out, cards)
+
+
+def _seat_uints(out, values):
+    _uint(out, len(values))
+    for position, value in values.items():
+        _seat(out, position)
+        _uint(out, value)
+
+
+def _seat_equities(out, equities):
+    _uint(out, len(equities))
+    for position, equity in equities.items():
+        _seat(out, position)
+        _ratio(out, equity['win'])
+        _ratio(out, equity['tie'])
+
+
+ENCODERS = {
+    'uint': _uint, 'seat': _seat, 'str': _str, 'cards': _cards, 'seats': _seats, 'ratio': _ratio,
+    'seat_cards': _seat_cards, 'seat_uints': _seat_uints, 'seat_equities': _seat_equities,
+}
+
+
+def encode_frame(events, seq=None):
+    ''' The binary counterpart of PokerGame.encode_frame, events are message dicts with a type '''
+    out = bytearray()
+    _uint(out, seq or 0)
+    _uint(out, len(events))
+    for event in events:
+        message_id, fields = MESSAGE_IDS.get(event['type'], (0, None))
+        out.append(message_id)
+        if fields is None:
+            _str(out, json.dumps(event))
+            continue
+        for name, kind in fields:
+            if kind.endswith('?'):
+                value = event.get(name)
+                out.append(value is not None)
+                if value is None:
+                    continue
+                kind = kind[:-1]
+            else:
+                value = event[name]
+            ENCODERS[kind](out, value)
+    return bytes(out)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def byte(self):
+        self.offset += 1
+        return self.data[self.offset - 1]
+
+    def uint(self):
+        value = shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def seat(self):
+        position = self.byte()
+        return None if position == NO_SEAT else position
+
+    def str(self):
+        size = self.uint()
+        self.offset += size
+        return self.data[self.offset - size:self.offset].decode()
+
+    def cards(self):
+        return ['reverse' if code == HIDDEN_CARD else CARD_NAMES[code] for code in self._bytes()]
+
+    def seats(self):
+        return list(self._bytes())
+
+    def ratio(self):
+        return self.uint() / RATIO_SCALE
+
+    def seat_cards(self):
+        return {self.seat(): self.cards() for _ in range(self.uint())}
+
+    def seat_uints(self):
+        return {self.seat(): self.uint() for _ in range(self.uint())}
+
+    def seat_equities(self):
+        return {self.seat(): {'win': self.ratio(), 'tie': self.ratio()} for _ in range(self.uint())}
+
+    def _bytes(self):
+        size = self.uint()
+        self.offset += size
+        return self.data[self.offset - size:self.offset]
+
+
+def decode_frame(data):
+    ''' (seq or None, events) of a binary frame, used by tests and tools '''
+    reader = _Reader(data)
+    seq = reader.uint()
+    events = []
+    for _ in range(reader.uint()):
+        message_id = reader.byte()
+        if message_id == 0:
+            events.append(json.loads(reader.str()))
+            continue
+        name, fields = MESSAGES[message_id - 1]
+        event = {'type': name}
+        for field, kind in fields:
+            if kind.endswith('?'):
+                if not reader.byte():
+                    continue
+                kind = kind[:-1]
+            event[field] = getattr(reader, kind)()
+        events.append(event)
+    return seq or None, events